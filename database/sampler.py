@@ -1,40 +1,107 @@
-from random import uniform
-from csv import reader, writer, field_size_limit
-from sys import maxsize
+from csv import writer, field_size_limit
+from hashlib import blake2b
+from heapq import nsmallest
+from argparse import ArgumentParser
+from sys import maxsize, path
+from os.path import dirname, join
 
-# a p value, sample this percentage of master.csv
-P = 0.001
+path.insert(0, join(dirname(__file__), '..', 'library'))
+from csv_index import ShardedReader
+from metrics import METRICS
+
+# Objective: sample exactly N rows of master.csv, optionally N per publication, in one parallel pass
+#
+# Every row gets a random key, a seeded hash of its fields, and the sample is the rows with the
+# smallest keys: a reservoir that does not depend on how the file is split, so each byte-offset shard
+# (see csv_index.py) keeps its own smallest keys and the shards' candidates are merged in the parent.
+# With --stratify, keys are ranked within each value of the column (e.g. publication) and each value
+# keeps its own quota. The same seed always gives the same sample, written in master.csv's order.
 
 # increase the field size of CSV readers/writers
 field_size_limit(maxsize)
 
-# open master.csv as text file
-with open('master.csv', 'r') as master_text:
-
-    # create CSV reader with master.csv
-    master_csv = reader(master_text, delimiter=',')
-
-    # get the CSV header
-    header = next(master_csv)
-
-    # open psample.csv as a text file
-    with open('%s.sample.csv' % str(P).split('.')[1], 'w') as psample_text:
-
-        # create a CSV writer with psample.csv
-        psample_csv = writer(psample_text, delimiter=',')
+SAMPLE = {} # seed, column, default quota and per-value quotas, set in every worker by configure
 
-        # write the CSV header to psample.csv
-        psample_csv.writerow(header)
+# Set the sampling parameters of a worker process
+def configure(seed, column, quota, quotas):
+    SAMPLE['seed'] = blake2b(str(seed).encode('utf-8'), digest_size=16).digest()
+    SAMPLE['column'] = column
+    SAMPLE['quota'] = quota
+    SAMPLE['quotas'] = quotas
 
-        # loop through row arrays in master.csv
-        for i, row in enumerate(master_csv):
+# Get the random key of a row, uniform in [0, 1)
+def key(row):
+    digest = blake2b('\x1f'.join(row).encode('utf-8'), digest_size=8, key=SAMPLE['seed']).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
 
-            # print a status update
-            print(i, end='\r')
+# Get the candidates of a shard: {stratum: (rows, [(key, position in shard, row)])} with at most quota each
+def candidates(rows):
+    column = SAMPLE['column']
+    strata = {}
+    for i, row in enumerate(rows):
+        stratum = row[column] if column is not None else None
+        strata.setdefault(stratum, []).append((key(row), i, row))
+    return {stratum: (len(entries), nsmallest(SAMPLE['quotas'].get(stratum, SAMPLE['quota']), entries))
+            for stratum, entries in strata.items()}
 
-            # get a float between 0 and 1
-            if uniform(0, 1) < P:
+# Sample a CSV, returning its header, the sampled rows in file order and {stratum: (rows, kept)}
+def sample(path, quota, column=None, quotas=None, seed=0, processes=None):
+    reader = ShardedReader(path, processes)
+    column = reader.index.header.index(column) if column is not None else None
+    quotas = quotas or {}
+    configure(seed, column, quota, quotas)
+    merged, totals = {}, {}
+    # shards come back in file order, so (shard, position) orders the sample as the file does
+    with METRICS.stage('sample'):
+        for shard, strata in enumerate(reader.map_shards(candidates, configure, (seed, column, quota, quotas))):
+            for stratum, (rows, entries) in strata.items():
+                totals[stratum] = totals.get(stratum, 0) + rows
+                merged.setdefault(stratum, []).extend((k, shard, i, row) for k, i, row in entries)
+                METRICS.count('rows', rows)
+            METRICS.progress('Scanned %d rows', METRICS.counters['rows'])
+    kept, counts = [], {}
+    for stratum, entries in merged.items():
+        chosen = nsmallest(quotas.get(stratum, quota), entries)
+        counts[stratum] = (totals[stratum], len(chosen))
+        kept.extend(chosen)
+    kept.sort(key=lambda entry: entry[1:3])
+    return reader.index.header, [row for _, _, _, row in kept], counts
 
-                # write the row to psample.csv if less than P
-                psample_csv.writerow(row)
+def main():
+    parser = ArgumentParser(description='Sample rows of an All The News CSV')
+    parser.add_argument('--csv', default='master.csv')
+    parser.add_argument('--out', default=None, help='sample CSV (default: <size>.sample.csv or <fraction>.sample.csv)')
+    size = parser.add_mutually_exclusive_group(required=True)
+    size.add_argument('--size', type=int, help='rows in the sample, or per stratum with --stratify')
+    size.add_argument('--fraction', type=float, help='fraction of the rows in the sample, e.g. 0.001')
+    parser.add_argument('--stratify', default=None, help='column to sample each value of separately, e.g. publication')
+    parser.add_argument('--quota', action='append', default=[], metavar='VALUE=N',
+                        help='rows for one value of the stratify column (repeatable), e.g. "New York Times=50"')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--metrics', default=None, help='JSON file of the timings and row counts (see metrics.py)')
+    args = parser.parse_args()
+    if args.fraction is not None and args.stratify:
+        parser.error('--fraction samples the whole file, use --size with --stratify')
+    quotas = {}
+    for q in args.quota:
+        value, n = q.rsplit('=', 1)
+        quotas[value] = int(n)
+    quota = args.size
+    if quota is None:
+        quota = round(args.fraction * len(ShardedReader(args.csv, 1).index))
+    out = args.out or '%s.sample.csv' % (args.size if args.fraction is None else str(args.fraction).split('.')[1])
+    header, rows, strata = sample(args.csv, quota, args.stratify, quotas, args.seed, args.processes)
+    with open(out, 'w') as sample_text:
+        sample_csv = writer(sample_text, delimiter=',')
+        sample_csv.writerow(header)
+        sample_csv.writerows(rows)
+    print('Wrote %d rows to %s' % (len(rows), out))
+    if args.stratify:
+        for stratum, (rows, kept) in sorted(strata.items()):
+            print('  %-30s %d of %d rows' % (stratum, kept, rows))
+    if args.metrics:
+        METRICS.write(args.metrics)
 
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+from csv import reader, writer
+
+from sampler import sample
+
+PUBLICATIONS = ['CNN', 'Reuters', 'Vox', 'NPR']
+
+def write_csv(path, n=400):
+    with open(path, 'w', newline='') as o:
+        rows = writer(o)
+        rows.writerow(['', 'id', 'title', 'publication', 'author', 'date', 'year', 'month', 'url', 'content'])
+        for i in range(n):
+            publication = PUBLICATIONS[0] if i % 10 < 6 else PUBLICATIONS[i % 3 + 1]
+            if i == 7:
+                publication = 'Atlantic' # a publication with a single article
+            rows.writerow([i, i, 'Title %d' % i, publication, 'Author', '2017-01-01', 2017, 1,
+                           'https://x/%d' % i, 'Content, "quoted"\nof article %d' % i])
+
+def read_rows(path):
+    with open(path, 'r') as i:
+        return list(reader(i))[1:]
+
+def test_sample_has_exactly_n_rows_in_file_order(tmp_path):
+    path = str(tmp_path / 'master.csv')
+    write_csv(path)
+    everything = read_rows(path)
+    header, rows, strata = sample(path, 50, processes=1)
+    assert header[3] == 'publication' and len(rows) == 50 and strata == {None: (400, 50)}
+    positions = [everything.index(row) for row in rows]
+    assert positions == sorted(positions)
+    assert sample(path, 50, processes=2)[1] == rows # the sample does not depend on the shards
+    assert sample(path, 50, seed=1, processes=1)[1] != rows
+    assert sample(path, 500, processes=1)[1] == everything
+
+def test_stratified_quotas_are_exact(tmp_path):
+    path = str(tmp_path / 'master.csv')
+    write_csv(path)
+    _, rows, strata = sample(path, 20, 'publication', {'Vox': 5}, processes=1)
+    kept = {publication: sum(row[3] == publication for row in rows) for publication in strata}
+    assert kept == {'CNN': 20, 'Reuters': 20, 'Vox': 5, 'NPR': 20, 'Atlantic': 1}
+    assert {stratum: kept for stratum, (_, kept) in strata.items()} == kept
+    assert sum(total for total, _ in strata.values()) == 400
+    assert sample(path, 20, 'publication', {'Vox': 5}, processes=2)[1] == rows
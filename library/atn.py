@@ -1,7 +1,6 @@
 from sys import argv, maxsize
 from csv import reader, field_size_limit
-from numpy import ndarray, array
-from re import findall
+from numpy import empty, float64
 from pandas import DataFrame, set_option
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
@@ -10,7 +9,14 @@ from pickle import load, dump
 from gensim.models import KeyedVectors
 from math import log
  
-from ml import Word, W2VClassifier
+from ml import W2VClassifier
+from df_index import DocumentFrequencies
+from csv_index import RecordIndex, ShardedReader, stamp
+from embedding_cache import W2V_TFIDF
+from features import FeatureMatrix
+from tokenizer import counts
+from tfidf import TFIDFEmbedder
+from metrics import METRICS
 
 class AllTheNewsCSV:
     
@@ -35,37 +41,17 @@ class AllTheNewsCSV:
         'Washington Post': (14, 2, 4) # left center, high
     }
     
-    def __init__(self, path):
+    def __init__(self, path, processes=None, cache=None):
         field_size_limit(maxsize) # Increase maximum field size, CSV is very large
         self.path = path
-        self.n = 0 # number of articles
-        self.hashed_words = self.__hashed_words()
-        
-    def __hashed_words(self): # {'word': 6, 'word2': 4, etc.}
-        # first pass of articles, tally words
-        # the number of articles in which this word appears!
-        hash = {}
-        print('Tallying words of ATN articles from %s' % self.path)
-        with open(self.path, 'r') as master_text:
-            master_csv = reader(master_text, delimiter=',')
-            next(master_csv) # skip the header line
-            for i, e in enumerate(master_csv):
-                self.n += 1 # number of articles
-                # ,id,title,publication,author,date,year,month,url,content
-                _, _, _, _, _, _, _, _, _, content = e
-                ta = TrainingArticle(None, None, None, content, None, None)
-                seen = set() # set of seen words in this article
-                for key in ta.hashed_words: 
-                    if key in seen: # word was already seen in this article, skip
-                        continue
-                    else: # add the word to the seen set
-                        seen.add(key)
-                    if key in hash:
-                        temp = hash[key]
-                        hash[key] = temp + 1
-                    else:
-                        hash[key] = 1
-        return hash
+        self.cache = cache # EmbeddingCache of article vectors, None to always compute them
+        self.stamp = '%d:%d' % stamp(path) # size and mtime, identifies the corpus the idf comes from
+        # document frequencies come from the master.csv.df sidecar, tallied in one pass if it is stale
+        df = DocumentFrequencies.open(path, processes)
+        self.n = df.n # number of articles
+        self.hashed_words = df.counts # {'word': 6, 'word2': 4, etc.}, the number of articles with the word
+        self.index = None # byte offsets of the records, opened on first random access
+        self.__tfidf = {} # TFIDFEmbedder of each word2vec model, see tfidf.py
         
     def articles(self, w2vm):
         print('Labeling ATN articles from %s' % self.path)
@@ -73,11 +59,34 @@ class AllTheNewsCSV:
             master_csv = reader(master_text, delimiter=',')
             next(master_csv) # skip the header line
             for i, e in enumerate(master_csv):
-                # ,id,title,publication,author,date,year,month,url,content
-                _, _, title, pub, author, _, _, _, _, content = e
-                n, bias, factualness = self.PUBLICATIONS[pub]
-                yield TrainingArticle(n, bias, factualness, content, w2vm, self)
+                yield self.training_article(e, w2vm)
+
+    def article(self, i, w2vm):
+        # get article i without reading the articles before it
+        if self.index is None:
+            self.index = RecordIndex.open(self.path)
+        return self.training_article(self.index.row(i), w2vm)
+
+    def labeled_vectors(self, w2v_path, processes=None):
+        # (n, bias, factualness, vector) of every article in CSV order, None for short articles
+        # shards of the CSV are vectorized in parallel, each as one batch (see featurize_tfidf);
+        # make w2v_path a store so workers share one copy
+        for labeled in ShardedReader(self.path, processes).map_shards(labeled_shard, open_worker, (self.path, w2v_path)):
+            yield from labeled
+
+    def training_article(self, e, w2vm):
+        # ,id,title,publication,author,date,year,month,url,content
+        _, _, title, pub, author, _, _, _, _, content = e
+        n, bias, factualness = self.PUBLICATIONS[pub]
+        return TrainingArticle(n, bias, factualness, content, w2vm, self)
                 
+    def tfidf(self, w2vm):
+        # TF-IDF weighted embedder over this corpus's document frequencies, one per word2vec model
+        key = id(w2vm)
+        if key not in self.__tfidf:
+            self.__tfidf[key] = TFIDFEmbedder(w2vm.embedder if w2vm else None, self.n, self.hashed_words)
+        return self.__tfidf[key]
+
     def idf(self, string):
         # get the Inverse Document Frequency of a word string
         # IDF(t) = log_e(Total number of documents / Number of documents with term t in it).
@@ -90,8 +99,6 @@ class AllTheNewsCSV:
                 
 class TrainingArticle:
 
-    WORD_REGEX = "[^a-zA-Z]*([a-zA-Z']+)[^a-zA-Z]*"
-
     def __init__(self, n, bias, factualness, content, w2vm, atn_csv):
         self.n = n
         self.bias = bias
@@ -109,70 +116,132 @@ class TrainingArticle:
         else:
             return 1
         
-    # experimental method!      
-    # TODO this needs idf and tf data!        
+    def cache_key(self):
+        # TF-IDF vectors also depend on the word2vec model and the corpus the idf comes from
+        return '%s %s %s' % (W2V_TFIDF, self.w2vm.path if self.w2vm else None, self.atn_csv.stamp)
+
     def vector(self):
+        cache = self.atn_csv.cache
+        if cache is None:
+            return self.__vector()
+        return cache.get_or_compute(self.cache_key(), self.content, self.__vector).reshape(1, -1)
+        
+    # experimental method!      
+    def __vector(self):
         '''
-        vector transformation here w/ idf and tf data from ta
+        sum of tf * idf * word2vec vector over the article's words, divided by its word count
+        (see tfidf.py; featurize_tfidf does the same for a whole batch of articles at once)
         '''
-        total = ndarray((1, 300), buffer=array([0 for i in range(0, 300)]))
-        for string in self.hashed_words:
-            idf = self.atn_csv.idf(string)
-            tf = self.tf(string)
-            vector = Word(string, self.w2vm).vector
-            if vector is not None:
-                transform = vector * (idf * tf)
-                total += transform
-                #total += vector
-        #return total / len(self.hashed_words)
-        return total / sum(self.hashed_words.values())
+        return self.atn_csv.tfidf(self.w2vm).vectors([self.hashed_words])
         
     def __hashed_words(self):
-        h = {} # hash of words seen in this article
-        for s in findall(self.WORD_REGEX, self.content):
-            word = Word(s.lower(), self.w2vm)
-            if word.string in h: # if word has been seen
-                temp = h[word.string]
-                h[word.string] = temp + 1 # increment count
-            else: # if word has not been seen
-                h[word.string] = 1
-        return h
+        # hash of words seen in this article, {'word': count}; vectors are only looked up in __vector
+        with METRICS.stage('tokenize'):
+            hashed_words = counts(self.content)
+            METRICS.count('words', sum(hashed_words.values()))
+        return hashed_words
+        
+# state of each AllTheNewsCSV.labeled_vectors worker process
+WORKER = {}
+
+def open_worker(csv_path, w2v_path):
+    # load the document frequencies sidecar and word2vec model once per worker
+    WORKER['atn_csv'] = AllTheNewsCSV(csv_path, processes=1)
+    WORKER['w2vm'] = W2VClassifier(w2v_path) if w2v_path else None
+
+def labeled_shard(rows):
+    tas = [WORKER['atn_csv'].training_article(e, WORKER['w2vm']) for e in rows]
+    kept = [ta for ta in tas if len(ta.hashed_words) >= 10] # skip articles less than n words
+    vectors = iter(tfidf_block(kept))
+    return [(ta.n, ta.bias, ta.factualness, next(vectors)) if len(ta.hashed_words) >= 10 else None for ta in tas]
+
+def tfidf_block(tas):
+    # TF-IDF vectors of a batch of training articles (one corpus and model), using the cache if any
+    block = empty((len(tas), 300), dtype=float64)
+    if not tas:
+        return block
+    cache = tas[0].atn_csv.cache
+    key = tas[0].cache_key()
+    missing = [] # articles the cache (if any) does not have yet
+    for i, ta in enumerate(tas):
+        vector = cache.get(key, ta.content) if cache is not None else None
+        if vector is None:
+            missing.append(i)
+        else:
+            block[i] = vector
+    if missing:
+        block[missing] = tas[0].atn_csv.tfidf(tas[0].w2vm).vectors([tas[i].hashed_words for i in missing])
+        if cache is not None:
+            for i in missing:
+                cache.put(key, tas[i].content, block[i])
+    return block
         
+def featurize(tas): # list of training articles
+    # vectorize each article once, labeled for both bias and factualness
+    features = FeatureMatrix(300)
+    for i, ta in enumerate(tas):
+        METRICS.count('articles')
+        if len(ta.hashed_words) < 10: # skip articles less than n words
+            METRICS.count('short_articles')
+            continue
+        METRICS.progress('Examining training article %d', i + 1)
+        with METRICS.stage('vectorize'):
+            features.append(ta.vector(), ta.bias, ta.factualness)
+    return features
+
+def featurize_tfidf(tas, batch_size=1024): # training articles of one AllTheNewsCSV and model
+    # same as featurize, with each batch of articles weighted and embedded as one sparse product
+    features = FeatureMatrix(300)
+    batch = []
+    for ta in tas:
+        METRICS.count('articles')
+        if len(ta.hashed_words) < 10: # skip articles less than n words
+            METRICS.count('short_articles')
+            continue
+        batch.append(ta)
+        if len(batch) == batch_size:
+            with METRICS.stage('vectorize'):
+                features.extend(tfidf_block(batch), [ta.bias for ta in batch], [ta.factualness for ta in batch])
+            METRICS.progress('Examining training article %d', len(features))
+            batch = []
+    with METRICS.stage('vectorize'):
+        features.extend(tfidf_block(batch), [ta.bias for ta in batch], [ta.factualness for ta in batch])
+    return features
+
+def featurize_parallel(atn_csv, w2v_path, processes=None):
+    # same as featurize(atn_csv.articles(w2vm)), with the CSV's shards vectorized in parallel
+    features = FeatureMatrix(300)
+    for i, labeled in enumerate(atn_csv.labeled_vectors(w2v_path, processes)):
+        METRICS.count('articles')
+        if labeled is None: # skip articles less than n words
+            METRICS.count('short_articles')
+            continue
+        METRICS.progress('Examining training article %d', i + 1)
+        n, bias, factualness, vector = labeled
+        features.append(vector, bias, factualness)
+    return features
+
 class BiasDataFrame:
 
-    def __init__(self, tas):
-        self.__d = self.__create_from(tas)
-        self.df = DataFrame(self.__d, columns=list(self.__d.keys()))
+    LABEL = 'bias'
+
+    def __init__(self, tas=None, features=None): # training articles, or a FeatureMatrix from featurize
+        self.features = featurize(tas) if features is None else features
         
-    def __create_from(self, tas): # list of training articles
-        d = {**{str(i): [] for i in range(0, 300)}, **{'bias': []}}
-        for i, ta in enumerate(tas):
-            if len(ta.hashed_words) < 10: continue # skip articles less than n words
-            print('Examining training article %d' % (i + 1), end='\r')
-            vector = ta.vector().tolist()[0] + [ta.bias]            
-            for i, element in enumerate(vector[:-1]):
-                # d[str(i)].append(round(element, 2)) # TODO play with rounding
-                d[str(i)].append(element) # TODO play with rounding
-            d['bias'].append(vector[-1])
-        return d
+    @property
+    def df(self): # data frame of the features, for inspection
+        return self.features.frame(self.LABEL) # TODO play with rounding
         
 class FactualnessDataFrame:
 
-    def __init__(self, tas):
-        self.__d = self.__create_from(tas)
-        self.df = DataFrame(self.__d, columns=list(self.__d.keys()))
+    LABEL = 'factualness'
+
+    def __init__(self, tas=None, features=None): # training articles, or a FeatureMatrix from featurize
+        self.features = featurize(tas) if features is None else features
         
-    def __create_from(self, tas): # list of training articles
-        d = {**{str(i): [] for i in range(0, 300)}, **{'factualness': []}}
-        for i, ta in enumerate(tas):
-            if len(ta.hashed_words) < 10: continue # skip articles less than n words
-            print('Examining training article %d' % (i + 1), end='\r')
-            vector = ta.vector().tolist()[0] + [ta.factualness]            
-            for i, element in enumerate(vector[:-1]):
-                # d[str(i)].append(round(element, 2)) # TODO play with rounding
-                d[str(i)].append(element) # TODO play with rounding
-            d['factualness'].append(vector[-1])
-        return d
+    @property
+    def df(self): # data frame of the features, for inspection
+        return self.features.frame(self.LABEL) # TODO play with rounding
         
 class NewsClassifier:
 
@@ -182,9 +251,8 @@ class NewsClassifier:
         
     def __create(self):
         # set_option('display.max_rows', None) # to print entire dataframe
-        print(self.bdf.df)
-        columns = list(self.bdf.df.columns)
-        x, y = self.bdf.df[columns[:-1]], self.bdf.df[columns[-1]]
+        print(self.bdf.features)
+        x, y = self.bdf.features.x, self.bdf.features.labels(self.bdf.LABEL)
         x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.25, random_state=0)
         # model = RandomForestClassifier(n_estimators=100)
         model = RandomForestClassifier(n_estimators=100) # TODO play w/
@@ -202,11 +270,15 @@ def main(w2vm, csv_path):
     
     tas = AllTheNewsCSV(csv_path).articles(w2vm)
     
-    #bdf = BiasDataFrame(tas)
-    fdf = FactualnessDataFrame(tas)
+    # vectorize once, in batches, then fit both models from the same features
+    features = featurize_tfidf(tas)
+    METRICS.report() # stage timings, articles and words per second, OOV rate (see metrics.py)
+    # features = featurize_parallel(AllTheNewsCSV(csv_path), '../classifiers/google_news.store')
     
-    bc = NewsClassifier('./test_model', fdf)
+    bc = NewsClassifier('./bias_model', BiasDataFrame(features=features))
     print(bc.confidence)
+    fc = NewsClassifier('./test_model', FactualnessDataFrame(features=features))
+    print(fc.confidence)
     
     # http://www.tfidf.com/
     
@@ -1,7 +1,6 @@
 from sys import argv, maxsize
 from csv import reader, field_size_limit
-from numpy import ndarray, array
-from re import findall
+from numpy import empty, float32
 from pandas import DataFrame, set_option
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
@@ -9,6 +8,11 @@ from sklearn import metrics
 from pickle import load, dump
 from gensim.models import KeyedVectors
 from math import log
+
+from features import FeatureMatrix
+from embedding_cache import SENTENCE_ENCODER
+from batching import BatchEncoder
+from metrics import METRICS
  
 class AllTheNewsCSV:
     
@@ -66,9 +70,10 @@ class AllTheNewsCSV:
         'Washington Post': (0, 2, 1) # left center, high
     }'''
     
-    def __init__(self, path):
+    def __init__(self, path, cache=None):
         field_size_limit(maxsize) # Increase maximum field size, CSV is very large
         self.path = path
+        self.cache = cache # EmbeddingCache of article vectors, None to always encode them
                 
     def articles(self, tfmodel):
         print('Labeling ATN articles from %s' % self.path)
@@ -89,49 +94,77 @@ class AllTheNewsCSV:
                 
 class TrainingArticle:
 
-    WORD_REGEX = "[^a-zA-Z]*([a-zA-Z']+)[^a-zA-Z]*"
-
     def __init__(self, n, bias, factualness, content, tfmodel, atn_csv):
         self.n = n
         self.bias = bias
         self.factualness = factualness
         self.content = content
         self.tfmodel = tfmodel
+        self.atn_csv = atn_csv
              
     def vector(self):
-        return self.tfmodel([self.content])[0]
+        cache = self.atn_csv.cache if self.atn_csv else None
+        if cache is None:
+            return self.tfmodel([self.content])[0]
+        return cache.get_or_compute(SENTENCE_ENCODER, self.content, lambda: self.tfmodel([self.content])[0])
      
+def featurize(tas): # list of training articles
+    # encode each article once, labeled for both bias and factualness
+    features = FeatureMatrix(512)
+    for i, ta in enumerate(tas):
+        METRICS.count('articles')
+        METRICS.progress('Examining training article %d', i + 1)
+        with METRICS.stage('encode'):
+            features.append(ta.vector(), ta.bias, ta.factualness)
+    return features
+
+def featurize_batched(tas, tfmodel, batch_size=32, window=1024): # list of training articles
+    # same as featurize, with the articles encoded in length-bucketed batches (see batching.py)
+    encoder = BatchEncoder(tfmodel, 512, batch_size, window)
+    features = FeatureMatrix(512)
+    for articles in encoder.windows(tas):
+        block = empty((len(articles), 512), dtype=float32)
+        missing = [] # articles the cache (if any) does not have yet
+        for i, ta in enumerate(articles):
+            cache = ta.atn_csv.cache if ta.atn_csv else None
+            vector = cache.get(SENTENCE_ENCODER, ta.content) if cache is not None else None
+            if vector is None:
+                missing.append(i)
+            else:
+                block[i] = vector
+        METRICS.count('articles', len(articles))
+        if missing:
+            with METRICS.stage('encode'):
+                block[missing] = encoder.encode([articles[i].content for i in missing])
+            for i in missing:
+                ta = articles[i]
+                if ta.atn_csv and ta.atn_csv.cache is not None:
+                    ta.atn_csv.cache.put(SENTENCE_ENCODER, ta.content, block[i])
+        features.extend(block, [ta.bias for ta in articles], [ta.factualness for ta in articles])
+        METRICS.progress('Examining training article %d', len(features))
+    return features
+
 class BiasDataFrame:
 
-    def __init__(self, tas):
-        self.__d = self.__create_from(tas)
-        self.df = DataFrame(self.__d, columns=list(self.__d.keys()))
+    LABEL = 'bias'
+
+    def __init__(self, tas=None, features=None): # training articles, or a FeatureMatrix from featurize
+        self.features = featurize(tas) if features is None else features
         
-    def __create_from(self, tas): # list of training articles
-        d = {**{str(i): [] for i in range(0, 512)}, **{'bias': []}}
-        for i, ta in enumerate(tas):
-            print('BIAS: Examining training article %d' % (i + 1), end='\r')
-            vector = [float(x) for x in list(ta.vector())] + [ta.bias]           
-            for i, element in enumerate(vector[:-1]):
-                d[str(i)].append(element) # TODO play with rounding
-            d['bias'].append(vector[-1])
-        return d
+    @property
+    def df(self): # data frame of the features, for inspection
+        return self.features.frame(self.LABEL) # TODO play with rounding
         
 class FactualnessDataFrame:
 
-    def __init__(self, tas):
-        self.__d = self.__create_from(tas)
-        self.df = DataFrame(self.__d, columns=list(self.__d.keys()))
+    LABEL = 'factualness'
+
+    def __init__(self, tas=None, features=None): # training articles, or a FeatureMatrix from featurize
+        self.features = featurize(tas) if features is None else features
         
-    def __create_from(self, tas): # list of training articles
-        d = {**{str(i): [] for i in range(0, 512)}, **{'factualness': []}}
-        for i, ta in enumerate(tas):
-            print('FACTUALNESS: Examining training article %d' % (i + 1), end='\r')
-            vector = [float(x) for x in list(ta.vector())] + [ta.factualness]
-            for i, element in enumerate(vector[:-1]):
-                d[str(i)].append(element) # TODO play with rounding
-            d['factualness'].append(vector[-1])
-        return d
+    @property
+    def df(self): # data frame of the features, for inspection
+        return self.features.frame(self.LABEL) # TODO play with rounding
         
 class NewsClassifier:
 
@@ -141,9 +174,8 @@ class NewsClassifier:
         
     def __create(self):
         # set_option('display.max_rows', None) # to print entire dataframe
-        print(self.bdf.df)
-        columns = list(self.bdf.df.columns)
-        x, y = self.bdf.df[columns[:-1]], self.bdf.df[columns[-1]]
+        print(self.bdf.features)
+        x, y = self.bdf.features.x, self.bdf.features.labels(self.bdf.LABEL)
         x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.25, random_state=0)
         # model = RandomForestClassifier(n_estimators=100)
         model = RandomForestClassifier(n_estimators=100) # TODO play w/
@@ -161,11 +193,14 @@ def main(tfmodel, csv_path):
     
     tas = AllTheNewsCSV(csv_path).articles(tfmodel)
     
-    #frame = BiasDataFrame(tas)
-    frame = FactualnessDataFrame(tas)
+    # encode once, then fit both models from the same features
+    features = featurize_batched(tas, tfmodel)
+    METRICS.report() # encode time and articles per second (see metrics.py)
     
-    bc = NewsClassifier('./X_fact_model', frame)
+    bc = NewsClassifier('./X_bias_model', BiasDataFrame(features=features))
     print(bc.confidence)
+    fc = NewsClassifier('./X_fact_model', FactualnessDataFrame(features=features))
+    print(fc.confidence)
     
     # http://www.tfidf.com/
     
@@ -0,0 +1,38 @@
+from itertools import islice
+from numpy import asarray, empty, float32
+
+# Objective: run a sentence encoder over many articles in length-bucketed batches instead of one call each
+#
+# The encoder can be any callable taking a list of texts and returning one row per text, e.g.
+# tfmodel.MODEL, or a stub such as lambda texts: numpy.zeros((len(texts), 512)) in testing.
+# Sorting a window of articles by length before batching keeps each batch's texts of similar size,
+# so an encoder that pads to the longest text in a batch wastes little work.
+
+class BatchEncoder:
+
+    # Initialize with an encoder, the width of its vectors, texts per encoder call and texts sorted together
+    def __init__(self, encoder, width=512, batch_size=32, window=1024):
+        self.encoder = encoder
+        self.width = width
+        self.batch_size = batch_size
+        self.window = max(window, batch_size)
+        self.calls = 0 # number of encoder calls
+
+    # Encode a list of texts, returning a float32 block with one row per text in the given order
+    def encode(self, texts):
+        out = empty((len(texts), self.width), dtype=float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            out[batch] = asarray(self.encoder([texts[i] for i in batch]), dtype=float32)
+            self.calls += 1
+        return out
+
+    # Split a stream of items into lists of window items, each list is encoded (and sorted) together
+    def windows(self, items):
+        items = iter(items)
+        while True:
+            window = list(islice(items, self.window))
+            if not window:
+                return
+            yield window
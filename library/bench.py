@@ -0,0 +1,307 @@
+from numpy import arange, cumsum, searchsorted, float32
+from numpy.random import default_rng
+from multiprocessing import get_context, get_start_method, set_start_method
+from queue import Empty
+from resource import getrusage, RUSAGE_SELF
+from contextlib import redirect_stdout
+from argparse import ArgumentParser
+from time import perf_counter
+from csv import reader, writer, field_size_limit
+from json import dump, load
+from os import makedirs, listdir, remove, devnull
+from os.path import join, exists
+from sys import exit, maxsize, platform
+from pickle import dump as dump_pickle, load as load_pickle
+from sklearn.ensemble import RandomForestClassifier
+
+import w2v_store
+from ml import W2VClassifier, Classifier, BiasClassifier, FactualnessClassifier
+from atn import AllTheNewsCSV, featurize_tfidf
+from df_index import DocumentFrequencies
+from features import FeatureMatrix
+from forest import FlatForest
+from tokenizer import words
+
+# Objective: time each stage of the training pipeline on synthetic data and flag regressions against a baseline
+#
+# generate writes a work directory of made-up articles drawn from a Zipf-distributed vocabulary:
+#   atn.csv     All The News rows (,id,title,publication,author,date,year,month,url,content)
+#   ta/         training articles as rss_scrape.py writes them (link, header, blank line, body)
+#   w2v/        a word2vec store (see w2v_store.py) of random vectors for most of the vocabulary
+# Each stage runs in a fresh process and reads what the stages before it left in the work directory.
+# Its peak RSS is the stage process's VmHWM (imports and inputs included, the stage's own worker pools
+# not), which a new process starts afresh, unlike ru_maxrss that carries over the launcher's peak.
+# Stage output (progress lines, see metrics.py) goes to /dev/null unless --verbose.
+#
+#   $ python bench.py /tmp/bench --articles 5000 --save-baseline bench.json
+#   $ python bench.py /tmp/bench --articles 5000 --baseline bench.json
+
+WIDTH = 300 # atn and ml build 300 wide feature matrices
+COVERAGE = 0.8 # fraction of the vocabulary given a vector, the rest is out of vocabulary
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+# Make a vocabulary of distinct random lowercase words, most common first
+def vocabulary(rng, size):
+    made = {}
+    while len(made) < size:
+        length = int(rng.integers(2, 11))
+        made[''.join(rng.choice(list(LETTERS), length))] = None
+    return list(made)
+
+# Make the text of one article, sentences of Zipf-distributed words
+def article_text(rng, vocabulary, cumulative, length):
+    picked = searchsorted(cumulative, rng.random(length) * cumulative[-1])
+    sentences = []
+    for start in range(0, length, 15):
+        sentence = [vocabulary[i] for i in picked[start:start + 15]]
+        sentence[0] = sentence[0].capitalize()
+        sentences.append(' '.join(sentence) + '.')
+    return ' '.join(sentences)
+
+# Write the synthetic corpus and word2vec store of a configuration, unless the work directory already has them
+def generate(work, config):
+    if exists(join(work, 'config.json')):
+        with open(join(work, 'config.json'), 'r') as i:
+            if load(i) == config:
+                return
+    print('Generating %(articles)d articles of about %(words)d words over %(vocabulary)d words in' % config, work)
+    makedirs(join(work, 'ta'), exist_ok=True)
+    for name in listdir(join(work, 'ta')):
+        # a smaller corpus must not keep the articles of a bigger one
+        if name.startswith('ta.'):
+            remove(join(work, 'ta', name))
+    rng = default_rng(config['seed'])
+    words_ = vocabulary(rng, config['vocabulary'])
+    cumulative = cumsum(1 / arange(1, len(words_) + 1))
+    publications = list(AllTheNewsCSV.PUBLICATIONS)
+    biases, factualnesses = list(BiasClassifier.SCALE), list(FactualnessClassifier.SCALE)
+    field_size_limit(maxsize)
+    with open(join(work, 'atn.csv'), 'w', newline='') as o:
+        atn_csv = writer(o)
+        atn_csv.writerow(['', 'id', 'title', 'publication', 'author', 'date', 'year', 'month', 'url', 'content'])
+        for i in range(config['articles']):
+            length = int(rng.integers(config['words'] // 2, config['words'] * 3 // 2 + 1))
+            text = article_text(rng, words_, cumulative, length)
+            publication = publications[int(rng.integers(len(publications)))]
+            atn_csv.writerow([i, i, 'Article %d' % i, publication, 'Author', '2017-01-01', 2017, 1,
+                              'https://example.com/%d' % i, text])
+            with open(join(work, 'ta', 'ta.%d.txt' % i), 'w') as ta_out:
+                ta_out.write('https://example.com/%d\n' % i)
+                ta_out.write('%s,%s,%s,USA\n\n' % (publication, biases[int(rng.integers(len(biases)))],
+                                                    factualnesses[int(rng.integers(len(factualnesses)))]))
+                ta_out.write(text)
+    known = [word for word in words_ if rng.random() < COVERAGE]
+    w2v_store.write(join(work, 'w2v'), known, rng.standard_normal((len(known), WIDTH)).astype(float32))
+    with open(join(work, 'config.json'), 'w') as o:
+        dump(config, o)
+
+# Article contents of the synthetic CSV
+def contents(work):
+    field_size_limit(maxsize)
+    with open(join(work, 'atn.csv'), 'r') as master_text:
+        master_csv = reader(master_text, delimiter=',')
+        next(master_csv) # skip the header line
+        return [e[9] for e in master_csv]
+
+# Stages, in pipeline order; each returns (articles, bytes of text, seconds), timing only its own work
+# (not loading models or the outputs of earlier stages); bytes are 0 where they mean nothing
+
+def tokenize(work, options):
+    texts = contents(work)
+    start = perf_counter()
+    for text in texts:
+        words(text)
+    return len(texts), sum(len(text) for text in texts), perf_counter() - start
+
+def tally(work, options):
+    start = perf_counter()
+    df = DocumentFrequencies.build(join(work, 'atn.csv'), options['processes'])
+    df.save(join(work, 'atn.csv'))
+    return df.n, 0, perf_counter() - start
+
+def vectorize_atn(work, options):
+    w2vm = W2VClassifier(join(work, 'w2v'))
+    atn_csv = AllTheNewsCSV(join(work, 'atn.csv'), options['processes'])
+    start = perf_counter()
+    features = featurize_tfidf(atn_csv.articles(w2vm))
+    elapsed = perf_counter() - start
+    features.save(join(work, 'atn.features'))
+    return len(features), 0, elapsed
+
+def vectorize_ta(work, options):
+    w2vm = W2VClassifier(join(work, 'w2v'))
+    start = perf_counter()
+    features = Classifier().create_features(join(work, 'ta'), w2vm, processes=options['processes'])
+    elapsed = perf_counter() - start
+    features.save(join(work, 'ta.features'))
+    return len(features), 0, elapsed
+
+def frame(work, options):
+    features = FeatureMatrix.load(join(work, 'atn.features'), mmap_mode=None)
+    start = perf_counter()
+    features.frame(BiasClassifier.LABEL, BiasClassifier.DECIMALS)
+    features.frame(FactualnessClassifier.LABEL, FactualnessClassifier.DECIMALS)
+    return len(features), 0, perf_counter() - start
+
+def fit(work, options):
+    features = FeatureMatrix.load(join(work, 'atn.features'), mmap_mode=None)
+    start = perf_counter()
+    model = RandomForestClassifier(n_estimators=options['trees'], random_state=0)
+    model.fit(features.x, features.labels('bias'))
+    elapsed = perf_counter() - start
+    with open(join(work, 'bias.model'), 'wb') as o:
+        dump_pickle(model, o)
+    return len(features), 0, elapsed
+
+def predict(work, options):
+    features = FeatureMatrix.load(join(work, 'atn.features'), mmap_mode=None)
+    with open(join(work, 'bias.model'), 'rb') as i:
+        model = load_pickle(i)
+    start = perf_counter()
+    model.predict(features.x)
+    return len(features), 0, perf_counter() - start
+
+def predict_flat(work, options):
+    features = FeatureMatrix.load(join(work, 'atn.features'), mmap_mode=None)
+    with open(join(work, 'bias.model'), 'rb') as i:
+        forest = FlatForest.flatten(load_pickle(i))
+    start = perf_counter()
+    forest.predict(features.x)
+    return len(features), 0, perf_counter() - start
+
+STAGES = {
+    'tokenize': tokenize,
+    'tally': tally,
+    'vectorize_atn': vectorize_atn,
+    'vectorize_ta': vectorize_ta,
+    'frame': frame,
+    'fit': fit,
+    'predict': predict,
+    'predict_flat': predict_flat,
+}
+
+# Peak resident set size of this process, in MB
+def peak_rss():
+    try:
+        with open('/proc/self/status', 'r') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024 # in kB
+    except OSError:
+        pass
+    # without /proc (macOS), ru_maxrss is the best there is, though it may include the launcher's peak
+    return getrusage(RUSAGE_SELF).ru_maxrss / (1024 * 1024 if platform == 'darwin' else 1024)
+
+# Run one stage (in a fresh process, see measure), returning its measurements
+def run_stage(name, work, options):
+    with open(devnull, 'w') as quiet:
+        if options['verbose']:
+            articles, size, seconds = STAGES[name](work, options)
+        else:
+            with redirect_stdout(quiet):
+                articles, size, seconds = STAGES[name](work, options)
+    return {'seconds': seconds, 'articles': articles, 'bytes': size, 'peak_rss_mb': peak_rss()}
+
+def stage_process(name, work, options, results, start_method):
+    # spawned processes default to spawning their own pools; the stages' pools start as they would unbenchmarked
+    set_start_method(start_method, force=True)
+    results.put(run_stage(name, work, options))
+
+# Run a stage repeat times, each in a fresh process, keeping the fastest run
+# (a Process rather than a Pool, whose daemonic workers could not start the stages' own pools)
+def measure(name, work, options, repeat=1):
+    context = get_context('spawn')
+    best = None
+    for _ in range(repeat):
+        results = context.Queue()
+        process = context.Process(target=stage_process, args=(name, work, options, results, get_start_method()))
+        process.start()
+        while True:
+            try:
+                result = results.get(timeout=1)
+                break
+            except Empty:
+                if not process.is_alive():
+                    raise Exception('Stage %s failed with exit code %s' % (name, process.exitcode))
+        process.join()
+        if best is None or result['seconds'] < best['seconds']:
+            best = result
+    return best
+
+# Compare results with a baseline, returning {stage: [regressions]} for stages slower or bigger by more than tolerance
+def compare(results, baseline, tolerance=0.25, floor=0.05):
+    regressions = {}
+    for name, result in results.items():
+        if name not in baseline['stages']:
+            continue
+        base = baseline['stages'][name]
+        found = []
+        # stages faster than floor seconds are mostly noise, so they are only flagged past the floor too
+        if result['seconds'] > base['seconds'] * (1 + tolerance) and result['seconds'] - base['seconds'] > floor:
+            found.append('time')
+        if result['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            found.append('memory')
+        if found:
+            regressions[name] = found
+    return regressions
+
+def change(now, then):
+    return '%+.1f%%' % ((now / then - 1) * 100) if then else '-'
+
+def report(results, baseline=None, regressions=None):
+    print('%-14s %10s %12s %10s %12s %10s %10s %s' % ('stage', 'seconds', 'articles/s', 'MB/s', 'peak RSS MB',
+                                                      'time', 'memory', ''))
+    for name, result in results.items():
+        seconds = result['seconds']
+        rate = '%.1f' % (result['articles'] / seconds) if seconds else '-'
+        mbs = '%.1f' % (result['bytes'] / seconds / 1e6) if seconds and result['bytes'] else '-'
+        base = baseline['stages'].get(name) if baseline else None
+        time_change = change(seconds, base['seconds']) if base else '-'
+        memory_change = change(result['peak_rss_mb'], base['peak_rss_mb']) if base else '-'
+        flag = 'REGRESSION (%s)' % ', '.join(regressions[name]) if regressions and name in regressions else ''
+        print('%-14s %10.3f %12s %10s %12.1f %10s %10s %s' % (name, seconds, rate, mbs, result['peak_rss_mb'],
+                                                             time_change, memory_change, flag))
+
+def main():
+    parser = ArgumentParser(description='Time the training pipeline stage by stage on a synthetic corpus')
+    parser.add_argument('work', help='directory for the synthetic corpus and stage outputs, reused across runs')
+    parser.add_argument('--articles', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=400, help='mean words per article')
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--processes', type=int, default=1, help='processes of the stages that shard the CSV or load ta/')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=1, help='runs of each stage, the fastest is kept')
+    parser.add_argument('--baseline', default=None, help='JSON results of an earlier run to compare with')
+    parser.add_argument('--save-baseline', default=None, help='write this run\'s results as a baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='slowdown or growth flagged as a regression')
+    parser.add_argument('--verbose', action='store_true', help='show the output of the stages')
+    args = parser.parse_args()
+    config = {'articles': args.articles, 'words': args.words, 'vocabulary': args.vocabulary, 'seed': args.seed}
+    options = {'trees': args.trees, 'processes': args.processes, 'verbose': args.verbose}
+    generate(args.work, config)
+    results = {}
+    for name in [name for name in STAGES if name in args.stages]:
+        print('Running %-14s' % name, end='\r')
+        results[name] = measure(name, args.work, options, args.repeat)
+    print()
+    baseline, regressions = None, None
+    if args.baseline:
+        with open(args.baseline, 'r') as i:
+            baseline = load(i)
+        if baseline['config'] != {**config, 'trees': args.trees, 'processes': args.processes}:
+            print('Warning: the baseline was run with %s' % baseline['config'])
+        regressions = compare(results, baseline, args.tolerance)
+    report(results, baseline, regressions)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as o:
+            dump({'config': {**config, 'trees': args.trees, 'processes': args.processes}, 'stages': results}, o,
+                 indent=2)
+        print('Wrote baseline %s' % args.save_baseline)
+    if regressions:
+        print('%d regressions beyond %.0f%%' % (len(regressions), args.tolerance * 100))
+        exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+from csv import reader, field_size_limit
+from io import StringIO
+from multiprocessing import Pool, cpu_count
+from os import stat, replace
+from os.path import exists
+from sys import maxsize
+from numpy import array, asarray, load, savez, linspace, searchsorted, unique, int64
+
+# Objective: index the byte offset of every All The News CSV record for sharded and random access
+#
+# Records may span lines (the content column holds quoted, multiline article text), so a record
+# ends at the first newline outside quotes. Escaped quotes ("") keep the quote parity, so counting
+# the quotes on each line is enough to find record boundaries without parsing the fields.
+# The index is kept beside the CSV (master.csv -> master.csv.idx) with the CSV's size and mtime.
+
+VERSION = 1
+SHARDS_PER_PROCESS = 8 # more, smaller shards keep results streaming and workers evenly loaded
+
+# Get the sidecar path of a CSV
+def sidecar(path):
+    return path + '.idx'
+
+# Get the (size, mtime) stamp a sidecar must match
+def stamp(path):
+    st = stat(path)
+    return st.st_size, st.st_mtime_ns
+
+# Find the byte offset of every record; the first record is the header, the last offset is the file size
+def scan(path):
+    offsets = [0]
+    position = 0
+    quoted = False
+    with open(path, 'rb') as master:
+        for line in master:
+            position += len(line)
+            if line.count(b'"') % 2:
+                quoted = not quoted
+            if not quoted:
+                offsets.append(position)
+    if offsets[-1] != position: # unterminated quote at the end of the file
+        offsets.append(position)
+    return array(offsets, dtype=int64)
+
+# Parse the records between two byte offsets into lists of fields
+def parse(path, begin, end):
+    field_size_limit(maxsize) # Increase maximum field size, CSV is very large
+    with open(path, 'rb') as master:
+        master.seek(begin)
+        text = master.read(end - begin).decode('utf-8')
+    # Translate line endings as open(path, 'r') does for the serial readers
+    return list(reader(StringIO(text, newline=None), delimiter=','))
+
+class RecordIndex:
+
+    # Initialize with a CSV path and its record offsets (see scan)
+    def __init__(self, path, offsets):
+        self.path = path
+        self.offsets = offsets
+        self.header = parse(path, offsets[0], offsets[1])[0] if len(offsets) > 1 else []
+
+    # Number of rows, not counting the header
+    def __len__(self):
+        return max(len(self.offsets) - 2, 0)
+
+    # Get row n (0 is the first row after the header) without scanning the file
+    def row(self, n):
+        if not 0 <= n < len(self):
+            raise IndexError('row %d is outside %s (%d rows)' % (n, self.path, len(self)))
+        return parse(self.path, self.offsets[n + 1], self.offsets[n + 2])[0]
+
+    # Get rows [start, stop) with one read
+    def rows(self, start, stop):
+        stop = min(stop, len(self))
+        if start >= stop:
+            return []
+        return parse(self.path, self.offsets[start + 1], self.offsets[stop + 1])
+
+    # Split the rows into at most k (first row, stop row) ranges of similar size in bytes
+    def shards(self, k):
+        if not len(self):
+            return []
+        body = self.offsets[1:]
+        targets = linspace(body[0], body[-1], k + 1)
+        bounds = unique(searchsorted(body, targets).clip(0, len(self)))
+        bounds[0], bounds[-1] = 0, len(self)
+        bounds = unique(bounds)
+        return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    # Load the sidecar of a CSV, or None if it is missing or stale
+    @staticmethod
+    def load(path):
+        if not exists(sidecar(path)):
+            return None
+        with load(sidecar(path)) as saved:
+            if int(saved['version']) != VERSION or tuple(saved['stamp']) != stamp(path):
+                return None
+            return RecordIndex(path, saved['offsets'])
+
+    # Write the sidecar of a CSV (atomically, so a crash never leaves half a file)
+    def save(self):
+        temp = sidecar(self.path) + '.tmp.npz'
+        savez(temp, version=VERSION, stamp=asarray(stamp(self.path), dtype=int64), offsets=self.offsets)
+        replace(temp, sidecar(self.path))
+
+    # Load the sidecar of a CSV, scanning the CSV and saving the sidecar first if needed
+    @staticmethod
+    def open(path):
+        index = RecordIndex.load(path)
+        if index is None:
+            print('Indexing records of %s' % path)
+            index = RecordIndex(path, scan(path))
+            index.save()
+        return index
+
+# Apply function to a shard of rows; per_row applies it to every row instead of the whole list
+def run_shard(task):
+    path, begin, end, function, per_row = task
+    rows = parse(path, begin, end)
+    if per_row:
+        return [function(row) for row in rows]
+    return function(rows)
+
+class ShardedReader:
+
+    # Initialize with a CSV path and a process count (all cores by default)
+    def __init__(self, path, processes=None):
+        self.index = RecordIndex.open(path)
+        self.processes = processes or cpu_count()
+
+    # Get the shard tasks for a function
+    def __tasks(self, function, per_row, shards):
+        offsets = self.index.offsets
+        for start, stop in self.index.shards(shards or self.processes * SHARDS_PER_PROCESS):
+            yield self.index.path, int(offsets[start + 1]), int(offsets[stop + 1]), function, per_row
+
+    # Yield function(rows) for each shard of rows; function and initializer must be module-level
+    def map_shards(self, function, initializer=None, initargs=(), ordered=True, shards=None):
+        tasks = self.__tasks(function, False, shards)
+        if self.processes == 1:
+            if initializer:
+                initializer(*initargs)
+            yield from map(run_shard, tasks)
+            return
+        with Pool(self.processes, initializer, initargs) as pool:
+            yield from (pool.imap if ordered else pool.imap_unordered)(run_shard, tasks)
+
+    # Yield function(row) for every row, in the CSV's order unless ordered is False
+    def map(self, function, initializer=None, initargs=(), ordered=True, shards=None):
+        tasks = self.__tasks(function, True, shards)
+        if self.processes == 1:
+            if initializer:
+                initializer(*initargs)
+            for results in map(run_shard, tasks):
+                yield from results
+            return
+        with Pool(self.processes, initializer, initargs) as pool:
+            for results in (pool.imap if ordered else pool.imap_unordered)(run_shard, tasks):
+                yield from results
@@ -1,12 +1,31 @@
 from urllib.request import urlopen
 from re import findall
+from json import dumps, loads
+from os import replace
+from os.path import exists
+
+from fetcher import Fetcher
+from http_cache import HTTPCache
 
 # Objective: use Media Bias Fact Check URLs to derive and store source URLs
+#
+# Pages are downloaded concurrently (see fetcher.py) through an on-disk cache (see http_cache.py), so
+# a refresh only transfers pages that changed. Each finished row is appended, in batches, to a progress
+# file beside the destination (<destination>.progress, one JSON object per raw row); an interrupted run
+# picks up where it stopped. In incremental mode rows already in the progress file with the same raw
+# line are kept as they are, so only new or edited rows of the raw ledger are fetched at all.
+
+HEADER = 'source,url,publication,bias,factualness,country'
 
 class CSVLedger:
 
-    def __init__(self, path):
+    # Initialize with a raw ledger (url,publication,bias,factual,country) and an HTTP cache directory
+    def __init__(self, path, cache='./mbfc_cache', fetcher=None):
         self.path = path
+        self.fetcher = fetcher or Fetcher(workers=8, per_host=4, cache=HTTPCache(cache))
+        self.unmapped = 0 # rows with a bias or factualness we have no label for
+        self.unsourced = 0 # rows whose page names no source
+        self.failed = 0
 
     BIAS = {
         # 'extreme_left' # we may need some of these!
@@ -17,7 +36,7 @@ class CSVLedger:
         'RIGHT BIAS': 'right',
         # 'extreme_right' # we may need some of these!
     }
-    
+
     FACTUALNESS = {
         # 'very_low' # we may need some of these!
         # 'low' # we may need some of these!
@@ -25,36 +44,92 @@ class CSVLedger:
         'MOSTLY FACTUAL': 'mostly_factual',
         'HIGH': 'high',
         'VERY HIGH': 'very_high',
+        'VERY-HIGH': 'very_high', # spelling used by a few MBFC pages
     }
-        
-    def transcribe_to(self, path):
+
+    # Load {raw line: destination row or None} from a progress file
+    @staticmethod
+    def __progress(path):
+        done = {}
+        if exists(path):
+            with open(path, 'r') as progress:
+                for line in progress:
+                    try:
+                        entry = loads(line)
+                    except ValueError:
+                        break # torn last line of an interrupted run
+                    done[entry['line']] = entry['row']
+        return done
+
+    def transcribe_to(self, path, incremental=True, batch=50):
+        progress_path = path + '.progress'
+        done = self.__progress(progress_path) if incremental else {}
         with open(self.path, 'r') as log:
-            for line in log.readlines()[1:]:
-                url, name, bias, factualness, country = line.split(',')
-                source = CSVLedger.MBFCURL(url).source
-                if not source: continue
-                translated_bias = self.BIAS[bias]
-                translated_factualness = self.FACTUALNESS[factualness]
-                s = ','.join([source, url, name, translated_bias, translated_factualness, country]).strip()
-                print(s)
-                with open(path, 'a') as destination:
-                    destination.write(s + "\n")
-                
+            lines = [line.strip() for line in log.readlines()[1:] if line.strip()]
+        jobs = []
+        for n, line in enumerate(lines):
+            if line in done:
+                continue
+            url, name, bias, factualness, country = line.split(',')
+            if bias not in self.BIAS or factualness not in self.FACTUALNESS:
+                print('%s: no label for %s / %s, skipped' % (url, bias, factualness))
+                self.unmapped += 1
+                done[line] = None
+                continue
+            jobs.append((n, url))
+        print('%d rows, %d to fetch' % (len(lines), len(jobs)))
+        with open(progress_path, 'w' if not incremental else 'a') as progress:
+            pending = []
+            for n, url, source, error in self.fetcher.fetch(jobs, CSVLedger.source_of):
+                line = lines[n]
+                if error:
+                    print(url, 'skipped,', error)
+                    self.failed += 1
+                    continue # not recorded, so the next run tries again
+                if not source:
+                    self.unsourced += 1
+                    row = None
+                else:
+                    url, name, bias, factualness, country = line.split(',')
+                    row = ','.join([source, url, name, self.BIAS[bias], self.FACTUALNESS[factualness], country])
+                    print(row)
+                done[line] = row
+                pending.append(dumps({'line': line, 'row': row}) + '\n')
+                if len(pending) >= batch:
+                    progress.writelines(pending)
+                    progress.flush()
+                    pending = []
+            progress.writelines(pending)
+        # the destination is rewritten whole, in raw ledger order, once every row is known
+        rows = [done[line] for line in lines if done.get(line)]
+        with open(path + '.tmp', 'w') as destination:
+            destination.write(HEADER + '\n')
+            destination.writelines(row + '\n' for row in rows)
+        replace(path + '.tmp', path)
+        print('Wrote %d sources to %s (%d unlabeled, %d without a source, %d failed)' % (
+            len(rows), path, self.unmapped, self.unsourced, self.failed))
+
+    # Get the source domain named on a downloaded MBFC page (run in the fetcher's worker threads)
+    @staticmethod
+    def source_of(response):
+        return CSVLedger.MBFCURL(response.url, str(response.content)).source
+
     class MBFCURL: # Media Bias Fact Check URL
-    
-        def __init__(self, url):
+
+        def __init__(self, url, contents=None):
             self.url = url
-            self.contents = self.__contents()
+            self.contents = contents if contents is not None else self.__contents()
             self.source = self.__source()
-            
+
         def __contents(self):
             return str(urlopen(self.url).read())
-            
+
         def __source(self):
             matches = findall('Source:[^<]*<a href="([^"]+)"', self.contents)
             if not matches: return None
             return str(matches[0]).split('/')[2].replace('www.', '')
-                
-l = CSVLedger('/Users/dbordeleau/Desktop/sapience/labels/bias_labels.csv')
-l.transcribe_to('./new_ledger.csv')
-# <p>Source: <a href="https://news.abs-cbn.com/"
\ No newline at end of file
+
+if __name__ == '__main__':
+    l = CSVLedger('/Users/dbordeleau/Desktop/sapience/labels/bias_labels.csv')
+    l.transcribe_to('./new_ledger.csv')
+# <p>Source: <a href="https://news.abs-cbn.com/"
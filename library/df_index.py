@@ -0,0 +1,82 @@
+from collections import Counter
+from pickle import load, dump, HIGHEST_PROTOCOL
+from os import replace
+from os.path import exists
+
+from csv_index import ShardedReader, stamp
+from tokenizer import words
+
+# Objective: tally All The News document frequencies in one pass and keep them in a sidecar file
+#
+# The sidecar sits next to the CSV (master.csv -> master.csv.df) and records the CSV's size and
+# mtime, so it is rebuilt only when the CSV changes.
+
+VERSION = 2 # 2: words come from tokenizer.py
+
+# Get the sidecar path of a CSV
+def sidecar(path):
+    return path + '.df'
+
+# Tally the distinct words of a list of article contents, returning (articles, document frequencies)
+def tally(contents):
+    counts = Counter()
+    for content in contents:
+        counts.update(set(words(content)))
+    return len(contents), counts
+
+# Tally a shard of ATN CSV rows
+def tally_rows(rows):
+    # ,id,title,publication,author,date,year,month,url,content
+    return tally([e[9] for e in rows])
+
+class DocumentFrequencies:
+
+    # Initialize with the number of articles and a {'word': number of articles containing it} dictionary
+    def __init__(self, n, counts):
+        self.n = n
+        self.counts = counts
+
+    # Merge the tallies of another shard into this one
+    def merge(self, n, counts):
+        self.n += n
+        self.counts.update(counts)
+
+    # Tally a CSV from scratch, one byte-range shard per task spread over processes
+    @staticmethod
+    def build(path, processes=None):
+        print('Tallying words of ATN articles from %s' % path)
+        df = DocumentFrequencies(0, Counter())
+        for n, counts in ShardedReader(path, processes).map_shards(tally_rows, ordered=False):
+            df.merge(n, counts)
+        df.counts = dict(df.counts)
+        return df
+
+    # Load the sidecar of a CSV, or None if it is missing or stale
+    @staticmethod
+    def load(path):
+        if not exists(sidecar(path)):
+            return None
+        with open(sidecar(path), 'rb') as i:
+            saved = load(i)
+        if saved['version'] != VERSION or saved['stamp'] != stamp(path):
+            return None
+        return DocumentFrequencies(saved['n'], saved['counts'])
+
+    # Write the sidecar of a CSV (atomically, so a crash never leaves half a file)
+    def save(self, path):
+        temp = sidecar(path) + '.tmp'
+        with open(temp, 'wb') as o:
+            dump({'version': VERSION, 'stamp': stamp(path), 'n': self.n, 'counts': self.counts}, o,
+                 protocol=HIGHEST_PROTOCOL)
+        replace(temp, sidecar(path))
+
+    # Load the sidecar of a CSV, building and saving it first if needed
+    @staticmethod
+    def open(path, processes=None):
+        df = DocumentFrequencies.load(path)
+        if df is None:
+            df = DocumentFrequencies.build(path, processes)
+            df.save(path)
+        else:
+            print('Loaded ATN document frequencies from %s' % sidecar(path))
+        return df
@@ -0,0 +1,87 @@
+from numpy import array, asarray, zeros, concatenate, float64, int64, add, cumsum, flatnonzero
+
+from metrics import METRICS
+
+# Objective: represent token lists as word2vec vectors with one gather and one reduce
+
+# Ways of reducing the gathered word vectors of an article
+MEAN, SUM, WEIGHTED = 'mean', 'sum', 'weighted'
+
+# Get a word -> row mapping for a loaded word2vec model
+def vocabulary_of(model):
+    # gensim >= 4.0 (and our own stores) keep a plain word -> row mapping
+    if hasattr(model, 'key_to_index'):
+        return model.key_to_index
+    # gensim 3.x keeps a Vocab object per word
+    return {word: entry.index for word, entry in model.vocab.items()}
+
+class Embedder:
+
+    # Initialize with a loaded word2vec model (KeyedVectors or compatible)
+    def __init__(self, model):
+        self.model = model
+        self.vocabulary = vocabulary_of(model)
+        self.matrix = model.vectors
+        # Quantized stores (see w2v_pack.py) keep one scale per row
+        self.scales = getattr(model, 'scales', None)
+        self.width = self.matrix.shape[1]
+
+    # Map tokens to vocabulary rows in one pass, returning (rows, positions of in-vocabulary tokens)
+    def indices(self, tokens):
+        get = self.vocabulary.get
+        rows, positions = [], []
+        for position, token in enumerate(tokens):
+            row = get(token)
+            if row is not None:
+                rows.append(row)
+                positions.append(position)
+        return array(rows, dtype=int64), array(positions, dtype=int64)
+
+    # Gather the rows of the embedding matrix as float64 (the precision Article.get_vector sums in)
+    def rows(self, indices):
+        rows = self.matrix[indices].astype(float64)
+        if self.scales is not None:
+            rows *= self.scales[indices][:, None]
+        return rows
+
+    # Represent one list of tokens as a 1-D vector
+    def vector(self, tokens, how=MEAN, weights=None, length=None):
+        tokens = list(tokens)
+        rows, positions = self.indices(tokens)
+        METRICS.count('embedded_words', len(tokens))
+        METRICS.count('oov_words', len(tokens) - len(rows))
+        gathered = self.rows(rows)
+        if how == WEIGHTED:
+            gathered *= asarray(weights, dtype=float64)[positions, None]
+        total = gathered.sum(axis=0) if len(rows) else zeros(self.width, dtype=float64)
+        if how == SUM:
+            return total
+        # Out of vocabulary tokens still count towards the length, as in Article.get_vector
+        return total / (len(tokens) if length is None else length)
+
+    # Represent many lists of tokens as a 2-D array, one row per list
+    def vectors(self, token_lists, how=MEAN, weights=None, lengths=None):
+        token_lists = [list(tokens) for tokens in token_lists]
+        all_rows, all_weights, counts = [], [], []
+        for i, tokens in enumerate(token_lists):
+            rows, positions = self.indices(tokens)
+            all_rows.append(rows)
+            counts.append(len(rows))
+            if how == WEIGHTED:
+                all_weights.append(asarray(weights[i], dtype=float64)[positions])
+        METRICS.count('embedded_words', sum(len(tokens) for tokens in token_lists))
+        METRICS.count('oov_words', sum(len(tokens) for tokens in token_lists) - sum(counts))
+        totals = zeros((len(token_lists), self.width), dtype=float64)
+        if sum(counts):
+            gathered = self.rows(concatenate(all_rows))
+            if how == WEIGHTED:
+                gathered *= concatenate(all_weights)[:, None]
+            # Reduce each article's slice of the gathered rows; empty articles stay at zero
+            starts = cumsum([0] + counts[:-1])
+            filled = flatnonzero(asarray(counts))
+            totals[filled] = add.reduceat(gathered, starts[filled], axis=0)
+        if how == SUM:
+            return totals
+        if lengths is None:
+            lengths = [len(tokens) for tokens in token_lists]
+        return totals / asarray(lengths, dtype=float64)[:, None]
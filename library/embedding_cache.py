@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from hashlib import sha1
+from json import dump as dump_json, load as load_json
+from os import makedirs, replace
+from os.path import join, exists
+from numpy import asarray, float32
+from numpy.lib.format import open_memmap
+
+# Objective: keep article vectors on disk so re-training on an unchanged corpus skips the embedding
+#
+# A cache is a directory holding:
+#   vectors.npy  (capacity, width) float32 rows, memory-mapped
+#   index.json   width, capacity and [key, row] pairs in least to most recently used order
+#
+# Keys hash the embedder identifier with the article text, so the same text embedded another way
+# (word2vec mean, TF-IDF weighted word2vec, universal sentence encoder) gets its own row. Once every
+# row is used, the least recently used article is evicted.
+
+# Identifiers of the embedders we cache; include anything that changes the vectors (e.g. the word2vec pack)
+W2V_MEAN = 'word2vec-mean'
+W2V_TFIDF = 'word2vec-tfidf'
+SENTENCE_ENCODER = 'universal-sentence-encoder-large-5'
+
+VECTORS, INDEX = 'vectors.npy', 'index.json'
+
+class EmbeddingCache:
+
+    # Initialize with a directory, the width of the vectors and the maximum number of vectors kept
+    def __init__(self, path, width, capacity=100000):
+        makedirs(path, exist_ok=True)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        if exists(join(path, INDEX)):
+            with open(join(path, INDEX), 'r') as i:
+                saved = load_json(i)
+            if saved['width'] != width:
+                raise Exception('Cache %s holds %d-wide vectors, not %d' % (path, saved['width'], width))
+            self.width, self.capacity = saved['width'], saved['capacity']
+            self.rows = OrderedDict(saved['rows'])
+            self.vectors = open_memmap(join(path, VECTORS), mode='r+')
+        else:
+            self.width, self.capacity = width, capacity
+            self.rows = OrderedDict()
+            self.vectors = open_memmap(join(path, VECTORS), mode='w+', dtype=float32, shape=(capacity, width))
+
+    # Key an article text for an embedder
+    @staticmethod
+    def key(embedder, text):
+        return sha1(('%s\0%s' % (embedder, text)).encode('utf-8')).hexdigest()
+
+    def __len__(self):
+        return len(self.rows)
+
+    # Get the cached vector of a text (a copy), or None
+    def get(self, embedder, text):
+        key = self.key(embedder, text)
+        if key not in self.rows:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.rows.move_to_end(key)
+        return self.vectors[self.rows[key]].copy()
+
+    # Store the vector of a text, evicting the least recently used vector when full
+    def put(self, embedder, text, vector):
+        key = self.key(embedder, text)
+        if key in self.rows:
+            row = self.rows.pop(key)
+        elif len(self.rows) < self.capacity:
+            row = len(self.rows)
+        else:
+            _, row = self.rows.popitem(last=False)
+        self.rows[key] = row
+        self.vectors[row] = asarray(vector, dtype=float32).reshape(self.width)
+
+    # Get the cached vector of a text, computing and storing it with compute() on a miss
+    def get_or_compute(self, embedder, text, compute):
+        vector = self.get(embedder, text)
+        if vector is None:
+            vector = compute()
+            self.put(embedder, text, vector)
+        return vector
+
+    # Write the vectors and the index to disk
+    def flush(self):
+        self.vectors.flush()
+        temp = join(self.path, INDEX + '.tmp')
+        with open(temp, 'w') as o:
+            dump_json({'width': self.width, 'capacity': self.capacity, 'rows': list(self.rows.items())}, o)
+        replace(temp, join(self.path, INDEX))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.flush()
@@ -0,0 +1,95 @@
+from numpy import asarray, empty, save, load, float32, int64, round as around
+from os import makedirs
+from os.path import join
+from pandas import DataFrame
+
+# Objective: collect article vectors in one float32 block with their bias and factualness labels beside it
+#
+# A saved matrix is a directory of .npy files (x.npy, bias.npy, factualness.npy); load memory-maps them,
+# so processes that load the same matrix share one copy in the page cache.
+
+LABELS = ('bias', 'factualness')
+
+class FeatureMatrix:
+
+    # Initialize with the vector width (300 for word2vec, 512 for the sentence encoder)
+    def __init__(self, width, capacity=1024):
+        self.width = width
+        self.n = 0 # number of articles
+        self.__x = empty((capacity, width), dtype=float32)
+        self.__labels = {name: empty(capacity, dtype=int64) for name in LABELS}
+
+    def __len__(self):
+        return self.n
+
+    # Make room for at least needed rows, doubling the capacity so appends stay amortized O(1)
+    def __reserve(self, needed):
+        capacity = len(self.__x)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        x = empty((capacity, self.width), dtype=float32)
+        x[:self.n] = self.__x[:self.n]
+        self.__x = x
+        for name, values in self.__labels.items():
+            grown = empty(capacity, dtype=int64)
+            grown[:self.n] = values[:self.n]
+            self.__labels[name] = grown
+
+    # Add one article vector (any shape with width elements) and its labels
+    def append(self, vector, bias, factualness):
+        self.__reserve(self.n + 1)
+        self.__x[self.n] = asarray(vector, dtype=float32).reshape(self.width)
+        self.__labels['bias'][self.n] = bias
+        self.__labels['factualness'][self.n] = factualness
+        self.n += 1
+
+    # Add a block of article vectors, one row per article, and their labels
+    def extend(self, block, biases, factualnesses):
+        block = asarray(block, dtype=float32).reshape(-1, self.width)
+        end = self.n + len(block)
+        self.__reserve(end)
+        self.__x[self.n:end] = block
+        self.__labels['bias'][self.n:end] = biases
+        self.__labels['factualness'][self.n:end] = factualnesses
+        self.n = end
+
+    # The article vectors, a view of the filled rows
+    @property
+    def x(self):
+        return self.__x[:self.n]
+
+    # The labels named name ('bias' or 'factualness'), a view of the filled rows
+    def labels(self, name):
+        return self.__labels[name][:self.n]
+
+    # The article vectors rounded to a number of decimals (a copy), or the vectors themselves
+    def rounded(self, decimals=None):
+        return self.x if decimals is None else around(self.x, decimals)
+
+    # A data frame in the old layout, columns '0'...'n' then the label, for inspection
+    def frame(self, name, decimals=None):
+        frame = DataFrame(self.rounded(decimals), columns=[str(i) for i in range(0, self.width)])
+        frame[name] = self.labels(name)
+        return frame
+
+    # Write the filled rows and labels to a directory of .npy files
+    def save(self, path):
+        makedirs(path, exist_ok=True)
+        save(join(path, 'x.npy'), self.x)
+        for name in LABELS:
+            save(join(path, '%s.npy' % name), self.labels(name))
+
+    # Read a matrix written by save, memory-mapped read-only unless mmap_mode is None
+    @staticmethod
+    def load(path, mmap_mode='r'):
+        x = load(join(path, 'x.npy'), mmap_mode=mmap_mode)
+        features = FeatureMatrix(x.shape[1], capacity=1)
+        features.__x = x
+        features.__labels = {name: load(join(path, '%s.npy' % name), mmap_mode=mmap_mode) for name in LABELS}
+        features.n = len(x)
+        return features
+
+    def __repr__(self):
+        return 'FeatureMatrix(%d articles x %d features, labels: %s)' % (self.n, self.width, ', '.join(LABELS))
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import defaultdict
+from threading import Lock, BoundedSemaphore
+from urllib.parse import urlsplit, urljoin
+from time import sleep
+from random import uniform
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+
+# Objective: download many pages at once over pooled keep-alive connections, politely per host
+#
+# Each job is a (key, url) pair; results come back as (key, url, result, error) as soon as each page
+# is done, so callers can keep their own numbering (e.g. ta.%d.txt) whatever the completion order.
+# Failed attempts (connection errors, timeouts, 429 and 5xx responses) are retried with exponential
+# backoff and jitter; other HTTP errors are returned at once. Redirects are followed one hop at a time,
+# each hop holding a connection slot of its own host: scraped links point at news.google.com redirects,
+# and the article download then counts against its publisher. With an HTTPCache (see http_cache.py),
+# requests carry the cached page's validators and a 304 answer is parsed from the cached copy.
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_REDIRECTS = 10
+
+class FetchError(Exception):
+
+    def __init__(self, url, reason):
+        super().__init__('%s: %s' % (url, reason))
+        self.url = url
+        self.reason = reason
+
+class Fetcher:
+
+    # Initialize with thread count, connections per host, timeout (seconds), retries and first backoff (seconds)
+    def __init__(self, workers=16, per_host=8, timeout=10, retries=3, backoff=0.5, session=None, cache=None):
+        self.workers = workers
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = cache
+        self.session = session or Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.__hosts = defaultdict(lambda: BoundedSemaphore(self.per_host))
+        self.__lock = Lock()
+
+    # Get the semaphore limiting connections to a URL's host
+    def __host(self, url):
+        with self.__lock:
+            return self.__hosts[urlsplit(url).netloc]
+
+    # Download a URL, retrying failed attempts, and hand the response to parse (run in the worker thread)
+    def get(self, url, parse=None):
+        response = self.cache.fresh(url) if self.cache else None
+        if response is not None:
+            return self.__parse(url, response, parse)
+        for attempt in range(self.retries + 1):
+            try:
+                headers = self.cache.validators(url) if self.cache else None
+                response = self.__request(url, headers)
+                if self.cache:
+                    response = self.cache.resolve(url, response)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return self.__parse(url, response, parse)
+                reason = 'HTTP %d' % response.status_code
+            except RequestException as e:
+                if getattr(e, 'response', None) is not None and e.response.status_code not in RETRY_STATUSES:
+                    raise FetchError(url, 'HTTP %d' % e.response.status_code)
+                reason = type(e).__name__
+            if attempt < self.retries:
+                sleep(self.backoff * 2 ** attempt * uniform(0.5, 1.5))
+        raise FetchError(url, '%s after %d attempts' % (reason, self.retries + 1))
+
+    # Request a URL, following its redirects one hop at a time, each within its host's limit
+    def __request(self, url, headers):
+        hop = url
+        for _ in range(MAX_REDIRECTS + 1):
+            with self.__host(hop):
+                response = self.session.get(hop, timeout=self.timeout, headers=headers, allow_redirects=False)
+            if not response.is_redirect:
+                return response
+            hop = urljoin(hop, response.headers['location'])
+        raise FetchError(url, 'more than %d redirects' % MAX_REDIRECTS)
+
+    @staticmethod
+    def __parse(url, response, parse):
+        if parse is None:
+            return response
+        try:
+            return parse(response)
+        except Exception as e:
+            raise FetchError(url, 'could not parse the page (%s)' % e)
+
+    # Download (key, url) jobs concurrently, yielding (key, url, result, error) as each one finishes
+    def fetch(self, jobs, parse=None):
+        with ThreadPoolExecutor(self.workers) as pool:
+            futures = {pool.submit(self.get, url, parse): (key, url) for key, url in jobs}
+            for future in as_completed(futures):
+                key, url = futures[future]
+                try:
+                    yield key, url, future.result(), None
+                except FetchError as e:
+                    yield key, url, None, e
@@ -0,0 +1,152 @@
+from numpy import load, savez, asarray, concatenate, zeros, arange, tile, repeat, flatnonzero, where, unique, searchsorted, \
+    isfinite, int32, int64, float32, float64
+from pickle import load as load_pickle
+from zipfile import is_zipfile
+from sys import argv
+
+# Objective: store fitted random forests as flat NumPy node arrays and score them without sklearn
+#
+# Every tree's nodes are concatenated into shared arrays; children hold global node numbers (-1 at
+# leaves) and roots holds the first node of each tree. value holds each node's class probabilities,
+# normalized as DecisionTreeClassifier.predict_proba does, so averaging them over the trees in order
+# reproduces RandomForestClassifier.predict_proba and predict exactly.
+
+VERSION = 1
+
+class FlatForest:
+
+    # Initialize with node arrays (see flatten) and the classifier's confidence
+    def __init__(self, feature, threshold, left, right, value, roots, classes, n_features, confidence=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.n_features = n_features
+        self.confidence = confidence
+
+    # Flatten a fitted sklearn RandomForestClassifier
+    @staticmethod
+    def flatten(model, confidence=None):
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            roots.append(offset)
+            feature.append(tree.feature.astype(int32))
+            threshold.append(tree.threshold.astype(float64))
+            # sklearn marks leaves with -1 children; shift the others to global node numbers
+            left.append(where(tree.children_left < 0, -1, tree.children_left + offset).astype(int32))
+            right.append(where(tree.children_right < 0, -1, tree.children_right + offset).astype(int32))
+            proba = tree.value[:, 0, :model.n_classes_].astype(float64)
+            normalizer = proba.sum(axis=1)[:, None]
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(proba / normalizer)
+            offset += tree.node_count
+        return FlatForest(concatenate(feature), concatenate(threshold), concatenate(left), concatenate(right),
+                          concatenate(value), asarray(roots, dtype=int64), asarray(model.classes_),
+                          model.n_features_in_ if hasattr(model, 'n_features_in_') else model.n_features_,
+                          confidence)
+
+    # Combine forests into one that averages all of their trees; class probability columns are
+    # remapped onto the union of the forests' classes (a forest fitted without a class gives it 0)
+    @staticmethod
+    def merge(forests, confidence=None):
+        classes = unique(concatenate([forest.classes_ for forest in forests]))
+        feature, threshold, left, right, value, roots = [], [], [], [], [], []
+        offset = 0
+        for forest in forests:
+            if forest.n_features != forests[0].n_features:
+                raise Exception('Cannot merge forests of %d and %d features' % (forests[0].n_features, forest.n_features))
+            feature.append(forest.feature)
+            threshold.append(forest.threshold)
+            left.append(where(forest.left < 0, -1, forest.left + offset).astype(int32))
+            right.append(where(forest.right < 0, -1, forest.right + offset).astype(int32))
+            remapped = zeros((len(forest.value), len(classes)), dtype=float64)
+            remapped[:, searchsorted(classes, forest.classes_)] = forest.value
+            value.append(remapped)
+            roots.append(forest.roots + offset)
+            offset += len(forest.feature)
+        return FlatForest(concatenate(feature), concatenate(threshold), concatenate(left), concatenate(right),
+                          concatenate(value), concatenate(roots), classes, forests[0].n_features, confidence)
+
+    # Number of trees
+    def __len__(self):
+        return len(self.roots)
+
+    # Find the leaf each article reaches in each tree; every (article, tree) pair still at an inner
+    # node moves down one level per step, so the work shrinks as the pairs reach their leaves
+    def apply(self, x):
+        x = asarray(x, dtype=float32) # sklearn compares float32 features against the thresholds
+        if x.ndim == 1:
+            x = x.reshape(1, -1)
+        # sklearn 0.22 rejects these too; later versions route missing values per node, which we do not
+        if not isfinite(x).all():
+            raise ValueError('Input contains NaN or infinity')
+        n, trees = len(x), len(self.roots)
+        flat = x.ravel()
+        nodes = tile(self.roots, n) # article-major, trees of an article side by side
+        base = repeat(arange(n, dtype=int64) * x.shape[1], trees) # start of each pair's article in flat
+        active = flatnonzero(self.left[nodes] >= 0)
+        while len(active):
+            current = nodes[active]
+            # Same test as sklearn: left when x <= threshold, right otherwise
+            go_left = flat[base[active] + self.feature[current]] <= self.threshold[current]
+            nodes[active] = where(go_left, self.left[current], self.right[current])
+            active = active[self.left[nodes[active]] >= 0]
+        return nodes.reshape(n, trees)
+
+    # Average the trees' class probabilities, as RandomForestClassifier.predict_proba does
+    def predict_proba(self, x):
+        leaves = self.apply(x)
+        proba = zeros((len(leaves), len(self.classes_)), dtype=float64)
+        for tree in range(len(self.roots)):
+            proba += self.value[leaves[:, tree]]
+        proba /= len(self.roots)
+        return proba
+
+    # Most probable class of each article
+    def predict(self, x):
+        return self.classes_.take(self.predict_proba(x).argmax(axis=1), axis=0)
+
+    # Write the forest to a versioned .npz file
+    def save(self, path):
+        with open(path, 'wb') as o:
+            savez(o, version=VERSION, feature=self.feature, threshold=self.threshold, left=self.left,
+                  right=self.right, value=self.value, roots=self.roots, classes=self.classes_,
+                  n_features=self.n_features, confidence=float('nan') if self.confidence is None else self.confidence)
+
+    # Read a forest written by save
+    @staticmethod
+    def load(path):
+        with load(path) as saved:
+            if int(saved['version']) != VERSION:
+                raise Exception('Unsupported flat forest version %s in %s' % (saved['version'], path))
+            confidence = float(saved['confidence'])
+            return FlatForest(saved['feature'], saved['threshold'], saved['left'], saved['right'], saved['value'],
+                              saved['roots'], saved['classes'], int(saved['n_features']),
+                              None if confidence != confidence else confidence)
+
+# Load (model, confidence) from a flat forest or from a pickle written by Classifier.create/NewsClassifier
+def load_classifier(path):
+    if is_zipfile(path):
+        forest = FlatForest.load(path)
+        return forest, forest.confidence
+    with open(path, 'rb') as i:
+        return load_pickle(i)
+
+# Convert a (model, confidence) pickle to a flat forest
+def export(in_path, out_path):
+    with open(in_path, 'rb') as i:
+        model, confidence = load_pickle(i)
+    forest = FlatForest.flatten(model, confidence)
+    forest.save(out_path)
+    print('Wrote %d trees (%d nodes) to %s' % (len(forest), len(forest.feature), out_path))
+    return forest
+
+if __name__ == '__main__':
+    # argv[1] as classifier pickle (e.g., X_bias_model)
+    # argv[2] as flat forest (e.g., X_bias_model.forest)
+    export(argv[1], argv[2])
@@ -0,0 +1,112 @@
+from hashlib import sha1
+from json import dump, load
+from os import makedirs, replace
+from os.path import join, exists
+from time import time
+
+# Objective: keep downloaded pages on disk and revalidate them with conditional GETs
+#
+# Each URL is stored under the sha1 of the URL as <hash>.body (the raw bytes) and <hash>.json (URL,
+# ETag, Last-Modified and fetch time). A cached page's validators are sent with the next request for
+# it; a 304 answer is served from disk, a 200 answer replaces the cached copy. Pages younger than
+# max_age seconds are served from disk without a request at all.
+
+class CachedResponse:
+
+    # The parts of a requests.Response that parsers use, for pages served from the cache
+    def __init__(self, url, content, headers):
+        self.url = url
+        self.content = content
+        self.headers = headers
+        self.status_code = 200
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def raise_for_status(self):
+        pass
+
+class HTTPCache:
+
+    # Initialize with a cache directory (created if needed) and the age under which pages are not revalidated
+    def __init__(self, directory, max_age=0):
+        self.directory = directory
+        self.max_age = max_age
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        makedirs(directory, exist_ok=True)
+
+    def __path(self, url):
+        return join(self.directory, sha1(url.encode('utf-8')).hexdigest())
+
+    # Get the stored metadata of a URL, or None
+    def meta(self, url):
+        path = self.__path(url) + '.json'
+        if not exists(path):
+            return None
+        with open(path, 'r') as i:
+            return load(i)
+
+    # Get the cached response of a URL, or None
+    def cached(self, url):
+        meta = self.meta(url)
+        if meta is None or not exists(self.__path(url) + '.body'):
+            return None
+        with open(self.__path(url) + '.body', 'rb') as i:
+            return CachedResponse(url, i.read(), meta['headers'])
+
+    # Get a cached response fresh enough to skip the request, or None
+    def fresh(self, url):
+        meta = self.meta(url)
+        if meta is None or time() - meta['fetched'] >= self.max_age:
+            return None
+        response = self.cached(url)
+        if response is not None:
+            self.hits += 1
+        return response
+
+    # Get the conditional request headers of a URL
+    def validators(self, url):
+        meta = self.meta(url)
+        headers = {}
+        if meta and meta['headers'].get('ETag'):
+            headers['If-None-Match'] = meta['headers']['ETag']
+        if meta and meta['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = meta['headers']['Last-Modified']
+        return headers
+
+    # Store a 200 response, or swap a 304 for the cached page; other responses pass through
+    def resolve(self, url, response):
+        if response.status_code == 304:
+            cached = self.cached(url)
+            if cached is not None:
+                self.revalidated += 1
+                self.__touch(url)
+                return cached
+        if response.status_code == 200:
+            self.misses += 1
+            self.store(url, response.content, response.headers)
+        return response
+
+    # Write a page and its validators (each file atomically)
+    def store(self, url, content, headers):
+        path = self.__path(url)
+        with open(path + '.body.tmp', 'wb') as o:
+            o.write(content)
+        replace(path + '.body.tmp', path + '.body')
+        kept = {name: headers[name] for name in ('ETag', 'Last-Modified', 'Content-Type') if headers.get(name)}
+        self.__write_meta(url, {'url': url, 'headers': kept, 'fetched': time()})
+
+    def __touch(self, url):
+        meta = self.meta(url)
+        meta['fetched'] = time()
+        self.__write_meta(url, meta)
+
+    def __write_meta(self, url, meta):
+        path = self.__path(url) + '.json'
+        with open(path + '.tmp', 'w') as o:
+            dump(meta, o)
+        replace(path + '.tmp', path)
@@ -0,0 +1,115 @@
+from numpy import load, savez, concatenate, empty, float32, int64
+from hashlib import blake2b
+from json import dump, load as load_json
+from os import makedirs, replace
+from os.path import join, exists
+from time import time
+from sklearn.ensemble import RandomForestClassifier
+
+from forest import FlatForest
+
+# Objective: keep a classifier current by growing its forest on newly scraped articles only
+#
+# A model directory holds every version of one classifier:
+#   v0001.forest ...   flat forests (see forest.py), each version's trees plus the trees of the one before
+#   holdout.npz        vectors and labels of the articles kept out of training, for scoring every version
+#   trained.txt        names of the articles already used, one per line, so updates only see new ones
+#   manifest.json      label, and per version: trees, articles trained on, holdout accuracy, time
+# Whether an article is held out depends only on its name, so the holdout set grows with the corpus
+# and is never trained on. Each update fits a small forest on the new articles and merges it with the
+# latest version; predictions average over all trees, old and new.
+
+HOLDOUT = 0.25 # fraction of articles kept out of training
+
+# Check whether an article name belongs to the holdout set
+def held_out(name):
+    return int.from_bytes(blake2b(name.encode('utf-8'), digest_size=8).digest(), 'big') / 2 ** 64 < HOLDOUT
+
+class ModelHistory:
+
+    # Initialize with a model directory (created if needed), the label predicted and the rounding of vectors
+    def __init__(self, path, label, decimals=None):
+        self.path = path
+        self.label = label
+        self.decimals = decimals
+        makedirs(path, exist_ok=True)
+        self.manifest = self.__load_manifest()
+
+    def __load_manifest(self):
+        if exists(join(self.path, 'manifest.json')):
+            with open(join(self.path, 'manifest.json'), 'r') as i:
+                manifest = load_json(i)
+            if manifest['label'] != self.label:
+                raise Exception('%s holds %s models, not %s' % (self.path, manifest['label'], self.label))
+            return manifest
+        return {'label': self.label, 'decimals': self.decimals, 'versions': []}
+
+    def __save_manifest(self):
+        with open(join(self.path, 'manifest.json.tmp'), 'w') as o:
+            dump(self.manifest, o, indent=2)
+        replace(join(self.path, 'manifest.json.tmp'), join(self.path, 'manifest.json'))
+
+    # Names of the articles already trained on or held out
+    def seen(self):
+        if not exists(join(self.path, 'trained.txt')):
+            return set()
+        with open(join(self.path, 'trained.txt'), 'r') as i:
+            return set(line.strip() for line in i)
+
+    # Path of the latest version's forest, or None before the first update
+    def latest(self):
+        versions = self.manifest['versions']
+        return join(self.path, versions[-1]['file']) if versions else None
+
+    # The holdout set so far, (vectors, labels)
+    def holdout(self):
+        if not exists(join(self.path, 'holdout.npz')):
+            return empty((0, 0), dtype=float32), empty(0, dtype=int64)
+        with load(join(self.path, 'holdout.npz')) as saved:
+            return saved['x'], saved['y']
+
+    def __round(self, x):
+        return x.round(self.decimals) if self.decimals is not None else x
+
+    # Add a version from new articles: names, vectors (a 2-D array) and labels (integers); skipped names
+    # (e.g. articles too short to vectorize) are only recorded as seen
+    def update(self, names, x, y, trees=20, min_articles=10, skipped=()):
+        kept = [i for i, name in enumerate(names) if not held_out(name)]
+        held = [i for i, name in enumerate(names) if held_out(name)]
+        holdout_x, holdout_y = self.holdout()
+        if held:
+            holdout_x = concatenate([holdout_x.reshape(-1, x.shape[1]), x[held].astype(float32)])
+            holdout_y = concatenate([holdout_y, y[held].astype(int64)])
+            with open(join(self.path, 'holdout.tmp.npz'), 'wb') as o:
+                savez(o, x=holdout_x, y=holdout_y)
+            replace(join(self.path, 'holdout.tmp.npz'), join(self.path, 'holdout.npz'))
+        if len(kept) < min_articles:
+            print('%d new training articles, fewer than %d; keeping %s' % (len(kept), min_articles, self.latest()))
+            self.__mark([names[i] for i in held] + list(skipped))
+            return None
+        print('Fitting %d trees on %d new articles' % (trees, len(kept)))
+        model = RandomForestClassifier(n_estimators=trees)
+        model.fit(self.__round(x[kept]), y[kept])
+        grown = FlatForest.flatten(model)
+        if self.latest():
+            grown = FlatForest.merge([FlatForest.load(self.latest()), grown])
+        if len(holdout_y):
+            grown.confidence = float((grown.predict(self.__round(holdout_x)) == holdout_y).mean())
+        version = len(self.manifest['versions']) + 1
+        name = 'v%04d.forest' % version
+        grown.save(join(self.path, name))
+        previous = self.manifest['versions'][-1]['articles'] if self.manifest['versions'] else 0
+        self.manifest['versions'].append({
+            'version': version, 'file': name, 'trees': len(grown), 'new_articles': len(kept),
+            'articles': previous + len(kept), 'holdout_articles': int(len(holdout_y)),
+            'holdout_accuracy': grown.confidence, 'created': time(),
+        })
+        self.__save_manifest()
+        self.__mark(list(names) + list(skipped))
+        print('Saved version %d (%d trees), holdout accuracy %s' % (version, len(grown), grown.confidence))
+        return grown
+
+    # Record articles as used, so later updates skip them
+    def __mark(self, names):
+        with open(join(self.path, 'trained.txt'), 'a') as o:
+            o.writelines(name + '\n' for name in names)
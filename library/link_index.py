@@ -0,0 +1,139 @@
+from numpy import int64
+from numpy.lib.format import open_memmap
+from hashlib import blake2b
+from os import pread, replace, truncate
+from os.path import exists, getsize
+
+# Objective: remember every link a scraper has logged, on disk, so restarts are instant and memory stays flat
+#
+# An index is two files beside the log:
+#   <log>.links      append-only UTF-8 links, one per line, the exact store
+#   <log>.links.npy  memory-mapped open-addressing hash table (64-bit blake2b fingerprints, linear probing)
+# Row 0 of the table holds (links, committed bytes of <log>.links, 0); every other row is a slot holding
+# (fingerprint, offset, length) of one link, with fingerprint 0 for empty slots. A fingerprint match is
+# confirmed against the link's bytes, so lookups are exact. The table doubles once it is half full.
+# Links appended after the last committed write (e.g. the scraper was killed) are indexed on open.
+
+CAPACITY = 1024
+
+# Get the nonzero 64-bit fingerprint of an encoded link
+def fingerprint(encoded):
+    value = int.from_bytes(blake2b(encoded, digest_size=8).digest(), 'little', signed=True)
+    return value or 1
+
+class LinkIndex:
+
+    # Initialize with a log path, creating the index files beside it if needed
+    def __init__(self, path):
+        self.path = path + '.links'
+        self.table_path = path + '.links.npy'
+        if not exists(self.table_path):
+            open(self.path, 'wb').close()
+            self.__create(self.table_path, CAPACITY)
+        self.table = open_memmap(self.table_path, mode='r+')
+        self.mask = len(self.table) - 2
+        self.links = open(self.path, 'ab')
+        self.reader = open(self.path, 'rb')
+        self.__recover()
+
+    @staticmethod
+    def __create(table_path, capacity):
+        table = open_memmap(table_path, mode='w+', dtype=int64, shape=(capacity + 1, 3))
+        table[:] = 0
+        table.flush()
+        return table
+
+    def __len__(self):
+        return int(self.table[0, 0])
+
+    # Check whether a link has been added
+    def __contains__(self, link):
+        encoded = link.encode('utf-8')
+        return self.__find(encoded, fingerprint(encoded))[1]
+
+    # Find the slot of an encoded link, or the empty slot it would take; returns (slot, found)
+    def __find(self, encoded, key):
+        slot = key & self.mask
+        while True:
+            stored, offset, length = self.table[slot + 1]
+            if stored == 0:
+                return slot, False
+            if stored == key and length == len(encoded) and pread(self.reader.fileno(), length, offset) == encoded:
+                return slot, True
+            slot = (slot + 1) & self.mask
+
+    # Add a link, returning False if it was already there
+    def add(self, link):
+        encoded = link.encode('utf-8')
+        key = fingerprint(encoded)
+        slot, found = self.__find(encoded, key)
+        if found:
+            return False
+        end = int(self.table[0, 1])
+        self.links.write(encoded + b'\n')
+        self.links.flush()
+        self.__insert(slot, key, end, len(encoded))
+        self.table[0, 1] = end + len(encoded) + 1
+        return True
+
+    # Add many links (e.g. when migrating an existing log), returning how many were new
+    def update(self, links):
+        return sum(self.add(link) for link in links)
+
+    def __insert(self, slot, key, offset, length):
+        self.table[slot + 1] = (key, offset, length)
+        self.table[0, 0] += 1
+        if 2 * (self.table[0, 0] + 1) > self.mask + 1:
+            self.__grow()
+
+    # Rehash every link into a table twice the size, swapped in atomically
+    def __grow(self):
+        capacity = 2 * (self.mask + 1)
+        grown = self.__create(self.table_path + '.tmp', capacity)
+        grown[0] = self.table[0]
+        slots = self.table[1:]
+        for key, offset, length in slots[slots[:, 0] != 0]:
+            slot = key & (capacity - 1)
+            while grown[slot + 1, 0] != 0:
+                slot = (slot + 1) & (capacity - 1)
+            grown[slot + 1] = (key, offset, length)
+        grown.flush()
+        del grown
+        self.table.flush()
+        replace(self.table_path + '.tmp', self.table_path)
+        self.table = open_memmap(self.table_path, mode='r+')
+        self.mask = capacity - 1
+
+    # Index links written after the last committed one, dropping a torn last line
+    def __recover(self):
+        end = int(self.table[0, 1])
+        size = getsize(self.path)
+        if size == end:
+            return
+        tail = pread(self.reader.fileno(), size - end, end)
+        complete = tail.rfind(b'\n') + 1
+        if complete < len(tail):
+            truncate(self.path, end + complete)
+        for line in tail[:complete].split(b'\n')[:-1]:
+            key = fingerprint(line)
+            slot, found = self.__find(line, key)
+            if not found:
+                self.__insert(slot, key, end, len(line))
+            end += len(line) + 1
+            self.table[0, 1] = end
+        self.flush()
+
+    # Write the table's dirty pages back to disk
+    def flush(self):
+        self.table.flush()
+
+    def close(self):
+        self.flush()
+        self.links.close()
+        self.reader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,135 @@
+from collections import Counter
+from contextlib import contextmanager
+from threading import Lock, local
+from json import dump
+from time import perf_counter, time
+
+# Objective: time pipeline stages and count what they process, instead of printing once per item
+#
+# Modules report into the shared METRICS:
+#   with METRICS.stage('tokenize'): ...       wall time and calls of each stage, summed over calls
+#   METRICS.count('articles')                  counters, e.g. articles, words, oov_words, short_articles
+#   METRICS.progress('Examining training article %d', n)
+#                                              one progress line at most every interval seconds
+# summary() gives every timer and counter with rates per second of the stage that counted them and the
+# OOV rate; write(path) saves it as JSON. configure(quiet=True) silences progress and report for batch
+# runs, while timers and counters keep counting. Each process has its own METRICS: pool workers return
+# their totals() with their results and the parent merges them, so stage seconds add up over workers.
+
+RATES = ('articles', 'rows', 'words', 'embedded_words') # counters also reported per second of their stage
+
+class Metrics:
+
+    # Initialize with the seconds between progress lines, and whether to print nothing
+    def __init__(self, interval=2.0, quiet=False):
+        self.interval = interval
+        self.quiet = quiet
+        self.lock = Lock() # the service counts from several threads
+        self.local = local() # stages being timed by each thread, innermost last
+        self.reset()
+
+    # Forget every timer and counter
+    def reset(self):
+        with self.lock:
+            self.started = time()
+            self.seconds = Counter() # stage -> seconds
+            self.calls = Counter() # stage -> calls
+            self.counters = Counter()
+            self.stages = {} # counter -> stage it was first counted in
+            self.shown = 0.0 # perf_counter of the last progress line
+
+    # Change the interval or quiet mode
+    def configure(self, interval=None, quiet=None):
+        if interval is not None:
+            self.interval = interval
+        if quiet is not None:
+            self.quiet = quiet
+
+    def __active(self):
+        if not hasattr(self.local, 'active'):
+            self.local.active = []
+        return self.local.active
+
+    # Time a block as one call of a stage
+    @contextmanager
+    def stage(self, name):
+        active = self.__active()
+        active.append(name)
+        start = perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = perf_counter() - start
+            active.pop()
+            with self.lock:
+                self.seconds[name] += elapsed
+                self.calls[name] += 1
+
+    # Add n to a counter
+    def count(self, name, n=1):
+        active = self.__active()
+        with self.lock:
+            self.counters[name] += n
+            if name not in self.stages and active:
+                self.stages[name] = active[-1]
+
+    # Print a progress line (message % values, over the last one) unless one was printed less than interval ago
+    def progress(self, message, *values):
+        if self.quiet:
+            return
+        now = perf_counter()
+        if now - self.shown < self.interval:
+            return
+        self.shown = now
+        print(message % values, end='\r')
+
+    # Timers and counters so far, to send from a pool worker to the parent (see merge)
+    def totals(self):
+        with self.lock:
+            return {'seconds': dict(self.seconds), 'calls': dict(self.calls), 'counters': dict(self.counters),
+                    'stages': dict(self.stages)}
+
+    # Add the totals of another process
+    def merge(self, totals):
+        with self.lock:
+            self.seconds.update(totals['seconds'])
+            self.calls.update(totals['calls'])
+            self.counters.update(totals['counters'])
+            for name, stage in totals['stages'].items():
+                self.stages.setdefault(name, stage)
+
+    # Timers, counters and rates as a dictionary
+    def summary(self):
+        with self.lock:
+            elapsed = time() - self.started
+            stages = {name: {'seconds': self.seconds[name], 'calls': self.calls[name]} for name in self.seconds}
+            counters = dict(self.counters)
+            rates = {}
+            for name, value in counters.items():
+                stage = self.stages.get(name)
+                seconds = self.seconds[stage] if stage else elapsed
+                if seconds and name in RATES:
+                    rates['%s_per_second' % name] = value / seconds
+            if counters.get('embedded_words'):
+                rates['oov_rate'] = counters.get('oov_words', 0) / counters['embedded_words']
+            return {'elapsed': elapsed, 'stages': stages, 'counters': counters, 'rates': rates}
+
+    # Print the summary, one line per timer, counter and rate
+    def report(self):
+        if self.quiet:
+            return
+        summary = self.summary()
+        print()
+        for name, stage in summary['stages'].items():
+            print('%-28s %10.3f s in %d calls' % (name, stage['seconds'], stage['calls']))
+        for name, value in summary['counters'].items():
+            print('%-28s %10d' % (name, value))
+        for name, value in summary['rates'].items():
+            print('%-28s %12.3f' % (name, value))
+
+    # Write the summary to a JSON file
+    def write(self, path):
+        with open(path, 'w') as o:
+            dump(self.summary(), o, indent=2)
+
+METRICS = Metrics()
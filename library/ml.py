@@ -1,16 +1,25 @@
 from gensim.models import KeyedVectors
-from re import split, findall
 from numpy import ndarray, array
 from random import randint
-from os import listdir
-from os.path import join
-from pandas import DataFrame, set_option
+from os import scandir
+from os.path import basename
+from multiprocessing import Pool, cpu_count
+from itertools import islice
+from pandas import set_option
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn import metrics
 from pickle import load, dump
 from sys import exit
 
+from embedding import Embedder
+from w2v_store import Store, is_store
+from features import FeatureMatrix
+from embedding_cache import W2V_MEAN
+from incremental import ModelHistory
+from tokenizer import words, read_tokens
+from metrics import METRICS
+
 class Word:
     # Initialize with a string and trained word2vec model
     def __init__(self, string, w2vm):
@@ -36,82 +45,132 @@ class Word:
 
 
 class Article:
-    # Regular expression used to find words in sentences
-    WORD_REGEX = "[^a-zA-Z]*([a-zA-Z']+)[^a-zA-Z]*"
+    # Words are found by tokenizer.py, shared with atn, atn2, df_index and service
 
     def __init__(self, path):
         self.path = path
         self.words = None
         self.vector = None
 
-    def get_vector(self, w2vm):
-        print('Representing article %s as a vector' % self.path)
-        total = ndarray((1, 300), buffer=array([0 for i in range(0, 300)]))
-        for word in self.words:
-            vector = word.vector
-            if vector is not None:
-                total += vector
-        return total / len(self.words)
+    # Average the word2vec vectors of self.words (a list of word strings) in one gather
+    def get_vector(self, w2vm, cache=None):
+        with METRICS.stage('vectorize'):
+            return self.__vector(w2vm, cache)
+
+    def __vector(self, w2vm, cache):
+        # Skip if the w2vm is None (probably in testing), every word is then out of vocabulary
+        if not w2vm:
+            total = ndarray((1, 300), buffer=array([0 for i in range(0, 300)]))
+            return total / len(self.words)
+        if cache is None:
+            return w2vm.embedder.vector(self.words).reshape(1, -1)
+        # The vector only depends on the words, so they stand in for the article text
+        embedder = '%s %s' % (W2V_MEAN, w2vm.path)
+        vector = cache.get_or_compute(embedder, ' '.join(self.words), lambda: w2vm.embedder.vector(self.words))
+        return vector.reshape(1, -1)
 
 class UnseenArticle(Article):
-    # Initialize with path to text file and trained word2vec model
-    def __init__(self, path, w2vm):
+    # Initialize with path to text file, trained word2vec model and optional EmbeddingCache
+    def __init__(self, path, w2vm, cache=None):
         super().__init__(path)
         self.words = self.__get_words(w2vm)
-        self.vector = self.__get_vector(w2vm)
+        self.vector = self.__get_vector(w2vm, cache)
 
     # Function to get a list of words
     def __get_words(self, w2vm):
-        print('Identifying words in unseen article %s' % self.path)
-        words = []
-        with open(self.path, 'r') as i:
-            for string in findall(super().WORD_REGEX, i.read()):
-                words.append(Word(string.lower(), w2vm))
-        print('Identifying words in %s' % self.path)
-        return words
+        with METRICS.stage('tokenize'), open(self.path, 'r') as i:
+            article_words = list(read_tokens(i))
+            METRICS.count('words', len(article_words))
+        return article_words
 
     # Function to get a word2vec representation for the article
-    def __get_vector(self, w2vm):
-        return super().get_vector(w2vm)
+    def __get_vector(self, w2vm, cache):
+        return super().get_vector(w2vm, cache)
 
 class TrainingArticle(Article):
-    # Initialize with path to text file and trained word2vec model
-    def __init__(self, path, w2vm):
+    # Initialize with path to text file, trained word2vec model and optional EmbeddingCache
+    def __init__(self, path, w2vm, cache=None):
         super().__init__(path)
-        self.words = self.__get_words(w2vm)
-        self.__header = self.__get_header()
+        self.__header, body_text = self.__read()
+        self.words = self.__get_words(body_text)
         self.source, self.bias, self.factualness, self.country = self.__header.split(',')
-        self.vector = self.__get_vector(w2vm)
+        self.vector = self.__get_vector(w2vm, cache)
 
-    # Function to get a list of words
-    def __get_words(self, w2vm):
-        print('Identifying words in training article %s' % self.path)
-        words = []
+    # Read the file once, returning its training header and body (link, header, blank line, then the body)
+    def __read(self):
         with open(self.path, 'r') as i:
-            body_text = ''.join(i.readlines()[3:])
-            for string in findall(super().WORD_REGEX, body_text):
-                words.append(Word(string.lower(), w2vm))
-        print('%d words were identified' % len(words))
-        return words
-
-    # Function to get training header
-    def __get_header(self):
-        with open(self.path, 'r') as i:
-            return i.readlines()[1].strip()
+            lines = i.read().split('\n', 3)
+        return lines[1].strip(), lines[3] if len(lines) > 3 else ''
+
+    # Function to get a list of words
+    def __get_words(self, body_text):
+        with METRICS.stage('tokenize'):
+            body_words = words(body_text, interned=True)
+            METRICS.count('words', len(body_words))
+        return body_words
 
     # Function to get a word2vec representation for the article
-    def __get_vector(self, w2vm):
-        return super().get_vector(w2vm)
+    def __get_vector(self, w2vm, cache):
+        return super().get_vector(w2vm, cache)
+
+# Paths of the files of a training article directory, in directory order
+def scan(directory):
+    return [entry.path for entry in scandir(directory) if entry.is_file()]
+
+# state of each load_training_articles worker process
+WORKER = {}
+CHUNK = 32 # articles per worker task
+
+def open_worker(w2v_path):
+    # forked workers inherit the parent's model; spawned ones open it again (a w2v_store.py store opens instantly)
+    if 'w2vm' not in WORKER:
+        WORKER['w2vm'] = W2VClassifier(w2v_path) if w2v_path else None
+
+# Load a chunk of articles, returning them with the timers and counters of this chunk (see metrics.py)
+def load_chunk(paths):
+    METRICS.reset()
+    articles = [TrainingArticle(path, WORKER['w2vm']) for path in paths]
+    return articles, METRICS.totals()
+
+# Yield the TrainingArticles of a list of paths, each file read, tokenized and vectorized by one of processes
+# workers (all cores for None), in the order of paths unless ordered is False
+def load_training_articles(paths, w2vm, cache=None, processes=1, ordered=True):
+    if processes == 1:
+        for path in paths:
+            yield TrainingArticle(path, w2vm, cache)
+        return
+    if cache is not None:
+        raise Exception('An EmbeddingCache belongs to one process; load with processes=1 to use it')
+    paths = iter(paths)
+    chunks = iter(lambda: list(islice(paths, CHUNK)), [])
+    WORKER['w2vm'] = w2vm
+    try:
+        with Pool(processes or cpu_count(), open_worker, (w2vm.path if w2vm else None,)) as pool:
+            for articles, totals in (pool.imap if ordered else pool.imap_unordered)(load_chunk, chunks):
+                METRICS.merge(totals)
+                yield from articles
+    finally:
+        WORKER.pop('w2vm', None)
 
 class W2VClassifier:
 
-    # Initialize with an input path
+    # Initialize with an input path, either a word2vec binary or a store made by w2v_store.py
     def __init__(self, in_path):
-        print('Loading pre-trained word2vec model (this may take a couple of minutes)...')
-        self.model = KeyedVectors.load_word2vec_format(in_path, binary=True)
+        self.path = in_path
+        if is_store(in_path):
+            print('Opening memory-mapped word2vec store %s' % in_path)
+            self.model = Store(in_path)
+        else:
+            print('Loading pre-trained word2vec model (this may take a couple of minutes)...')
+            self.model = KeyedVectors.load_word2vec_format(in_path, binary=True)
+        self.embedder = Embedder(self.model)
 
 class Classifier:
 
+    # Label column the classifier predicts, and decimals to round vectors to (None to keep them as they are)
+    LABEL = None
+    DECIMALS = None
+
     # Initialize with input path or output path
     def __init__(self, in_path=None, out_path=None):
         self.in_path = in_path
@@ -128,34 +187,76 @@ class Classifier:
         self.model, self.confidence = load(open(self.in_path, 'rb'))
 
     # Create a random forest classifier from a directory of article vectorization data
-    def create(self, directory, w2vm):
+    # Pass features (see create_features) to reuse one vectorization pass for several classifiers
+    # and an EmbeddingCache to reuse the vectors of articles seen in earlier runs; seed fixes the forest's
+    # randomness (the split is always seeded), so two feature sets can be compared without its noise
+    def create(self, directory, w2vm, features=None, cache=None, processes=1, seed=None):
         if not self.out_path:
             print('Cancelling classifier creation; provide an output path during initialization')
             exit(0)
+        if not self.LABEL:
+            raise Exception('Create a BiasClassifier or FactualnessClassifier instead')
         print('Creating random forest classifier from training articles in %s' % directory)
-        dict = self.create_dictionary(directory, w2vm)
-        columns = list(dict.keys())
-        frame = DataFrame(dict, columns=columns)
-        # set_option('display.max_rows', None) # to print entire dataframe
-        print('Data frame:')
-        print(frame)
-        x, y = frame[columns[:-1]], frame[columns[-1]]
+        if features is None:
+            features = self.create_features(directory, w2vm, cache, processes)
+        print(features)
+        x, y = features.rounded(self.DECIMALS), features.labels(self.LABEL)
         x_train, x_test, y_train, y_test = train_test_split(x, y, test_size=0.25, random_state=0)
-        model = RandomForestClassifier(n_estimators=100)
+        model = RandomForestClassifier(n_estimators=100, random_state=seed)
         model.fit(x_train, y_train)
         self.model = model
         self.confidence = metrics.accuracy_score(y_test, model.predict(x_test))
         print('Saving classifier to %s' % self.out_path)
         dump((self.model, self.confidence), open(self.out_path, 'wb'))
 
-    # Generate a list of TrainingArticles from a directory of files
-    def get_training_articles_from(self, directory, w2vm):
-        for path in [join(directory, name) for name in listdir(directory)]:
-            yield TrainingArticle(path, w2vm)
-
-    # Empty method for creation of dictionary
-    def create_dictionary(self, directory, w2vm):
-        raise Exception
+    # Grow the classifier in a model directory (see incremental.py) with the articles of a directory it
+    # has not seen yet, fitting a few trees on them and saving a new version; returns the merged forest
+    def update(self, directory, w2vm, models, trees=20, cache=None, processes=1):
+        if not self.LABEL:
+            raise Exception('Update a BiasClassifier or FactualnessClassifier instead')
+        history = ModelHistory(models, self.LABEL, self.DECIMALS)
+        seen = history.seen()
+        paths = [path for path in scan(directory) if basename(path) not in seen]
+        print('%d new training articles in %s' % (len(paths), directory))
+        features = FeatureMatrix(300)
+        used, skipped = [], []
+        for article in load_training_articles(paths, w2vm, cache, processes, ordered=False):
+            name = basename(article.path)
+            METRICS.count('articles')
+            if len(article.words) < 10:
+                METRICS.count('short_articles')
+                skipped.append(name)
+                continue
+            used.append(name)
+            METRICS.progress('Examining training article %d of %d', len(used) + len(skipped), len(paths))
+            features.append(article.vector, BiasClassifier.SCALE[article.bias],
+                            FactualnessClassifier.SCALE[article.factualness])
+        grown = history.update(used, features.x, features.labels(self.LABEL), trees, skipped=skipped)
+        if grown is not None:
+            self.model, self.confidence = grown, grown.confidence
+        return grown
+
+    # Generate TrainingArticles from a directory of files, loaded by processes workers (see load_training_articles)
+    def get_training_articles_from(self, directory, w2vm, cache=None, processes=1, ordered=True):
+        return load_training_articles(scan(directory), w2vm, cache, processes, ordered)
+
+    # Vectorize a directory of training articles once, labeled for both bias and factualness
+    # Pass processes (None for all cores) to read and vectorize the articles in parallel; rows then come
+    # in directory order, or as workers finish with ordered=False
+    def create_features(self, directory, w2vm, cache=None, processes=1, ordered=True):
+        features = FeatureMatrix(300)
+        with METRICS.stage('featurize'):
+            for article in self.get_training_articles_from(directory, w2vm, cache, processes, ordered):
+                METRICS.count('articles')
+                METRICS.progress('Examining training article %d', METRICS.counters['articles'])
+
+                if len(article.words) < 10: # TODO new line! get rid of NaN?
+                    METRICS.count('short_articles')
+                    continue
+
+                features.append(article.vector, BiasClassifier.SCALE[article.bias],
+                                FactualnessClassifier.SCALE[article.factualness])
+        return features
 
 class BiasClassifier(Classifier):
 
@@ -170,30 +271,18 @@ class BiasClassifier(Classifier):
         'extreme_right': 6
     }
 
+    LABEL = 'bias'
+    DECIMALS = 2
+    # TODO look into rounding
+    '''
+    round to 3 -> 0.63, n=298
+    round to 2 -> 0.64, n=298
+    '''
+
     # Initialize with an input path or output path
     def __init__(self, in_path=None, out_path=None):
         super().__init__(in_path=in_path, out_path=out_path)
 
-    # Create a dictionary of article vectorization data
-    def create_dictionary(self, directory, w2vm):
-        dict = {**{str(i): [] for i in range(0, 300)}, **{'bias': []}}
-        articles = super().get_training_articles_from(directory, w2vm)
-        for article in articles:
-            print('Mapping %s vectorization to dictionary' % article.path)
-
-            if len(article.words) < 10: continue # TODO new line! get rid of NaN?
-
-            vector = article.vector.tolist()[0] + [self.SCALE[article.bias]]
-            for i, element in enumerate(vector[:-1]):
-                dict[str(i)].append(round(element, 2))
-                # TODO look into rounding
-                '''
-                round to 3 -> 0.63, n=298
-                round to 2 -> 0.64, n=298
-                '''
-            dict['bias'].append(vector[-1])
-        return dict
-
 class FactualnessClassifier(Classifier):
 
     # Convert factualness string to integer for use in matrix
@@ -206,33 +295,21 @@ class FactualnessClassifier(Classifier):
         'very_high': 5
     }
 
+    LABEL = 'factualness'
+    DECIMALS = 1
+    # TODO look into rounding
+    '''
+    round to 3 -> 0.74, n=298
+    round to 2 -> 0.75, n=298
+
+    round to 2 -> 0.77, n=~2000
+    round to 1 -> 0.76, n=~2000
+    '''
+
     # Initialize with an input path or output path
     def __init__(self, in_path=None, out_path=None):
         super().__init__(in_path=in_path, out_path=out_path)
 
-    # Create a dictionary of article vectorization data
-    def create_dictionary(self, directory, w2vm):
-        dict = {**{str(i): [] for i in range(0, 300)}, **{'factualness': []}}
-        articles = super().get_training_articles_from(directory, w2vm)
-        for article in articles:
-            print('Mapping %s vectorization to dictionary' % article.path)
-
-            if len(article.words) < 10: continue # TODO new line! get rid of NaN?
-
-            vector = article.vector.tolist()[0] + [self.SCALE[article.factualness]]
-            for i, element in enumerate(vector[:-1]):
-                dict[str(i)].append(round(element, 1))
-                # TODO look into rounding
-                '''
-                round to 3 -> 0.74, n=298
-                round to 2 -> 0.75, n=298
-
-                round to 2 -> 0.77, n=~2000
-                round to 1 -> 0.76, n=~2000
-                '''
-            dict['factualness'].append(vector[-1])
-        return dict
-
 def main():
 
     # Use this line for random vector generation (very fast, useful in testing)
@@ -246,6 +323,20 @@ def main():
     # c = BiasClassifier(out_path='./factualness.classifier')
     c.create(directory='../../ta/', w2vm=w2vm)
 
+    # e.g., Create both classifiers from one vectorization pass
+    # features = c.create_features('../../ta/', w2vm)
+    # features = c.create_features('../../ta/', w2vm, processes=None) # on every core, with a store as the model
+    # FactualnessClassifier(out_path='./factualness.classifier').create('../../ta/', w2vm, features)
+    # BiasClassifier(out_path='./bias.classifier').create('../../ta/', w2vm, features)
+    # features.save('../../features/ta') # then compare settings with sweep.py
+
+    # e.g., Keep a classifier current with articles scraped since its last version (see incremental.py)
+    # FactualnessClassifier().update('../../ta/', w2vm, models='./factualness.models', trees=20)
+
+    # e.g., Time the stages and count articles, words and OOV words (see metrics.py)
+    # METRICS.configure(quiet=True) # no progress lines, for batch runs
+    # METRICS.write('./metrics.json')
+
     # e.g., Load a factualness classifier
     # c = FactualnessClassifier(in_path='./test.model')
     # c.load()
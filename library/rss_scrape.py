@@ -1,8 +1,10 @@
-from re import findall
-from requests import get
 from bs4 import BeautifulSoup
 from os.path import join
 
+from fetcher import Fetcher
+from source_index import SourceIndex
+from scrape_log import records
+
 # Objective: label article plain text as retrieved from RSS scrape
 
 class RSSScrape:
@@ -12,6 +14,7 @@ class RSSScrape:
         self.sources = self.__sources()
         self.matched = 0
         self.unmatched = 0
+        self.failed = 0 # articles whose text could not be collected
         # bias tallies
         self.extreme_left = 0
         self.left = 0
@@ -29,13 +32,13 @@ class RSSScrape:
         self.very_high = 0
 
     def __sources(self):
-        with open('../../database/sources.csv', 'r') as sources:
-            return sources.read()
+        return SourceIndex.open('../../database/sources.csv')
 
-    def __get_text_from(self, link):
-        # TODO
+    @staticmethod
+    def get_text_from(response):
+        # runs in the fetcher's worker threads
         text = ''
-        soup = BeautifulSoup(get(link).content, 'html.parser')
+        soup = BeautifulSoup(response.content, 'html.parser')
         for paragraph in soup.find_all('p'):
             text += paragraph.text + '\n'
         return text
@@ -71,7 +74,8 @@ class RSSScrape:
             self.very_high += 1
 
     def __summarize(self):
-        s = '\nKnown sources: %d\nUnknown sources %d\n\n' % (self.matched, self.unmatched)
+        s = '\nKnown sources: %d\nUnknown sources %d\nFailed downloads %d\n\n' % (
+            self.matched, self.unmatched, self.failed)
         s += 'EL: %d\nL: %d\nLC: %d\nleast: %d\nRC: %d\nR %d\nER: %d\n\n' % (
             self.extreme_left, self.left, self.left_center, self.least, self.right_center,
             self.right, self.extreme_right)
@@ -79,35 +83,36 @@ class RSSScrape:
             self.very_low, self.low, self.mixed, self.mostly_factual, self.high, self.very_high)
         print(s)
 
-    def send_training_articles_to(self, directory):
-        # TODO output labeled articles
-        with open(self.input, 'r') as input:
-            lines = [l.strip() for l in input.readlines()]
-            article_titles = lines[0::4]
-            for i, title in enumerate(article_titles):
-                article_link = lines[4 * i + 1]
-
-                try:
-                    article_text = self.__get_text_from(article_link)
-                except:
-                    # continue if article text cannot be collected
-                    continue
-
-                article_source = str(lines[4 * i + 2]).split('/')[2].replace('www.', '')
-                source_matches = findall('%s[^\n]+\n' % article_source, self.sources)
-                if not source_matches:
-                    self.unmatched += 1
-                    continue
-                self.matched += 1
-                header_split = source_matches[0].split(',')
-                del header_split[1:3]
-                article_header = ','.join(header_split)
-                self.__tally(article_header)
-                print(i, article_header.strip())
-                with open(join(directory, 'ta.%d.txt' % i), 'w') as ta_out:
-                    ta_out.write(article_link + "\n")
-                    ta_out.write(article_header + "\n")
-                    ta_out.write(article_text)
+    def send_training_articles_to(self, directory, fetcher=None):
+        # label articles from known sources, then download them concurrently (see fetcher.py);
+        # ta.%d.txt keeps the article's position in the scrape whatever order downloads finish in
+        # self.input is a segmented log or a 4-line text log, read as a stream (see scrape_log.py)
+        headers = {}
+        jobs = []
+        for i, record in enumerate(records(self.input)):
+            row = self.sources.lookup(record.source)
+            if not row:
+                self.unmatched += 1
+                continue
+            # source,url,publication,bias,factualness,country -> source,bias,factualness,country
+            # (the trailing newline leaves the blank line after the header that TrainingArticle skips)
+            source, _, _, bias, factualness, country = row
+            headers[i] = ','.join([source, bias, factualness, country]) + '\n'
+            jobs.append((i, record.link))
+        for i, article_link, article_text, error in (fetcher or Fetcher()).fetch(jobs, self.get_text_from):
+            if error:
+                # continue if article text cannot be collected
+                print(i, 'skipped,', error)
+                self.failed += 1
+                continue
+            self.matched += 1
+            article_header = headers[i]
+            self.__tally(article_header)
+            print(i, article_header.strip())
+            with open(join(directory, 'ta.%d.txt' % i), 'w') as ta_out:
+                ta_out.write(article_link + "\n")
+                ta_out.write(article_header + "\n")
+                ta_out.write(article_text)
         self.__summarize()
 
 s = RSSScrape('../../scrapes/gnews_scrape.2.txt')
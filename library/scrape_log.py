@@ -0,0 +1,211 @@
+from numpy import load, save, asarray, int64
+from collections import namedtuple
+from json import dumps, loads, dump as dump_json, load as load_json
+from os import makedirs, listdir, fsync, truncate
+from os.path import join, exists, isdir
+from time import time
+from sys import argv
+
+# Objective: append scraped items to a segmented log that can be read from any record without a full scan
+#
+# A log is a directory of segments, numbered from 0:
+#   000000.jsonl      one JSON record per line: {"time": ..., "title": ..., "link": ..., "source": ...}
+#   000000.idx.npy    count + 1 byte offsets of the segment's records, written when the segment is sealed
+#   000000.meta.json  record count, first and last record times and size, written when the segment is sealed
+# Only the last segment is ever appended to; it is sealed once it holds segment_size records. Writes are
+# buffered and reach the file every flush_every records (and on flush/close), with an fsync if asked.
+# Readers yield (checkpoint, record) pairs; passing a checkpoint back to read resumes after that record.
+#
+# Older logs are text files of 4-line records (title, link, source, blank); records reads both, and
+#   $ python scrape_log.py ../scrapes/gnews_scrape.2.txt ../scrapes/gnews_scrape.2.log
+# converts one.
+
+VERSION = 1
+SEGMENT_SIZE = 100000
+
+Record = namedtuple('Record', ['time', 'title', 'link', 'source'])
+
+def records_file(path, segment):
+    return join(path, '%06d.jsonl' % segment)
+
+def index_file(path, segment):
+    return join(path, '%06d.idx.npy' % segment)
+
+def meta_file(path, segment):
+    return join(path, '%06d.meta.json' % segment)
+
+# Check whether a path is a segmented log rather than a 4-line text log
+def is_log(path):
+    return isdir(path)
+
+# Get the offsets of the complete lines of a segment file, truncating a torn last line if asked
+def scan(path, repair=False):
+    offsets = [0]
+    with open(path, 'rb') as segment:
+        for line in segment:
+            if not line.endswith(b'\n'):
+                if repair:
+                    truncate(path, offsets[-1])
+                break
+            offsets.append(offsets[-1] + len(line))
+    return offsets
+
+class ScrapeLog:
+
+    # Initialize with a log directory (created if needed), records per segment and the write policy
+    def __init__(self, path, segment_size=SEGMENT_SIZE, flush_every=64, sync=False):
+        self.path = path
+        self.segment_size = segment_size
+        self.flush_every = flush_every
+        self.sync = sync
+        self.buffer = []
+        self.out = None
+        makedirs(path, exist_ok=True)
+
+    # Number of segments on disk, including the one being written
+    def segments(self):
+        return sum(1 for name in listdir(self.path) if name.endswith('.jsonl'))
+
+    # Per-segment metadata: count, first and last record times, bytes, and whether it is sealed
+    def meta(self, segment):
+        if exists(meta_file(self.path, segment)):
+            with open(meta_file(self.path, segment), 'r') as i:
+                return load_json(i)
+        offsets = scan(records_file(self.path, segment))
+        return {'version': VERSION, 'count': len(offsets) - 1, 'first': None, 'last': None,
+                'bytes': offsets[-1], 'sealed': False}
+
+    # Total records, from the sealed segments' metadata and a scan of the last segment
+    def __len__(self):
+        return sum(self.meta(segment)['count'] for segment in range(self.segments())) + len(self.buffer)
+
+    # Byte offsets of a segment's records, from its index when sealed
+    def offsets(self, segment):
+        if exists(index_file(self.path, segment)):
+            return load(index_file(self.path, segment), mmap_mode='r')
+        return scan(records_file(self.path, segment))
+
+    # Open the last segment for appending, sealing it first if it is full
+    def __open(self):
+        self.segment = max(self.segments() - 1, 0)
+        if exists(meta_file(self.path, self.segment)):
+            self.segment += 1
+        self.__offsets = scan(records_file(self.path, self.segment), repair=True) \
+            if exists(records_file(self.path, self.segment)) else [0]
+        self.__times = [None, None]
+        if len(self.__offsets) > 1: # reopened mid-segment: its first and last times are in the file
+            with open(records_file(self.path, self.segment), 'rb') as i:
+                for end, n in enumerate((0, len(self.__offsets) - 2)):
+                    i.seek(self.__offsets[n])
+                    self.__times[end] = loads(i.readline().decode('utf-8'))['time']
+        self.out = open(records_file(self.path, self.segment), 'ab')
+
+    # Append one item scraped now; it reaches the file with the next flush
+    def write(self, title, link, source):
+        self.append(Record(time(), title, link, source))
+
+    # Append one record as is
+    def append(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    # Write buffered records to the last segment, sealing segments as they fill up
+    def flush(self):
+        if self.out is None:
+            self.__open()
+        for record in self.buffer:
+            line = (dumps(record._asdict(), ensure_ascii=False) + '\n').encode('utf-8')
+            self.out.write(line)
+            self.__offsets.append(self.__offsets[-1] + len(line))
+            if self.__times[0] is None:
+                self.__times[0] = record.time
+            self.__times[1] = record.time
+            if len(self.__offsets) - 1 >= self.segment_size:
+                self.__seal()
+        self.buffer = []
+        self.out.flush()
+        if self.sync:
+            fsync(self.out.fileno())
+
+    # Write the full segment's index and metadata and start the next segment
+    def __seal(self):
+        self.out.flush()
+        fsync(self.out.fileno())
+        self.out.close()
+        save(index_file(self.path, self.segment), asarray(self.__offsets, dtype=int64))
+        with open(meta_file(self.path, self.segment), 'w') as o:
+            dump_json({'version': VERSION, 'count': len(self.__offsets) - 1, 'first': self.__times[0],
+                       'last': self.__times[1], 'bytes': self.__offsets[-1], 'sealed': True}, o)
+        self.segment += 1
+        self.__offsets = [0]
+        self.__times = [None, None]
+        self.out = open(records_file(self.path, self.segment), 'ab')
+
+    def close(self):
+        self.flush()
+        self.out.close()
+        self.out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Yield (checkpoint, record) for every record after a checkpoint (from the start by default)
+    def read(self, checkpoint=(0, 0)):
+        segment, n = checkpoint
+        for segment in range(segment, self.segments()):
+            offsets = self.offsets(segment)
+            if n >= len(offsets) - 1:
+                n = 0
+                continue
+            with open(records_file(self.path, segment), 'rb') as i:
+                i.seek(int(offsets[n]))
+                for n in range(n, len(offsets) - 1):
+                    yield (segment, n + 1), Record(**loads(i.readline().decode('utf-8')))
+            n = 0
+
+    # Get record n (counting from 0 across segments)
+    def record(self, n):
+        for segment in range(self.segments()):
+            offsets = self.offsets(segment)
+            if n < len(offsets) - 1:
+                with open(records_file(self.path, segment), 'rb') as i:
+                    i.seek(int(offsets[n]))
+                    return Record(**loads(i.readline().decode('utf-8')))
+            n -= len(offsets) - 1
+        raise IndexError('record out of range')
+
+# Yield the records of a 4-line text log (title, link, source, blank), streaming
+def read_text(path):
+    with open(path, 'r') as text:
+        lines = []
+        for line in text:
+            lines.append(line.strip())
+            if len(lines) == 4:
+                yield Record(None, lines[0], lines[1], lines[2])
+                lines = []
+        if len(lines) >= 3:
+            yield Record(None, lines[0], lines[1], lines[2])
+
+# Yield the records of a segmented log or of a 4-line text log
+def records(path):
+    if is_log(path):
+        for _, record in ScrapeLog(path).read():
+            yield record
+    else:
+        yield from read_text(path)
+
+# Convert a 4-line text log into a segmented log (text logs have no times)
+def convert(in_path, out_path, segment_size=SEGMENT_SIZE):
+    with ScrapeLog(out_path, segment_size, flush_every=4096) as log:
+        for record in read_text(in_path):
+            log.append(record)
+    print('Wrote %d records in %d segments to %s' % (len(log), log.segments(), out_path))
+
+if __name__ == '__main__':
+    # argv[1] as text log (e.g., ../scrapes/gnews_scrape.2.txt)
+    # argv[2] as segmented log (e.g., ../scrapes/gnews_scrape.2.log)
+    convert(argv[1], argv[2])
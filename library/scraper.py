@@ -1,80 +1,159 @@
-from bs4 import BeautifulSoup
-from urllib.request import urlopen
-from time import sleep
-from os.path import exists
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from xml.etree.ElementTree import iterparse, ParseError
+from concurrent.futures import ThreadPoolExecutor
+from gzip import GzipFile
+from http.client import HTTPException
+from zlib import error as ZlibError
+from time import sleep, time
+from os.path import exists, isdir
 from datetime import datetime
 
-# Objective: scrape an RSS news feed and write article titles, links, and sources to log
+from link_index import LinkIndex
+from scrape_log import ScrapeLog, records
+
+# Objective: scrape RSS news feeds and write article titles, links, and sources to log
 
 class Scraper:
 
     TAP = 'https://news.google.com/news/rss'
-    
-    def __init__(self, path):
-        self.log = Scraper.Log(path)
-        self.links = set()
-        
+
+    def __init__(self, path, feeds=None, min_interval=60, max_interval=3600, workers=8, sync=False):
+        self.log = Scraper.Log(path, sync)
+        self.links = LinkIndex(path) # on disk, see link_index.py
+        self.feeds = [Scraper.Feed(url, min_interval, max_interval) for url in (feeds or [self.TAP])]
+        self.workers = workers
+
     def activate(self):
-        if self.log.already_exists():
+        if self.log.already_exists() and not len(self.links):
+            # one-time migration of a log written before the link index existed
             print('This log exists, importing existing links\n')
-            for link in self.log.get_existing_links():
-                self.links.add(link.strip())
-        while True:
-            additions = 0
-            for item in self.__get_items():
-                if item.link not in self.links:
-                    self.log.write(item.title, item.link, item.source) # comment
-                    self.links.add(item.link)
-                    additions += 1
-            print(datetime.now().time())
-            print('Adding %d new articles to %s' % (additions, self.log.path))
-            print('%d articles are on file' % len(self.links))
-            print('Sleeping until next iteration\n')
-            sleep(60)
-        
-    def __get_xml(self):
-        with urlopen(self.TAP) as tap:
-            return tap.read()
-            
-    def __get_soup(self):
-        return BeautifulSoup(self.__get_xml(), 'xml')
-        
-    def __get_items(self):
-        return [Scraper.Item(i) for i in self.__get_soup().findAll('item')]
-        
+            self.links.update(link.strip() for link in self.log.get_existing_links())
+        with ThreadPoolExecutor(self.workers) as pool:
+            while True:
+                now = time()
+                due = [feed for feed in self.feeds if feed.next_poll <= now]
+                # poll every due feed at once; items are logged from this thread only
+                for feed, items in zip(due, pool.map(Scraper.Feed.poll, due)):
+                    fresh = {}
+                    for item in items:
+                        if item.link not in self.links and item.link not in fresh:
+                            self.log.write(item.title, item.link, item.source) # comment
+                            fresh[item.link] = item
+                    # links are marked seen only once their items are in the log
+                    self.log.flush()
+                    additions = self.links.update(fresh)
+                    feed.adapt(additions)
+                    print(datetime.now().time())
+                    print('Adding %d new articles from %s to %s (%s)' % (
+                        additions, feed.url, self.log.path, feed.status))
+                    print('Polling %s again in %d seconds' % (feed.url, feed.interval))
+                if due:
+                    self.links.flush()
+                    print('%d articles are on file' % len(self.links))
+                    print('Sleeping until next iteration\n')
+                sleep(max(min(feed.next_poll for feed in self.feeds) - time(), 1))
+
+    class Feed:
+
+        # New items per poll we aim for; fewer stretch the interval, more shrink it
+        TARGET = 10
+
+        def __init__(self, url, min_interval, max_interval):
+            self.url = url
+            self.min_interval = min_interval
+            self.max_interval = max_interval
+            self.interval = min_interval
+            self.next_poll = 0
+            self.etag = None # validators from the last 200 response, sent back so unchanged feeds cost a 304
+            self.modified = None
+            self.status = None
+
+        def poll(self):
+            headers = {'Accept-Encoding': 'gzip'}
+            if self.etag:
+                headers['If-None-Match'] = self.etag
+            if self.modified:
+                headers['If-Modified-Since'] = self.modified
+            try:
+                with urlopen(Request(self.url, headers=headers), timeout=30) as tap:
+                    stream = GzipFile(fileobj=tap) if tap.headers.get('Content-Encoding') == 'gzip' else tap
+                    items = list(Scraper.Feed.items(stream))
+                    # validators are kept only once the whole feed is parsed, or a 304 would skip it
+                    self.etag = tap.headers.get('ETag') or self.etag
+                    self.modified = tap.headers.get('Last-Modified') or self.modified
+                    self.status = tap.status
+                    return items
+            except HTTPError as e:
+                self.status = e.code # 304 Not Modified: nothing new since the last poll
+                return []
+            except (URLError, ParseError, OSError, EOFError, ZlibError, HTTPException) as e:
+                # unreachable, truncated (EOFError, IncompleteRead) or malformed feeds are retried next poll
+                self.status = 'failed, %s' % e
+                return []
+
+        @staticmethod
+        def items(stream):
+            # parse items as the feed streams in, dropping each one once it is read
+            for _, element in iterparse(stream):
+                if element.tag == 'item':
+                    yield Scraper.Item(element)
+                    element.clear()
+
+        def adapt(self, additions):
+            # poll busy feeds more often and quiet feeds less, within the interval bounds
+            if additions == 0:
+                self.interval = min(self.interval * 1.5, self.max_interval)
+            elif additions > self.TARGET:
+                self.interval = max(self.interval / 2, self.min_interval)
+            self.next_poll = time() + self.interval
+
     class Item:
-    
+
         def __init__(self, xml_item):
             self.xml_item = xml_item
             self.title = self.__get_title()
             self.link = self.__get_link()
             self.source = self.__get_source()
-            
+
         def __get_title(self):
-            return str(self.xml_item.title.text)
-            
+            return str(self.xml_item.findtext('title', ''))
+
         def __get_link(self):
-            return str(self.xml_item.link.text)
-            
+            return str(self.xml_item.findtext('link', ''))
+
         def __get_source(self):
-            return str(self.xml_item.source).split('"')[1].split('"')[0]
-            
+            source = self.xml_item.find('source')
+            if source is not None and source.get('url'):
+                return str(source.get('url'))
+            # feeds without <source url="..."> are their own source
+            return '%s://%s' % urlsplit(self.__get_link())[:2]
+
     class Log:
-    
-        def __init__(self, path):
+
+        # Initialize with a segmented log directory (see scrape_log.py) and whether flushes fsync
+        def __init__(self, path, sync=False):
             self.path = path
-            
+            if exists(path) and not isdir(path):
+                raise Exception('%s is a text log, convert it first with scrape_log.py' % path)
+            self.existed = exists(path)
+            self.log = ScrapeLog(path, sync=sync)
+
         def already_exists(self):
-            return exists(self.path)
-            
+            return self.existed
+
         def get_existing_links(self):
-            with open(self.path, 'r') as existing_log:
-                yield from existing_log.readlines()[1::4]
-                
+            for record in records(self.path):
+                yield record.link
+
         def write(self, title, link, source):
-            with open(self.path, 'a') as log:
-                log.write("%s\n%s\n%s\n\n" % (title, link, source))
-            
-        
-s = Scraper('/Users/dbordeleau/Desktop/sapience/scrapes/gnews_scrape.2.txt')
-s.activate()
\ No newline at end of file
+            self.log.write(title, link, source)
+
+        def flush(self):
+            self.log.flush()
+
+
+if __name__ == '__main__':
+    s = Scraper('/Users/dbordeleau/Desktop/sapience/scrapes/gnews_scrape.2.log')
+    s.activate()
@@ -0,0 +1,255 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import Future
+from collections import deque
+from threading import Thread, Lock
+from queue import Queue, Empty
+from json import loads, dumps
+from time import time
+from argparse import ArgumentParser
+from numpy import asarray, float32, percentile
+
+from forest import load_classifier
+from tokenizer import words
+
+# Objective: keep the embedder and both classifiers loaded and serve bias/factualness predictions over HTTP
+#
+# POST /predict  {"text": "..."} or {"texts": ["...", ...]}
+#   -> {"predictions": [{"bias": {"label": "left_center", "confidence": 0.61}, "factualness": {...}}, ...]}
+# GET /stats     request, article and batch counts, latency percentiles and throughput
+#
+# Concurrent requests are grouped into micro-batches: the first waiting request opens a batch, which
+# then collects requests for up to max_delay seconds (or max_batch articles) before it is vectorized
+# and scored with one predict_proba call per classifier.
+
+# Same order as ml.BiasClassifier.SCALE and ml.FactualnessClassifier.SCALE (and the atn scales)
+BIAS = ['extreme_left', 'left', 'left_center', 'least_biased', 'right_center', 'right', 'extreme_right']
+FACTUALNESS = ['very_low', 'low', 'mixed', 'mostly_factual', 'high', 'very_high']
+
+# A text the embedder cannot represent (answered with a 400, it would embed to NaN or to zeros)
+class EmptyText(ValueError):
+    pass
+
+# Get the texts of a /predict body, {"text": "..."} or {"texts": ["...", ...]}, or raise ValueError
+def texts_of(body):
+    if not isinstance(body, dict):
+        raise ValueError('the body must be a JSON object')
+    if 'text' in body:
+        if not isinstance(body['text'], str):
+            raise ValueError('text must be a string')
+        return [body['text']]
+    texts = body.get('texts')
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        raise ValueError('texts must be a list of strings')
+    return texts
+
+class W2VEmbedder:
+
+    # Initialize with a word2vec binary, store or pack (a store starts in milliseconds)
+    def __init__(self, path):
+        from ml import W2VClassifier
+        self.w2vm = W2VClassifier(path)
+
+    # Average word2vec vectors of each text, as ml.UnseenArticle does
+    def __call__(self, texts):
+        token_lists = [words(text) for text in texts]
+        vocabulary = self.w2vm.embedder.vocabulary
+        for i, tokens in enumerate(token_lists):
+            if not any(token in vocabulary for token in tokens):
+                raise EmptyText('text %d has no words in the word2vec vocabulary' % i)
+        return self.w2vm.embedder.vectors(token_lists).astype(float32)
+
+class SentenceEmbedder:
+
+    # Initialize with a batch size for the universal sentence encoder (downloaded on first use)
+    def __init__(self, batch_size=32):
+        from tfmodel import MODEL
+        from batching import BatchEncoder
+        self.encoder = BatchEncoder(MODEL, 512, batch_size)
+
+    def __call__(self, texts):
+        return self.encoder.encode(texts)
+
+class Predictor:
+
+    # Initialize with an embedder (list of texts -> matrix) and classifiers, flat forests or pickles
+    def __init__(self, embedder, bias_path, factualness_path):
+        self.embedder = embedder
+        self.bias, self.bias_confidence = load_classifier(bias_path)
+        self.factualness, self.factualness_confidence = load_classifier(factualness_path)
+
+    # Label each row of a probability matrix with its most likely class and that class's probability
+    @staticmethod
+    def __labels(model, probabilities, names):
+        best = probabilities.argmax(axis=1)
+        return [{'label': names[int(model.classes_[b])], 'confidence': float(p[b])}
+                for b, p in zip(best, probabilities)]
+
+    # Predict bias and factualness of a list of texts
+    def __call__(self, texts):
+        x = asarray(self.embedder(texts), dtype=float32)
+        bias = self.__labels(self.bias, self.bias.predict_proba(x), BIAS)
+        factualness = self.__labels(self.factualness, self.factualness.predict_proba(x), FACTUALNESS)
+        return [{'bias': b, 'factualness': f} for b, f in zip(bias, factualness)]
+
+class MicroBatcher:
+
+    # Initialize with a predictor, the longest a request waits for company and the most articles per batch
+    def __init__(self, predictor, max_delay=0.01, max_batch=64):
+        self.predictor = predictor
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self.requests = Queue()
+        self.stats = Stats()
+        Thread(target=self.__run, daemon=True).start()
+
+    # Queue a list of texts, returning a Future of their predictions
+    def submit(self, texts):
+        future = Future()
+        self.requests.put((texts, future, time()))
+        return future
+
+    # Collect requests into batches and predict them, forever
+    def __run(self):
+        while True:
+            batch = [self.requests.get()]
+            size = len(batch[0][0])
+            deadline = time() + self.max_delay
+            while size < self.max_batch:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=remaining)
+                except Empty:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self.__predict(batch)
+
+    # Predict one batch of requests and hand each request its slice of the results
+    def __predict(self, batch):
+        texts = [text for request in batch for text in request[0]]
+        try:
+            predictions = self.predictor(texts) if texts else []
+        except Exception as e:
+            if len(batch) > 1:
+                # one bad text fails the whole batch, so predict each request alone and fail only its own
+                for request in batch:
+                    self.__predict([request])
+                return
+            batch[0][1].set_exception(e)
+            return
+        done = time()
+        start = 0
+        for request_texts, future, queued in batch:
+            future.set_result(predictions[start:start + len(request_texts)])
+            start += len(request_texts)
+            self.stats.request(len(request_texts), done - queued)
+        self.stats.batch()
+
+class Stats:
+
+    # Initialize with the number of most recent latencies kept for percentiles
+    def __init__(self, window=10000):
+        self.lock = Lock()
+        self.started = time()
+        self.requests = 0
+        self.articles = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=window)
+
+    def request(self, articles, latency):
+        with self.lock:
+            self.requests += 1
+            self.articles += articles
+            self.latencies.append(latency)
+
+    def batch(self):
+        with self.lock:
+            self.batches += 1
+
+    # Summarize the counts, latency percentiles (milliseconds) and throughput (articles per second)
+    def summary(self):
+        with self.lock:
+            uptime = time() - self.started
+            latencies = list(self.latencies)
+            summary = {
+                'uptime': uptime,
+                'requests': self.requests,
+                'articles': self.articles,
+                'batches': self.batches,
+                'articles_per_batch': self.articles / self.batches if self.batches else 0,
+                'articles_per_second': self.articles / uptime if uptime else 0,
+            }
+        for p in (50, 95, 99):
+            summary['latency_p%d_ms' % p] = float(percentile(latencies, p)) * 1000 if latencies else 0
+        return summary
+
+class Handler(BaseHTTPRequestHandler):
+
+    batcher = None # set by serve
+
+    def __reply(self, status, body):
+        encoded = dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self.__reply(200, self.batcher.stats.summary())
+        elif self.path == '/health':
+            self.__reply(200, {'status': 'ok'})
+        else:
+            self.__reply(404, {'error': 'unknown path %s' % self.path})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            return self.__reply(404, {'error': 'unknown path %s' % self.path})
+        try:
+            body = loads(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8'))
+            texts = texts_of(body)
+        except ValueError as e: # including malformed JSON and UTF-8
+            return self.__reply(400, {'error': 'expected {"text": "..."} or {"texts": [...]} (%s)' % e})
+        try:
+            self.__reply(200, {'predictions': self.batcher.submit(texts).result()})
+        except EmptyText as e:
+            self.__reply(400, {'error': str(e)})
+        except Exception as e:
+            self.__reply(500, {'error': str(e)})
+
+    # Quiet the default one-line-per-request log, /stats has the numbers
+    def log_message(self, format, *args):
+        pass
+
+# Serve a predictor over HTTP until interrupted
+def serve(predictor, host='127.0.0.1', port=8000, max_delay=0.01, max_batch=64):
+    Handler.batcher = MicroBatcher(predictor, max_delay, max_batch)
+    server = ThreadingHTTPServer((host, port), Handler)
+    print('Serving bias and factualness predictions on http://%s:%d' % (host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    parser = ArgumentParser(description='Serve bias and factualness predictions over HTTP')
+    parser.add_argument('--bias', default='./X_bias_model', help='bias classifier, flat forest or pickle')
+    parser.add_argument('--factualness', default='./X_fact_model', help='factualness classifier, flat forest or pickle')
+    parser.add_argument('--embedder', choices=('sentence-encoder', 'word2vec'), default='sentence-encoder',
+                        help='what the classifiers were trained on (atn2 models use the sentence encoder)')
+    parser.add_argument('--w2v', default='../classifiers/google_news.store', help='word2vec store for --embedder word2vec')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--max-delay', type=float, default=0.01, help='seconds a request waits to join a batch')
+    parser.add_argument('--max-batch', type=int, default=64, help='most articles in one batch')
+    args = parser.parse_args()
+    embedder = W2VEmbedder(args.w2v) if args.embedder == 'word2vec' else SentenceEmbedder()
+    serve(Predictor(embedder, args.bias, args.factualness), args.host, args.port, args.max_delay, args.max_batch)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+from numpy import zeros, maximum, uint8, int64, float64, count_nonzero
+from hashlib import blake2b
+from collections import Counter
+from math import log
+
+# Objective: count distinct items and frequent items of unbounded streams in fixed memory
+#
+# Every sketch has add, merge (in place, for sketches with the same parameters) and a count/estimate,
+# so per-file or per-process sketches can be combined into totals. ExactSet and ExactCounter offer the
+# same interface with exact Python sets and Counters, to check the sketches against on small inputs.
+
+# Get the 64-bit hash of a string
+def hash64(item, salt=b''):
+    return int.from_bytes(blake2b(item.encode('utf-8'), digest_size=8, salt=salt).digest(), 'big')
+
+class HyperLogLog:
+
+    # Initialize with 2 ** precision registers; the standard error is about 1.04 / sqrt(2 ** precision)
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = zeros(2 ** precision, dtype=uint8)
+
+    def add(self, item):
+        h = hash64(item)
+        rest = 64 - self.precision
+        register = h >> rest
+        rank = rest - (h & ((1 << rest) - 1)).bit_length() + 1 # position of the first 1 bit
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def merge(self, other):
+        maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    # Estimated number of distinct items added
+    def count(self):
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / (2.0 ** -self.registers.astype(float64)).sum()
+        empty = m - count_nonzero(self.registers)
+        if estimate <= 2.5 * m and empty:
+            return int(round(m * log(m / empty))) # linear counting is more accurate for small counts
+        return int(round(estimate))
+
+class CountMin:
+
+    # Initialize with counters per row and rows; estimates exceed true counts by at most
+    # e * total / width with probability 1 - exp(-depth)
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = zeros((depth, width), dtype=int64)
+
+    def __columns(self, item):
+        return [hash64(item, bytes([row])) % self.width for row in range(self.depth)]
+
+    def add(self, item, count=1):
+        columns = self.__columns(item)
+        self.table[range(self.depth), columns] += count
+        return int(self.table[range(self.depth), columns].min())
+
+    def estimate(self, item):
+        return int(self.table[range(self.depth), self.__columns(item)].min())
+
+    def merge(self, other):
+        self.table += other.table
+        return self
+
+class TopK:
+
+    # Initialize with the number of heavy hitters kept and the count-min sketch parameters
+    def __init__(self, k=100, width=2048, depth=4):
+        self.k = k
+        self.sketch = CountMin(width, depth)
+        self.candidates = {} # item -> estimated count, the k largest seen so far
+
+    def add(self, item, count=1):
+        estimate = self.sketch.add(item, count)
+        if item in self.candidates or len(self.candidates) < self.k:
+            self.candidates[item] = estimate
+            return
+        smallest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[smallest]:
+            del self.candidates[smallest]
+            self.candidates[item] = estimate
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        merged = {item: self.sketch.estimate(item) for item in set(self.candidates) | set(other.candidates)}
+        self.candidates = dict(Counter(merged).most_common(self.k))
+        return self
+
+    # The n most frequent items as (item, estimated count), most frequent first
+    def most_common(self, n=None):
+        return Counter(self.candidates).most_common(n)
+
+class ExactSet:
+
+    def __init__(self):
+        self.items = set()
+
+    def add(self, item):
+        self.items.add(item)
+
+    def merge(self, other):
+        self.items |= other.items
+        return self
+
+    def count(self):
+        return len(self.items)
+
+class ExactCounter:
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def add(self, item, count=1):
+        self.counts[item] += count
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+        return self
+
+    def most_common(self, n=None):
+        return self.counts.most_common(n)
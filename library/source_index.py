@@ -0,0 +1,95 @@
+from csv import reader
+from pickle import load, dump, HIGHEST_PROTOCOL
+from urllib.parse import urlsplit
+from os import stat, replace
+from os.path import exists
+
+# Objective: resolve an article or source URL to its sources.csv row by domain, in O(number of labels)
+#
+# Rows are keyed by their source domain (news.abs-cbn.com, edition.cnn.com, ...). A host is looked up
+# as is and then with its leftmost label dropped, one label at a time, so sub.example.com falls back to
+# example.com. A registrable domain with no row of its own but exactly one row beneath it is an alias of
+# that row, for the apex and www hosts only: cnn.com and www.cnn.com match edition.cnn.com, but a sibling
+# subdomain never does (finance.yahoo.com does not match news.yahoo.com), nor does a domain with several
+# rows beneath it. The parsed index is kept beside the CSV (sources.csv -> sources.csv.index) and rebuilt
+# when it changes.
+
+VERSION = 3 # 3: aliases of apex hosts with a single subdomain row
+SOURCES = '../../database/sources.csv'
+
+# Second-level labels under which registrations happen, e.g. bbc.co.uk, smh.com.au
+SECOND_LEVEL = {'co', 'com', 'org', 'net', 'gov', 'ac', 'edu'}
+
+# Get the host of a URL (or of a bare host name) without a leading www.
+def host_of(url):
+    host = (urlsplit(url).hostname if '//' in url else url.split('/')[0].split(':')[0]) or ''
+    host = host.lower().rstrip('.')
+    return host[4:] if host.startswith('www.') else host
+
+# Get the registrable domain of a host, e.g. edition.cnn.com -> cnn.com, news.bbc.co.uk -> bbc.co.uk
+def registrable(host):
+    labels = host.split('.')
+    if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in SECOND_LEVEL:
+        return '.'.join(labels[-3:])
+    return '.'.join(labels[-2:])
+
+class SourceIndex:
+
+    # Initialize with {domain: row} for sources and {registrable domain: row} for apex-host aliases
+    def __init__(self, domains, aliases):
+        self.domains = domains
+        self.aliases = aliases
+
+    def __len__(self):
+        return len(self.domains)
+
+    # Parse sources.csv (source,url,publication,bias,factualness,country), keeping the first row of a domain
+    @staticmethod
+    def parse(path):
+        domains = {}
+        with open(path, 'r') as sources:
+            rows = reader(sources)
+            next(rows) # skip the header line
+            for row in rows:
+                domain = host_of(row[0])
+                domains.setdefault(domain, tuple(row))
+        beneath = {} # registrable domains without a row of their own -> the rows under them
+        for domain, row in domains.items():
+            alias = registrable(domain)
+            if alias not in domains:
+                beneath.setdefault(alias, []).append(row)
+        aliases = {alias: rows[0] for alias, rows in beneath.items() if len(rows) == 1}
+        return SourceIndex(domains, aliases)
+
+    # Find the row of a URL or host, or None for unknown sources
+    def lookup(self, url):
+        host = host_of(url)
+        labels = host.split('.')
+        for i in range(0, max(len(labels) - 1, 1)):
+            row = self.domains.get('.'.join(labels[i:]))
+            if row is not None:
+                return row
+        # www. is already dropped, so an apex host here is cnn.com or www.cnn.com, never money.cnn.com
+        return self.aliases.get(host) if host == registrable(host) else None
+
+    # Get the domain a URL counts under: its source's domain when known, else its registrable domain
+    def domain(self, url):
+        row = self.lookup(url)
+        return host_of(row[0]) if row else registrable(host_of(url))
+
+    # Load the snapshot of a sources CSV, parsing the CSV and writing the snapshot first if needed
+    @staticmethod
+    def open(path=SOURCES):
+        snapshot = path + '.index'
+        st = stat(path)
+        key = (VERSION, st.st_size, st.st_mtime_ns)
+        if exists(snapshot):
+            with open(snapshot, 'rb') as i:
+                saved = load(i)
+            if saved[0] == key: # snapshots of other versions have other layouts
+                return SourceIndex(saved[1], saved[2])
+        index = SourceIndex.parse(path)
+        with open(snapshot + '.tmp', 'wb') as o:
+            dump((key, index.domains, index.aliases), o, protocol=HIGHEST_PROTOCOL)
+        replace(snapshot + '.tmp', snapshot)
+        return index
@@ -0,0 +1,113 @@
+from numpy import asarray, arange, mean, std, round as around
+from multiprocessing import Pool, cpu_count
+from itertools import product
+from argparse import ArgumentParser
+from time import perf_counter
+from csv import writer
+from sklearn.model_selection import KFold
+from sklearn.ensemble import RandomForestClassifier
+
+from features import FeatureMatrix
+
+# Objective: compare random forest settings and vector rounding with k-fold cross-validation, in parallel
+#
+# The feature matrix is saved once (FeatureMatrix.save) and every worker memory-maps it, so the pool
+# shares one copy of the vectors. Each (configuration, fold) pair is one task: fit on k - 1 folds on
+# one core, then time predict on the held-out fold. Results are averaged per configuration.
+#
+#   $ python sweep.py ../features/ta --label factualness --trees 50 100 200 --decimals none 1 2
+
+WORKER = {} # features of each worker process, set by open_worker
+
+def open_worker(path):
+    WORKER['features'] = FeatureMatrix.load(path)
+
+# Fit and score one configuration on one fold (run in a worker process)
+def run_fold(task):
+    config, label, folds, fold, seed = task
+    features = WORKER['features']
+    train, test = list(KFold(folds, shuffle=True, random_state=seed).split(arange(len(features))))[fold]
+    x, y = features.x, features.labels(label)
+    decimals = config['decimals']
+    x_train, x_test = x[train], x[test] # fancy indexing copies only this fold's rows out of the memmap
+    if decimals is not None:
+        x_train, x_test = around(x_train, decimals), around(x_test, decimals)
+    model = RandomForestClassifier(n_estimators=config['trees'], max_depth=config['depth'],
+                                   max_features=config['max_features'], min_samples_leaf=config['min_leaf'],
+                                   random_state=seed, n_jobs=1)
+    start = perf_counter()
+    model.fit(x_train, y[train])
+    fit = perf_counter() - start
+    start = perf_counter()
+    predicted = model.predict(x_test)
+    latency = (perf_counter() - start) / len(test)
+    return config, (predicted == y[test]).mean(), fit, latency
+
+# Parse a list of command line values, 'none' for None
+def values(strings, kind):
+    return [None if s.lower() == 'none' else kind(s) for s in strings]
+
+# Parse max_features, which is a name, a fraction or a count
+def max_features(s):
+    if s.lower() == 'none':
+        return None
+    if s in ('sqrt', 'log2'):
+        return s
+    return float(s) if '.' in s else int(s)
+
+# Run every configuration of a grid on every fold, returning one summary row per configuration
+def sweep(path, label, grid, folds=5, processes=None, seed=0):
+    configs = [dict(zip(grid, combination)) for combination in product(*grid.values())]
+    tasks = [(config, label, folds, fold, seed) for config in configs for fold in range(folds)]
+    print('Running %d configurations x %d folds on %s' % (len(configs), folds, FeatureMatrix.load(path)))
+    results = {}
+    with Pool(processes or cpu_count(), open_worker, (path,)) as pool:
+        for done, (config, accuracy, fit, latency) in enumerate(pool.imap_unordered(run_fold, tasks)):
+            results.setdefault(tuple(config.items()), []).append((accuracy, fit, latency))
+            print('Finished %d of %d folds' % (done + 1, len(tasks)), end='\r')
+    print()
+    table = []
+    for config, scores in results.items():
+        accuracy, fit, latency = (asarray(column) for column in zip(*scores))
+        table.append({**dict(config), 'accuracy': mean(accuracy), 'accuracy_std': std(accuracy),
+                      'fit_seconds': mean(fit), 'predict_ms_per_article': mean(latency) * 1000})
+    table.sort(key=lambda row: row['accuracy'], reverse=True)
+    return table
+
+def report(table, out=None):
+    columns = list(table[0])
+    print(' '.join('%14s' % column for column in columns))
+    for row in table:
+        print(' '.join('%14s' % ('%.4f' % row[c] if isinstance(row[c], float) else row[c]) for c in columns))
+    if out:
+        with open(out, 'w') as o:
+            table_csv = writer(o)
+            table_csv.writerow(columns)
+            table_csv.writerows([row[c] for c in columns] for row in table)
+        print('Wrote %s' % out)
+
+def main():
+    parser = ArgumentParser(description='Cross-validate random forest settings on a saved FeatureMatrix')
+    parser.add_argument('features', help='directory written by FeatureMatrix.save')
+    parser.add_argument('--label', choices=('bias', 'factualness'), default='bias')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--trees', nargs='+', default=['100'])
+    parser.add_argument('--depth', nargs='+', default=['none'])
+    parser.add_argument('--max-features', nargs='+', default=['sqrt'])
+    parser.add_argument('--min-leaf', nargs='+', default=['1'])
+    parser.add_argument('--decimals', nargs='+', default=['none'], help='rounding of the vectors, none to keep them')
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='CSV of the results table')
+    args = parser.parse_args()
+    grid = {
+        'trees': values(args.trees, int),
+        'depth': values(args.depth, int),
+        'max_features': [max_features(s) for s in args.max_features],
+        'min_leaf': values(args.min_leaf, int),
+        'decimals': values(args.decimals, int),
+    }
+    report(sweep(args.features, args.label, grid, args.folds, args.processes, args.seed), args.out)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+from numpy import array, array_equal, tile, float32
+from numpy.random import default_rng
+
+from batching import BatchEncoder
+from atn2 import TrainingArticle, featurize, featurize_batched
+
+class Encoder:
+
+    # A deterministic stand-in for the sentence encoder: each row depends only on its own text
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append([len(text) for text in texts])
+        rows = array([[len(text), text.count('a'), sum(map(ord, text)) % 997] for text in texts], dtype=float32)
+        return tile(rows, 171)[:, :512]
+
+def texts(n=300):
+    rng = default_rng(0)
+    return ['a' * int(rng.integers(0, 5)) + 'word ' * int(rng.integers(0, 400)) + str(i) for i in range(n)]
+
+def test_rows_come_back_in_input_order():
+    encoder = Encoder()
+    batches = BatchEncoder(encoder, 512, batch_size=16, window=64)
+    block = batches.encode(texts())
+    assert array_equal(block, Encoder()(texts()))
+    assert batches.calls == len(encoder.batches) == 19
+    for lengths in encoder.batches: # each call gets texts of neighbouring lengths
+        assert lengths == sorted(lengths)
+    assert [len(window) for window in batches.windows(range(150))] == [64, 64, 22]
+
+def test_batched_features_match_featurize():
+    tas = [TrainingArticle(i % 15, i % 7, i % 6, text, Encoder(), None) for i, text in enumerate(texts())]
+    one = featurize(tas)
+    batched = featurize_batched(tas, Encoder(), batch_size=16, window=100)
+    assert len(batched) == len(one) == len(tas)
+    assert array_equal(batched.x, one.x)
+    for label in ('bias', 'factualness'):
+        assert array_equal(batched.labels(label), one.labels(label))
@@ -0,0 +1,53 @@
+from csv import reader, writer
+from os import utime, stat
+
+from csv_index import RecordIndex, ShardedReader
+
+def write_csv(path, n=60):
+    with open(path, 'w', newline='') as o:
+        rows = writer(o)
+        rows.writerow(['', 'id', 'title', 'publication', 'author', 'date', 'year', 'month', 'url', 'content'])
+        for i in range(n):
+            content = 'Line one of %d.\nHe said "quoted, with a comma".\r\nÜnïcode ' % i + 'x' * (i * 37 % 500)
+            rows.writerow([i, i, 'Title "%d"' % i, 'CNN', 'A, B', '2017-01-01', 2017, 1, 'https://x/%d' % i, content])
+
+def expected(path):
+    with open(path, 'r') as i:
+        rows = list(reader(i))
+    return rows[0], rows[1:]
+
+def first(rows): # module-level, so pools can pickle it
+    return rows[0][1] if rows else None
+
+def test_index_reads_what_csv_reader_reads(tmp_path):
+    path = str(tmp_path / 'master.csv')
+    write_csv(path)
+    header, rows = expected(path)
+    index = RecordIndex.open(path)
+    assert index.header == header and len(index) == len(rows)
+    assert [index.row(n) for n in range(len(index))] == rows
+    assert index.rows(10, 25) == rows[10:25] and index.rows(50, 500) == rows[50:]
+    shards = index.shards(7)
+    assert shards[0][0] == 0 and shards[-1][1] == len(rows)
+    assert all(a[1] == b[0] for a, b in zip(shards, shards[1:]))
+
+def test_sharded_reader_keeps_file_order(tmp_path):
+    path = str(tmp_path / 'master.csv')
+    write_csv(path)
+    _, rows = expected(path)
+    for processes in (1, 2):
+        assert list(ShardedReader(path, processes).map(tuple)) == [tuple(row) for row in rows]
+        assert sorted(ShardedReader(path, processes).map(tuple, ordered=False)) == sorted(map(tuple, rows))
+    firsts = list(ShardedReader(path, 2).map_shards(first, shards=5))
+    assert len(firsts) <= 5 and firsts[0] == '0'
+
+def test_sidecar_is_rebuilt_when_the_csv_changes(tmp_path):
+    path = str(tmp_path / 'master.csv')
+    write_csv(path, 10)
+    assert len(RecordIndex.open(path)) == 10
+    assert RecordIndex.load(path) is not None
+    write_csv(path, 12)
+    st = stat(path)
+    utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert RecordIndex.load(path) is None
+    assert len(RecordIndex.open(path)) == 12
@@ -0,0 +1,93 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+from pytest import fixture
+
+from csv_ledger import CSVLedger, HEADER
+from fetcher import Fetcher
+from http_cache import HTTPCache
+
+class Handler(BaseHTTPRequestHandler):
+
+    # /<name> is an MBFC-like page naming https://www.<name>.com/ as its source, /missing is a 404
+    def do_GET(self):
+        state = self.server.state
+        with state['lock']:
+            state['hits'].append(self.path)
+        name = self.path.strip('/')
+        if name == 'missing' and not state['fixed']:
+            return self.reply(404, b'', {})
+        if self.headers.get('If-None-Match') == '"%s"' % name:
+            return self.reply(304, b'', {})
+        body = ('<p>Source: <a href="https://www.%s.com/">%s</a></p>' % (name, name)).encode('utf-8')
+        self.reply(200, body, {'ETag': '"%s"' % name})
+
+    def reply(self, status, body, headers):
+        self.send_response(status)
+        headers['Content-Length'] = str(len(body))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.state = {'lock': Lock(), 'hits': [], 'fixed': False}
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def write_raw(path, server, rows):
+    with open(path, 'w') as o:
+        o.write('url,publication,bias,factual,country\n')
+        for name, bias, factualness in rows:
+            o.write('http://127.0.0.1:%d/%s,%s,%s,%s,USA\n' % (server.server_address[1], name, name.title(),
+                                                               bias, factualness))
+
+def ledger(tmp_path):
+    return CSVLedger(str(tmp_path / 'raw.csv'), fetcher=Fetcher(workers=4, retries=0, cache=HTTPCache(str(tmp_path / 'cache'))))
+
+def read(path):
+    with open(path, 'r') as i:
+        return [line.strip().split(',') for line in i][1:]
+
+ROWS = [('reuters', 'LEAST BIASED', 'VERY HIGH'), ('vox', 'LEFT BIAS', 'HIGH'), ('missing', 'RIGHT BIAS', 'MIXED'),
+        ('satire', 'SATIRE', 'LOW'), ('nypost', 'RIGHT-CENTER BIAS', 'MIXED')]
+
+def test_rows_are_transcribed_in_ledger_order(tmp_path, server):
+    write_raw(str(tmp_path / 'raw.csv'), server, ROWS)
+    first = ledger(tmp_path)
+    first.transcribe_to(str(tmp_path / 'sources.csv'))
+    with open(str(tmp_path / 'sources.csv'), 'r') as i:
+        assert i.readline().strip() == HEADER
+    rows = read(str(tmp_path / 'sources.csv'))
+    assert [(row[0], row[2], row[3], row[4]) for row in rows] == [
+        ('reuters.com', 'Reuters', 'least_biased', 'very_high'), ('vox.com', 'Vox', 'left', 'high'),
+        ('nypost.com', 'Nypost', 'right_center', 'mixed')]
+    assert (first.unmapped, first.failed) == (1, 1)
+
+def test_resumed_runs_fetch_only_new_edited_and_failed_rows(tmp_path, server):
+    write_raw(str(tmp_path / 'raw.csv'), server, ROWS)
+    ledger(tmp_path).transcribe_to(str(tmp_path / 'sources.csv'))
+    server.state['hits'].clear()
+    server.state['fixed'] = True
+    write_raw(str(tmp_path / 'raw.csv'), server, ROWS[:1] + [('vox', 'LEFT-CENTER BIAS', 'HIGH')] + ROWS[2:])
+    ledger(tmp_path).transcribe_to(str(tmp_path / 'sources.csv'))
+    assert sorted(server.state['hits']) == ['/missing', '/vox']
+    assert [row[0] for row in read(str(tmp_path / 'sources.csv'))] == ['reuters.com', 'vox.com', 'missing.com',
+                                                                       'nypost.com']
+    assert read(str(tmp_path / 'sources.csv'))[1][3] == 'left_center'
+
+def test_full_refresh_revalidates_cached_pages(tmp_path, server):
+    write_raw(str(tmp_path / 'raw.csv'), server, ROWS)
+    ledger(tmp_path).transcribe_to(str(tmp_path / 'sources.csv'))
+    before = read(str(tmp_path / 'sources.csv'))
+    again = ledger(tmp_path)
+    again.transcribe_to(str(tmp_path / 'sources.csv'), incremental=False)
+    assert read(str(tmp_path / 'sources.csv')) == before
+    assert again.fetcher.cache.revalidated == 3 and again.fetcher.cache.misses == 0
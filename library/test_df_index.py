@@ -0,0 +1,51 @@
+from csv import reader, writer
+from os import stat, utime
+
+from df_index import DocumentFrequencies, sidecar
+from tokenizer import words
+
+def write_csv(path, contents):
+    with open(path, 'w', newline='') as o:
+        rows = writer(o)
+        rows.writerow(['', 'id', 'title', 'publication', 'author', 'date', 'year', 'month', 'url', 'content'])
+        for i, content in enumerate(contents):
+            rows.writerow([i, i, 'Title', 'CNN', 'Author', '2017-01-01', 2017, 1, 'https://x/%d' % i, content])
+
+def contents(n):
+    return ['Article %d says "news, news" and more news.\nIt\'s %s day %d.' % (i, ['a sunny', 'a rainy'][i % 2], i % 5)
+            for i in range(n)]
+
+def legacy(path):
+    # the per-article first pass AllTheNewsCSV made before the sidecar
+    hash, n = {}, 0
+    with open(path, 'r') as master_text:
+        master_csv = reader(master_text)
+        next(master_csv)
+        for e in master_csv:
+            n += 1
+            for key in set(words(e[9])):
+                hash[key] = hash.get(key, 0) + 1
+    return n, hash
+
+def test_sharded_tally_matches_a_single_pass(tmp_path):
+    path = str(tmp_path / 'master.csv')
+    write_csv(path, contents(50))
+    for processes in (1, 2):
+        df = DocumentFrequencies.build(path, processes)
+        assert (df.n, df.counts) == legacy(path)
+    assert df.counts['news'] == 50 and df.counts['rainy'] == 25
+
+def test_sidecar_is_reused_until_the_csv_changes(tmp_path):
+    path = str(tmp_path / 'master.csv')
+    write_csv(path, contents(10))
+    assert DocumentFrequencies.load(path) is None
+    first = DocumentFrequencies.open(path, 1)
+    saved = stat(sidecar(path)).st_ino
+    again = DocumentFrequencies.open(path, 1)
+    assert (again.n, again.counts) == (first.n, first.counts)
+    assert stat(sidecar(path)).st_ino == saved # loaded, not rebuilt and replaced
+    write_csv(path, contents(12))
+    st = stat(path)
+    utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert DocumentFrequencies.load(path) is None
+    assert DocumentFrequencies.open(path, 1).n == 12
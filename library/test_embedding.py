@@ -0,0 +1,40 @@
+from numpy import zeros, float32, float64
+from numpy.random import default_rng
+
+import w2v_store
+from w2v_store import Store
+from embedding import Embedder, SUM, WEIGHTED
+
+def embedder(tmp_path):
+    rng = default_rng(0)
+    known = ['word%d' % i for i in range(50)]
+    w2v_store.write(str(tmp_path / 'w2v'), known, rng.standard_normal((50, 300)).astype(float32))
+    return Embedder(Store(str(tmp_path / 'w2v')))
+
+def articles(n=20):
+    rng = default_rng(1)
+    # word50 ... word59 are out of vocabulary
+    return [['word%d' % i for i in rng.integers(0, 60, rng.integers(1, 40))] for _ in range(n)]
+
+# Article.get_vector before the Embedder: one float64 sum per in-vocabulary word, over every word
+def legacy(model, tokens):
+    total = zeros(300, dtype=float64)
+    for token in tokens:
+        if token in model:
+            total += model.word_vec(token)
+    return total / len(tokens)
+
+def test_mean_matches_the_per_word_loop(tmp_path):
+    e = embedder(tmp_path)
+    for tokens in articles():
+        assert abs(e.vector(tokens) - legacy(e.model, tokens)).max() < 1e-12
+
+def test_batches_match_single_articles(tmp_path):
+    e = embedder(tmp_path)
+    token_lists = articles() + [['word55']] # an article with no known words embeds to zeros
+    batch = e.vectors(token_lists)
+    for row, tokens in zip(batch, token_lists):
+        assert abs(row - e.vector(tokens)).max() < 1e-12
+    assert not batch[-1].any()
+    weights = [[0.5] * len(tokens) for tokens in token_lists]
+    assert abs(e.vectors(token_lists, SUM) / 2 - e.vectors(token_lists, WEIGHTED, weights, [1] * len(weights))).max() < 1e-12
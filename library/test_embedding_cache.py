@@ -0,0 +1,30 @@
+from numpy import arange, array_equal, float32
+from pytest import raises
+
+from embedding_cache import EmbeddingCache, W2V_MEAN, W2V_TFIDF
+
+def vector(i):
+    return arange(i, i + 4, dtype=float32)
+
+def test_vectors_persist_per_embedder(tmp_path):
+    with EmbeddingCache(str(tmp_path / 'cache'), 4) as cache:
+        assert cache.get(W2V_MEAN, 'some article') is None
+        cache.put(W2V_MEAN, 'some article', vector(1))
+        assert cache.get_or_compute(W2V_TFIDF, 'some article', lambda: vector(2)) is not None
+    cache = EmbeddingCache(str(tmp_path / 'cache'), 4)
+    assert len(cache) == 2
+    assert array_equal(cache.get(W2V_MEAN, 'some article'), vector(1))
+    assert array_equal(cache.get_or_compute(W2V_TFIDF, 'some article', lambda: vector(9)), vector(2))
+    assert (cache.hits, cache.misses) == (2, 0)
+    with raises(Exception):
+        EmbeddingCache(str(tmp_path / 'cache'), 300)
+
+def test_least_recently_used_vector_is_evicted(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / 'cache'), 4, capacity=3)
+    for i in range(3):
+        cache.put(W2V_MEAN, 'article %d' % i, vector(i))
+    cache.get(W2V_MEAN, 'article 0') # article 1 is now the oldest
+    cache.put(W2V_MEAN, 'article 3', vector(3))
+    assert len(cache) == 3 and cache.get(W2V_MEAN, 'article 1') is None
+    for i in (0, 2, 3):
+        assert array_equal(cache.get(W2V_MEAN, 'article %d' % i), vector(i))
@@ -0,0 +1,95 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread, Lock
+from time import sleep
+from pytest import fixture
+
+from fetcher import Fetcher
+
+class Handler(BaseHTTPRequestHandler):
+
+    # /flaky answers 503 to its first two requests, /slow holds the connection for a while,
+    # /redirect?<url> redirects like a news.google.com link, anything else is a 404
+    def do_GET(self):
+        state = self.server.state
+        with state['lock']:
+            state['hits'][self.path] = state['hits'].get(self.path, 0) + 1
+            hits = state['hits'][self.path]
+        if self.path.startswith('/redirect?'):
+            self.send_response(302)
+            self.send_header('Location', self.path.split('?', 1)[1])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path == '/flaky' and hits <= 2:
+            return self.reply(503, b'busy')
+        if self.path.startswith('/slow'):
+            with state['lock']:
+                state['active'] += 1
+                state['most'] = max(state['most'], state['active'])
+            sleep(0.2)
+            with state['lock']:
+                state['active'] -= 1
+            return self.reply(200, b'slow')
+        if self.path == '/flaky':
+            return self.reply(200, b'ok')
+        self.reply(404, b'missing')
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.state = {'lock': Lock(), 'hits': {}, 'active': 0, 'most': 0}
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def url(server, path):
+    return 'http://127.0.0.1:%d%s' % (server.server_address[1], path)
+
+@fixture
+def servers():
+    started = [start() for _ in range(3)]
+    yield started
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+def test_retries_with_backoff_then_gives_up_on_client_errors(servers):
+    server = servers[0]
+    fetcher = Fetcher(workers=2, retries=3, backoff=0.01)
+    results = {key: (result, error) for key, _, result, error in
+               fetcher.fetch([('flaky', url(server, '/flaky')), ('missing', url(server, '/missing'))],
+                             lambda response: response.text)}
+    assert results['flaky'] == ('ok', None)
+    assert server.state['hits']['/flaky'] == 3
+    assert results['missing'][1].reason == 'HTTP 404'
+    assert server.state['hits']['/missing'] == 1 # 404 is not retried
+
+def test_retries_are_bounded(servers):
+    server = servers[0]
+    server.state['hits']['/flaky'] = -10 # keep failing
+    _, _, _, error = next(Fetcher(retries=2, backoff=0.01).fetch([(0, url(server, '/flaky'))]))
+    assert error.reason == 'HTTP 503 after 3 attempts'
+
+def test_connections_per_host_are_limited(servers):
+    server = servers[0]
+    jobs = [(i, url(server, '/slow/%d' % i)) for i in range(8)]
+    assert len(list(Fetcher(workers=8, per_host=2).fetch(jobs))) == 8
+    assert server.state['most'] == 2
+
+def test_limit_applies_to_the_redirect_target(servers):
+    redirector, first, second = servers
+    second.state = first.state # count the two publishers' connections together
+    jobs = [(i, url(redirector, '/redirect?' + url(publisher, '/slow/%d' % i)))
+            for i, publisher in enumerate([first, second] * 4)]
+    fetched = list(Fetcher(workers=8, per_host=1).fetch(jobs, lambda response: response.text))
+    assert [result for _, _, result, _ in fetched] == ['slow'] * 8
+    # one slot per publisher (two at once), not one slot shared by everything behind the redirector
+    assert first.state['most'] == 2
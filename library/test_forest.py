@@ -0,0 +1,41 @@
+from numpy import array_equal, nan
+from numpy.random import default_rng
+from pytest import raises
+from sklearn.ensemble import RandomForestClassifier
+
+from forest import FlatForest
+
+def fitted(seed=0, classes=4):
+    rng = default_rng(seed)
+    x = rng.standard_normal((300, 20))
+    y = rng.integers(0, classes, 300)
+    return RandomForestClassifier(n_estimators=15, random_state=seed).fit(x, y), rng.standard_normal((200, 20))
+
+def test_predictions_match_sklearn_exactly():
+    model, x = fitted()
+    forest = FlatForest.flatten(model)
+    assert array_equal(forest.predict_proba(x), model.predict_proba(x))
+    assert array_equal(forest.predict(x), model.predict(x))
+    assert array_equal(forest.apply(x), model.apply(x) + forest.roots)
+
+def test_save_and_load_keep_predictions(tmp_path):
+    model, x = fitted(1)
+    FlatForest.flatten(model, 0.5).save(str(tmp_path / 'model.forest'))
+    forest = FlatForest.load(str(tmp_path / 'model.forest'))
+    assert forest.confidence == 0.5
+    assert array_equal(forest.predict_proba(x), model.predict_proba(x))
+
+def test_merge_averages_every_tree():
+    a, x = fitted(2)
+    b, _ = fitted(3, classes=3)
+    merged = FlatForest.merge([FlatForest.flatten(a), FlatForest.flatten(b)])
+    expected = a.predict_proba(x) * 15
+    expected[:, :3] += b.predict_proba(x) * 15
+    assert len(merged) == 30
+    assert abs(merged.predict_proba(x) - expected / 30).max() < 1e-12
+
+def test_missing_values_are_rejected():
+    model, x = fitted()
+    x[3, 5] = nan
+    with raises(ValueError):
+        FlatForest.flatten(model).predict(x)
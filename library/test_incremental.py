@@ -0,0 +1,41 @@
+from numpy import float32
+from numpy.random import default_rng
+from pytest import raises
+
+from incremental import ModelHistory, held_out
+from forest import FlatForest
+
+def articles(start, n, seed):
+    # two separable classes, named like the article files of ml.py
+    rng = default_rng(seed)
+    y = rng.integers(0, 2, n)
+    x = rng.standard_normal((n, 8)).astype(float32) + y[:, None] * 3
+    return ['ta.%d.txt' % i for i in range(start, start + n)], x, y
+
+def test_updates_grow_the_forest_on_new_articles_only(tmp_path):
+    history = ModelHistory(str(tmp_path / 'bias'), 'bias')
+    names, x, y = articles(0, 200, 0)
+    first = history.update(names, x, y, trees=5)
+    held = [name for name in names if held_out(name)]
+    assert 20 < len(held) < 80 and len(history.holdout()[1]) == len(held)
+    assert len(first) == 5 and first.confidence > 0.9
+    assert history.seen() == set(names)
+
+    history = ModelHistory(str(tmp_path / 'bias'), 'bias') # reopened
+    names, x, y = articles(200, 100, 1)
+    second = history.update(names, x, y, trees=5)
+    assert len(second) == 10 and len(FlatForest.load(history.latest())) == 10
+    versions = history.manifest['versions']
+    assert [v['trees'] for v in versions] == [5, 10]
+    assert versions[1]['articles'] == versions[0]['articles'] + versions[1]['new_articles']
+    assert versions[1]['holdout_articles'] == len(held) + sum(held_out(name) for name in names)
+    with raises(Exception): # a directory holds one label's models
+        ModelHistory(str(tmp_path / 'bias'), 'factualness')
+
+def test_too_few_new_articles_keep_the_latest_version(tmp_path):
+    history = ModelHistory(str(tmp_path / 'bias'), 'bias')
+    names, x, y = articles(0, 8, 2)
+    assert history.update(names, x, y, skipped=['ta.short.txt']) is None
+    # the articles it would train on wait for the next update; held out and skipped ones are done
+    assert history.latest() is None
+    assert history.seen() == {name for name in names if held_out(name)} | {'ta.short.txt'}
@@ -0,0 +1,43 @@
+from os.path import getsize
+
+from link_index import LinkIndex, CAPACITY
+
+def links(n):
+    return ['https://news.example.com/%d/story-%d' % (i % 7, i) for i in range(n)]
+
+def test_links_survive_reopening(tmp_path):
+    path = str(tmp_path / 'log.txt')
+    with LinkIndex(path) as index:
+        assert index.add('https://a.example.com/ü') and not index.add('https://a.example.com/ü')
+        assert index.update(links(10) + links(5)) == 10
+        assert len(index) == 11
+    with LinkIndex(path) as index:
+        assert len(index) == 11
+        assert all(link in index for link in links(10)) and 'https://a.example.com/ü' in index
+        assert 'https://news.example.com/3/story-10' not in index
+        assert index.add('https://news.example.com/3/story-10')
+    with open(path + '.links', 'rb') as i:
+        assert i.read().decode('utf-8').splitlines() == ['https://a.example.com/ü'] + links(11)
+
+def test_table_grows_past_half_full(tmp_path):
+    path = str(tmp_path / 'log.txt')
+    n = 3 * CAPACITY
+    with LinkIndex(path) as index:
+        assert index.update(links(n)) == n
+        assert len(index.table) - 1 >= 2 * n
+    with LinkIndex(path) as index:
+        assert len(index) == n and all(link in index for link in links(n))
+        assert index.update(links(n)) == 0
+
+def test_uncommitted_links_are_indexed_and_a_torn_line_dropped(tmp_path):
+    path = str(tmp_path / 'log.txt')
+    with LinkIndex(path) as index:
+        index.update(links(3))
+    committed = getsize(path + '.links')
+    with open(path + '.links', 'ab') as o: # killed after writing one more link and part of another
+        o.write(b'https://late.example.com/1\nhttps://late.exa')
+    with LinkIndex(path) as index:
+        assert len(index) == 4
+        assert 'https://late.example.com/1' in index and 'https://late.exa' not in index
+        assert getsize(path + '.links') == committed + len('https://late.example.com/1\n')
+        assert index.add('https://late.example.com/2') and 'https://late.example.com/2' in index
@@ -0,0 +1,45 @@
+from numpy import float32, array_equal
+from numpy.random import default_rng
+
+import w2v_store
+from ml import W2VClassifier, Classifier, TrainingArticle
+from metrics import METRICS
+from tokenizer import words
+
+VOCABULARY = ['news', 'report', 'senate', 'vote', 'market', 'storm', 'court', 'ruling', 'election', 'budget']
+
+def corpus(tmp_path, n=40):
+    rng = default_rng(0)
+    w2v_store.write(str(tmp_path / 'w2v'), VOCABULARY[:8], rng.standard_normal((8, 300)).astype(float32))
+    (tmp_path / 'ta').mkdir()
+    for i in range(n):
+        body = ' '.join(rng.choice(VOCABULARY, 5 if i % 7 == 0 else 30)) + '\n\nSecond paragraph.\n'
+        (tmp_path / 'ta' / ('ta.%d.txt' % i)).write_text(
+            'https://example.com/%d\nCNN,left,mixed,USA\n\n%s' % (i, body))
+    return W2VClassifier(str(tmp_path / 'w2v')), str(tmp_path / 'ta')
+
+def test_one_read_matches_the_two_reads_it_replaces(tmp_path):
+    w2vm, directory = corpus(tmp_path, 3)
+    path = directory + '/ta.1.txt'
+    article = TrainingArticle(path, w2vm)
+    with open(path, 'r') as i:
+        lines = i.readlines()
+    assert article.words == words(''.join(lines[3:]))
+    assert ','.join([article.source, article.bias, article.factualness, article.country]) == lines[1].strip()
+
+def features_and_counters(w2vm, directory, **options):
+    METRICS.reset()
+    features = Classifier().create_features(directory, w2vm, **options)
+    counters = METRICS.summary()['counters']
+    return features, counters
+
+def test_parallel_loading_matches_serial(tmp_path):
+    w2vm, directory = corpus(tmp_path)
+    serial, serial_counts = features_and_counters(w2vm, directory)
+    parallel, parallel_counts = features_and_counters(w2vm, directory, processes=2)
+    assert array_equal(serial.x, parallel.x) and array_equal(serial.labels('bias'), parallel.labels('bias'))
+    # the workers' words and OOV counts reach the parent
+    assert serial_counts == parallel_counts
+    assert serial_counts['short_articles'] == 6 and serial_counts['oov_words'] > 0
+    unordered, _ = features_and_counters(w2vm, directory, processes=2, ordered=False)
+    assert sorted(map(tuple, unordered.x)) == sorted(map(tuple, serial.x))
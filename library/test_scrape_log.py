@@ -0,0 +1,68 @@
+from scrape_log import ScrapeLog, Record, records, convert, records_file
+
+def items(n):
+    return [Record(float(i), 'Title %d, "quoted" ü' % i, 'https://x.example.com/%d' % i, 'Source %d' % (i % 3))
+            for i in range(n)]
+
+def test_records_round_trip_across_segments(tmp_path):
+    path = str(tmp_path / 'scrape.log')
+    with ScrapeLog(path, segment_size=10, flush_every=3) as log:
+        for record in items(25):
+            log.append(record)
+    log = ScrapeLog(path, segment_size=10)
+    assert log.segments() == 3 and len(log) == 25
+    assert [record for _, record in log.read()] == items(25)
+    assert [log.record(n) for n in (0, 9, 10, 24)] == [items(25)[n] for n in (0, 9, 10, 24)]
+    assert log.meta(0) == {'version': 1, 'count': 10, 'first': 0.0, 'last': 9.0, 'bytes': log.meta(0)['bytes'],
+                           'sealed': True}
+    assert list(records(path)) == items(25)
+
+def test_reading_resumes_after_a_checkpoint(tmp_path):
+    path = str(tmp_path / 'scrape.log')
+    log = ScrapeLog(path, segment_size=10, flush_every=1)
+    for record in items(12):
+        log.append(record)
+    read = list(log.read())
+    for i, (checkpoint, _) in enumerate(read):
+        assert [record for _, record in log.read(checkpoint)] == items(12)[i + 1:]
+    checkpoint = read[-1][0]
+    for record in items(20)[12:]: # the scraper keeps appending, the reader picks up where it stopped
+        log.append(record)
+    assert [record for _, record in log.read(checkpoint)] == items(20)[12:]
+    log.close()
+
+def test_torn_last_line_is_dropped_on_reopen(tmp_path):
+    path = str(tmp_path / 'scrape.log')
+    with ScrapeLog(path) as log:
+        for record in items(3):
+            log.append(record)
+    with open(records_file(path, 0), 'ab') as o:
+        o.write(b'{"time": 3.0, "tit')
+    with ScrapeLog(path) as log:
+        log.append(items(5)[4])
+    assert list(records(path)) == items(3) + items(5)[4:]
+
+def test_text_logs_convert(tmp_path):
+    text = str(tmp_path / 'scrape.txt')
+    with open(text, 'w') as o:
+        for record in items(7):
+            o.write('%s\n%s\n%s\n\n' % record[1:])
+    expected = [Record(None, *record[1:]) for record in items(7)]
+    assert list(records(text)) == expected
+    convert(text, str(tmp_path / 'scrape.log'), segment_size=4)
+    assert list(records(str(tmp_path / 'scrape.log'))) == expected
+    assert ScrapeLog(str(tmp_path / 'scrape.log')).segments() == 2
+
+def test_reopened_segment_keeps_its_first_time(tmp_path):
+    path = str(tmp_path / 'scrape.log')
+    with ScrapeLog(path, segment_size=5) as log:
+        for record in items(3):
+            log.append(record)
+    with ScrapeLog(path, segment_size=5) as log: # restarted mid-segment
+        for record in items(7)[3:]:
+            log.append(record)
+    assert (log.meta(0)['first'], log.meta(0)['last'], log.meta(0)['count']) == (0.0, 4.0, 5)
+    assert (log.meta(1)['first'], log.meta(1)['count'], log.meta(1)['sealed']) == (None, 2, False)
+    with ScrapeLog(path, segment_size=3) as log: # restarted with nothing new to write
+        pass
+    assert log.meta(1)['count'] == 2 and list(records(path)) == items(7)
@@ -0,0 +1,80 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from gzip import compress
+from pytest import fixture
+
+from scraper import Scraper
+
+FEED = b'''<?xml version="1.0"?><rss><channel>
+<item><title>One</title><link>https://a.example.com/1</link><source url="https://a.example.com">A</source></item>
+<item><title>Two</title><link>https://b.example.com/2</link></item>
+</channel></rss>'''
+
+class Handler(BaseHTTPRequestHandler):
+
+    # /feed honours If-None-Match, /broken is malformed until /fix, /truncated and /truncated.gz stop short
+    def do_GET(self):
+        state = self.server.state
+        state['requests'].append((self.path, self.headers.get('If-None-Match')))
+        if self.path == '/fix':
+            state['broken'] = False
+            return self.reply(200, b'')
+        if self.path in ('/feed', '/broken'):
+            if self.headers.get('If-None-Match') == '"v1"':
+                return self.reply(304, b'')
+            body = FEED[:-20] if self.path == '/broken' and state['broken'] else FEED
+            return self.reply(200, body, {'ETag': '"v1"', 'Last-Modified': 'Mon, 02 Jan 2017 00:00:00 GMT'})
+        if self.path == '/truncated':
+            return self.reply(200, FEED[:100], {'ETag': '"v1"', 'Content-Length': str(len(FEED))})
+        if self.path == '/truncated.gz':
+            return self.reply(200, compress(FEED)[:-30], {'ETag': '"v1"', 'Content-Encoding': 'gzip'})
+        self.reply(404, b'')
+
+    def reply(self, status, body, headers={}):
+        self.send_response(status)
+        headers = dict({'Content-Length': str(len(body))}, **headers)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+@fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.state = {'requests': [], 'broken': True}
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def feed(server, path):
+    return Scraper.Feed('http://127.0.0.1:%d%s' % (server.server_address[1], path), 60, 3600)
+
+def test_unchanged_feed_costs_a_304(server):
+    f = feed(server, '/feed')
+    items = f.poll()
+    assert [(item.title, item.link, item.source) for item in items] == [
+        ('One', 'https://a.example.com/1', 'https://a.example.com'),
+        ('Two', 'https://b.example.com/2', 'https://b.example.com')]
+    assert (f.status, f.etag) == (200, '"v1"')
+    assert f.poll() == [] and f.status == 304
+    assert server.state['requests'] == [('/feed', None), ('/feed', '"v1"')]
+
+def test_failed_parse_keeps_no_validators(server):
+    f = feed(server, '/broken')
+    assert f.poll() == [] and f.status.startswith('failed')
+    assert f.etag is None and f.modified is None
+    feed(server, '/fix').poll()
+    assert len(f.poll()) == 2 and f.status == 200 # fetched again in full, not skipped with a 304
+    assert server.state['requests'][-1] == ('/broken', None)
+
+def test_truncated_bodies_count_as_failures(server):
+    for path in ('/truncated', '/truncated.gz'):
+        f = feed(server, path)
+        assert f.poll() == [] and f.status.startswith('failed'), path
+        assert f.etag is None
@@ -0,0 +1,54 @@
+from http.server import ThreadingHTTPServer
+from threading import Thread
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
+from json import dumps, loads
+from numpy import isfinite, eye, float32
+from pytest import raises
+
+import w2v_store
+from service import W2VEmbedder, MicroBatcher, EmptyText, Handler
+
+def embedder(tmp_path):
+    w2v_store.write(str(tmp_path / 'w2v'), ['news', 'report'], eye(2, 300, dtype=float32))
+    return W2VEmbedder(str(tmp_path / 'w2v'))
+
+def test_text_without_known_words_is_rejected(tmp_path):
+    embed = embedder(tmp_path)
+    assert isfinite(embed(['News report', 'a news item'])).all()
+    for text in ('', '1234 !!', 'unknown words only'):
+        with raises(EmptyText):
+            embed(['news', text])
+
+def test_bad_request_fails_only_its_own_future(tmp_path):
+    embed = embedder(tmp_path)
+    batcher = MicroBatcher(lambda texts: [row.tolist() for row in embed(texts)], max_delay=0.5)
+    good, bad, other = batcher.submit(['news']), batcher.submit(['']), batcher.submit(['report', 'news'])
+    assert good.result(timeout=5)[0][0] == 1
+    assert len(other.result(timeout=5)) == 2
+    with raises(EmptyText):
+        bad.result(timeout=5)
+
+def post(server, body):
+    request = Request('http://127.0.0.1:%d/predict' % server.server_address[1], data=body.encode('utf-8', 'surrogateescape'))
+    try:
+        with urlopen(request, timeout=5) as response:
+            return response.status, loads(response.read())
+    except HTTPError as e:
+        return e.code, loads(e.read())
+
+def test_malformed_bodies_are_rejected():
+    class Lengths(Handler):
+        batcher = MicroBatcher(lambda texts: [len(text) for text in texts], max_delay=0.01)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Lengths)
+    Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        assert post(server, dumps({'text': 'news'})) == (200, {'predictions': [4]})
+        assert post(server, dumps({'texts': ['news', 'a report']})) == (200, {'predictions': [4, 8]})
+        for body in (dumps({'texts': 'news'}), dumps({'text': 12}), dumps({'text': ['news']}),
+                     dumps({'texts': ['news', None]}), dumps({}), dumps(['news']), '{"text": ', '\udc80'):
+            status, reply = post(server, body)
+            assert status == 400 and 'error' in reply, body
+    finally:
+        server.shutdown()
+        server.server_close()
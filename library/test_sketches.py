@@ -0,0 +1,58 @@
+from math import e, sqrt
+from random import Random
+
+from sketches import HyperLogLog, CountMin, TopK, ExactSet, ExactCounter
+
+def stream(n, distinct, seed=0): # zipf-like: word i is about 1 / (i + 1) as frequent as word 0
+    random = Random(seed)
+    weights = [1 / (i + 1) for i in range(distinct)]
+    return ['word%d' % i for i in random.choices(range(distinct), weights, k=n)]
+
+def test_hyperloglog_is_within_three_standard_errors():
+    for n in (500, 20000, 100000):
+        sketch, exact = HyperLogLog(), ExactSet()
+        for i in range(n):
+            sketch.add('https://x.example.com/%d' % i)
+            exact.add('https://x.example.com/%d' % i)
+        assert abs(sketch.count() - exact.count()) <= 3 * 1.04 / sqrt(2 ** 14) * exact.count()
+
+def test_hyperloglog_merge_equals_one_pass():
+    items = ['item%d' % i for i in range(30000)]
+    whole, left, right = HyperLogLog(), HyperLogLog(), HyperLogLog()
+    for i, item in enumerate(items):
+        whole.add(item)
+        (left if i % 3 else right).add(item)
+        left.add(items[i // 2]) # overlapping halves
+    assert (left.merge(right).registers == whole.registers).all()
+
+def test_count_min_never_underestimates_and_stays_within_its_bound():
+    words = stream(50000, 5000)
+    sketch, exact = CountMin(width=512, depth=4), ExactCounter()
+    for word in words:
+        sketch.add(word)
+        exact.add(word)
+    errors = [sketch.estimate(word) - count for word, count in exact.counts.items()]
+    assert min(errors) >= 0
+    bound = e * len(words) / 512
+    assert sum(error > bound for error in errors) <= 0.02 * len(errors) # exp(-4) of them may exceed it
+
+def test_top_k_finds_the_heavy_hitters():
+    words = stream(50000, 5000)
+    top, exact = TopK(k=20), ExactCounter()
+    for word in words:
+        top.add(word)
+        exact.add(word)
+    assert [word for word, _ in top.most_common(10)] == [word for word, _ in exact.most_common(10)]
+    assert all(count >= exact.counts[word] for word, count in top.most_common())
+
+def test_top_k_merge_equals_one_pass():
+    words = stream(20000, 2000, seed=1)
+    whole, parts = TopK(k=20), [TopK(k=20) for _ in range(4)]
+    for i, word in enumerate(words):
+        whole.add(word)
+        parts[i % 4].add(word)
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+    assert (merged.sketch.table == whole.sketch.table).all()
+    assert merged.most_common(10) == whole.most_common(10)
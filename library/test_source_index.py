@@ -0,0 +1,47 @@
+from source_index import SourceIndex, registrable
+
+ROWS = [
+    'news.yahoo.com,https://mediabiasfactcheck.com/yahoo-news/,Yahoo News,left_center,mixed,USA',
+    'edition.cnn.com,https://mediabiasfactcheck.com/cnn/,CNN,left,mixed,USA',
+    'bbc.co.uk,https://mediabiasfactcheck.com/bbc/,BBC,least_biased,high,United Kingdom',
+    'reuters.com,https://mediabiasfactcheck.com/reuters/,Reuters,least_biased,very_high,United Kingdom',
+    'businessinsider.com,https://mediabiasfactcheck.com/business-insider/,Business Insider,left_center,high,USA',
+    'greenvilleonline.com,https://mediabiasfactcheck.com/greenville-news/,Greenville News,least_biased,high,USA',
+    'christianitytoday.com,https://mediabiasfactcheck.com/christianity-today/,Christianity Today,right_center,high,USA',
+    'news.google.com,https://example.org/a/,Google News A,least_biased,high,USA',
+    'blog.google.com,https://example.org/b/,Google Blog B,least_biased,high,USA',
+]
+
+def index(tmp_path):
+    path = tmp_path / 'sources.csv'
+    path.write_text('source,url,publication,bias,factualness,country\n' + '\n'.join(ROWS) + '\n')
+    return SourceIndex.open(str(path))
+
+def test_subdomains_fall_back_to_their_parents(tmp_path):
+    sources = index(tmp_path)
+    assert sources.lookup('https://www.reuters.com/article/x')[2] == 'Reuters'
+    assert sources.lookup('https://uk.reuters.com/article/x')[2] == 'Reuters'
+    assert sources.lookup('http://news.bbc.co.uk/2/hi/x.stm')[2] == 'BBC'
+    assert sources.lookup('https://edition.cnn.com/2020/x')[2] == 'CNN'
+
+def test_apex_hosts_match_their_only_subdomain_row(tmp_path):
+    sources = index(tmp_path)
+    for url in ('https://www.cnn.com/x', 'cnn.com', 'http://CNN.com:80/'):
+        assert sources.lookup(url)[2] == 'CNN', url
+    assert sources.lookup('https://www.yahoo.com/news/x')[2] == 'Yahoo News'
+    assert sources.domain('https://www.cnn.com/x') == 'edition.cnn.com'
+
+def test_siblings_and_substrings_never_match(tmp_path):
+    sources = index(tmp_path)
+    # the old findall over sources.csv matched each of these to a row that merely ends with the host
+    for url in ('https://finance.yahoo.com/x', 'https://money.cnn.com/x', 'https://www.google.com/',
+                'https://www.eonline.com/x', 'https://www.insider.com/x', 'https://www.today.com/x',
+                'https://co.uk/', 'https://notreuters.com/'):
+        assert sources.lookup(url) is None, url
+
+def test_snapshot_round_trip(tmp_path):
+    first = index(tmp_path)
+    assert (tmp_path / 'sources.csv.index').exists()
+    again = SourceIndex.open(str(tmp_path / 'sources.csv'))
+    assert again.domains == first.domains
+    assert again.domain('https://finance.yahoo.com/x') == registrable('finance.yahoo.com') == 'yahoo.com'
@@ -0,0 +1,37 @@
+from numpy import arange, around, float32
+from numpy.random import default_rng
+from sklearn.model_selection import KFold
+from sklearn.ensemble import RandomForestClassifier
+
+from features import FeatureMatrix
+from sweep import sweep
+
+def features(path):
+    rng = default_rng(0)
+    bias = rng.integers(0, 3, 120)
+    x = rng.standard_normal((120, 6)).astype(float32) + bias[:, None]
+    matrix = FeatureMatrix(6)
+    matrix.extend(x, bias, rng.integers(0, 2, 120))
+    matrix.save(path)
+    return matrix
+
+# The same cross-validation, one configuration at a time in this process
+def serial(matrix, trees, decimals, folds=3, seed=0):
+    x, y = matrix.x, matrix.labels('bias')
+    if decimals is not None:
+        x = around(x, decimals)
+    scores = []
+    for train, test in KFold(folds, shuffle=True, random_state=seed).split(arange(len(matrix))):
+        model = RandomForestClassifier(n_estimators=trees, random_state=seed, n_jobs=1).fit(x[train], y[train])
+        scores.append((model.predict(x[test]) == y[test]).mean())
+    return sum(scores) / len(scores)
+
+def test_parallel_sweep_matches_serial_cross_validation(tmp_path):
+    matrix = features(str(tmp_path / 'features'))
+    grid = {'trees': [5, 10], 'depth': [None], 'max_features': ['sqrt'], 'min_leaf': [1], 'decimals': [None, 0]}
+    table = sweep(str(tmp_path / 'features'), 'bias', grid, folds=3, processes=2)
+    assert len(table) == 4
+    assert [row['accuracy'] for row in table] == sorted((row['accuracy'] for row in table), reverse=True)
+    for row in table:
+        assert abs(row['accuracy'] - serial(matrix, row['trees'], row['decimals'])) < 1e-12
+        assert row['fit_seconds'] > 0 and row['predict_ms_per_article'] > 0
@@ -0,0 +1,51 @@
+from math import log
+from numpy import zeros, float32, float64
+from numpy.random import default_rng
+
+import w2v_store
+from w2v_store import Store
+from embedding import Embedder
+from tfidf import TFIDFEmbedder
+from tokenizer import counts
+
+def embedder(tmp_path):
+    rng = default_rng(0)
+    known = ['word%d' % i for i in range(50)]
+    w2v_store.write(str(tmp_path / 'w2v'), known, rng.standard_normal((50, 300)).astype(float32))
+    return Embedder(Store(str(tmp_path / 'w2v')))
+
+def texts(n=30):
+    rng = default_rng(1)
+    # word50 ... word59 are out of vocabulary
+    return [' '.join('word%d' % i for i in rng.integers(0, 60, rng.integers(1, 40))) for _ in range(n)]
+
+def document_frequencies(texts):
+    df = {}
+    for text in texts:
+        for word in counts(text):
+            df[word] = df.get(word, 0) + 1
+    return len(texts), df
+
+# atn.TrainingArticle.vector before the sparse pipeline: one weighted sum per word of the article
+def legacy(model, n, df, hashed_words):
+    total = zeros(300, dtype=float64)
+    for string in hashed_words:
+        idf = 1 if df.get(string, 0) <= 1 else log(n, df[string])
+        tf = hashed_words[string] / len(hashed_words)
+        if string in model:
+            total += model.word_vec(string) * (idf * tf)
+    return total / sum(hashed_words.values())
+
+def test_batch_matches_the_per_article_formula(tmp_path):
+    e = embedder(tmp_path)
+    corpus = texts()
+    n, df = document_frequencies(corpus)
+    tfidf = TFIDFEmbedder(e, n, df)
+    articles = [counts(text) for text in corpus] + [counts('word55 word56'), counts('unseen words')]
+    batch = tfidf.vectors(articles)
+    for row, hashed_words in zip(batch, articles):
+        assert abs(row - legacy(e.model, n, df, hashed_words)).max() < 1e-9
+    assert not batch[-1].any() and not batch[-2].any()
+    # texts and {'word': count} dictionaries give the same vectors, batch after batch
+    assert abs(tfidf.vectors(corpus[:5]) - batch[:5]).max() < 1e-12
+    assert abs(TFIDFEmbedder(e, n, df).vectors([articles[7]])[0] - batch[7]).max() < 1e-12
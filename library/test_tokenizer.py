@@ -0,0 +1,46 @@
+from io import StringIO
+from random import Random
+from re import findall
+
+from tokenizer import LEGACY_REGEX, UNSAFE, words, tokens, counts, read_tokens, Vocabulary
+
+TEXTS = [
+    "Don't panic: it's 9 o'clock, the dogs' bowls are 'empty'.",
+    "'Tis the season -- rock'n'roll''s back!!",
+    'Café Ünïcode naïve STRASSE straße \u0130stanbul \u212aelvin',
+    'line one\nline two\r\n\ttabbed word',
+    '', '1234 !!', "''", "' '",
+]
+
+def legacy(text):
+    return [s.lower() for s in findall(LEGACY_REGEX, text)]
+
+def random_texts(n, seed=0):
+    random = Random(seed)
+    alphabet = "abcXYZ'' -.,\n09éÉß" + ''.join(UNSAFE)
+    return [''.join(random.choice(alphabet) for _ in range(random.randrange(40))) for _ in range(n)]
+
+def test_words_match_the_legacy_regex():
+    for text in TEXTS + random_texts(2000):
+        if any(c.isascii() and c.isalpha() for c in text):
+            assert words(text) == legacy(text), text
+        else: # the legacy regex found a lone "'" in text with apostrophes but no letters
+            assert words(text) == [] and set(legacy(text)) <= {"'"}
+        assert list(tokens(text)) == words(text) == words(text, interned=True)
+
+def test_unsafe_characters_do_not_turn_into_ascii_letters():
+    assert words('\u0130stanbul \u212aelvin') == ['stanbul', 'elvin']
+    assert words('\u0130') == [] and words('\u212a') == [] # İ and the Kelvin sign
+
+def test_chunked_reading_matches_whole_text():
+    text = '\n'.join(TEXTS + random_texts(200, seed=1))
+    for size in (1, 2, 3, 7, 64, 1 << 20):
+        assert list(read_tokens(StringIO(text), size)) == words(text), size
+
+def test_vocabulary_ids_and_bags():
+    vocabulary = Vocabulary(['the'])
+    ids, occurrences = vocabulary.bag("The cat and the hat, the end")
+    assert dict(zip([vocabulary.words[i] for i in ids], occurrences.tolist())) == counts('The cat and the hat, the end')
+    assert vocabulary.id('the') == 0 and 'hat' in vocabulary and 'dog' not in vocabulary
+    assert [vocabulary.words[i] for i in vocabulary.ids('the dog')] == ['the', 'dog']
+    assert vocabulary.totals()[0] == 4 and vocabulary.totals()[vocabulary.id('dog')] == 1
@@ -0,0 +1,36 @@
+from collections import Counter
+from numpy import abs as absolute, float32
+from numpy.random import default_rng
+
+import w2v_store
+from w2v_pack import build, report
+
+def test_packs_keep_corpus_words_within_quantization_error(tmp_path):
+    rng = default_rng(0)
+    words = ['word%d' % i for i in range(200)]
+    vectors = rng.standard_normal((200, 300)).astype(float32)
+    w2v_store.write(str(tmp_path / 'full'), words, vectors)
+    counts = Counter({'word3': 5, 'word7': 2, 'word11': 1, 'unknown': 9})
+    # float16 keeps 11 significant bits; int8 rows are off by at most half a step of their scale, max |x| / 127
+    for dtype, bound in (('float32', 0), ('float16', 2 ** -11), ('int8', 0.5 / 127)):
+        pack = build(str(tmp_path / 'full'), str(tmp_path / dtype), counts, min_count=2, dtype=dtype)
+        assert len(pack) == 2 and 'word11' not in pack and 'unknown' not in pack
+        for word in ('word3', 'word7'):
+            original = vectors[int(word[4:])]
+            scale = absolute(original).max()
+            assert absolute(pack.word_vec(word) - original).max() <= bound * scale * 1.0001 + 1e-7
+
+def test_report_compares_models_on_the_same_forests(tmp_path):
+    rng = default_rng(1)
+    words = ['word' + letter for letter in 'abcdefghijklmnopqrst'] # the tokenizer splits words at digits
+    w2v_store.write(str(tmp_path / 'full'), words, rng.standard_normal((20, 300)).astype(float32))
+    (tmp_path / 'ta').mkdir()
+    for i in range(120): # random labels, so unseeded forests disagree
+        label = ['CNN,left,mixed,USA', 'Fox News,right,high,USA'][int(rng.integers(0, 2))]
+        (tmp_path / 'ta' / ('ta.%d.txt' % i)).write_text(
+            'https://example.com/%d\n%s\n\n%s\n' % (i, label, ' '.join(rng.choice(words, 12))))
+    # a float32 pack of every word embeds exactly like the full model, so only forest noise could move accuracy
+    build(str(tmp_path / 'full'), str(tmp_path / 'pack'), Counter(words), dtype='float32')
+    lines = report(str(tmp_path / 'full'), str(tmp_path / 'pack'), str(tmp_path / 'ta'), seeds=3)
+    for line in lines[2:]:
+        assert line.endswith('(+0.000, per seed +0.000 to +0.000)'), line
@@ -0,0 +1,32 @@
+from numpy import array_equal, float32
+from numpy.random import default_rng
+from gensim.models import KeyedVectors
+
+import w2v_store
+from w2v_store import Store, is_store
+
+# Write a word2vec binary the way the C tool does (header, then each word, a space and its float32s),
+# which every gensim version reads
+def write_binary(path, words, vectors):
+    with open(path, 'wb') as o:
+        o.write(('%d %d\n' % vectors.shape).encode('utf-8'))
+        for word, vector in zip(words, vectors):
+            o.write(word.encode('utf-8') + b' ' + vector.astype('<f4').tobytes() + b'\n')
+
+def test_store_matches_the_word2vec_binary(tmp_path):
+    rng = default_rng(0)
+    words = ['news', 'report', 'café', "o'neill", 'Senate'] + ['word%d' % i for i in range(500)]
+    vectors = rng.standard_normal((len(words), 300)).astype(float32)
+    write_binary(str(tmp_path / 'model.bin'), words, vectors)
+    model = KeyedVectors.load_word2vec_format(str(tmp_path / 'model.bin'), binary=True)
+    w2v_store.convert(str(tmp_path / 'model.bin'), str(tmp_path / 'store'))
+    assert is_store(str(tmp_path / 'store')) and not is_store(str(tmp_path / 'model.bin'))
+    store = Store(str(tmp_path / 'store'))
+    assert len(store) == len(words)
+    for i, word in enumerate(words):
+        assert word in store
+        assert store.key_to_index[word] == i
+        assert array_equal(store.word_vec(word), vectors[i]) and array_equal(store.word_vec(word), model[word])
+    for word in ('senate', 'missing', '', 'word500'):
+        assert word not in store
+        assert store.key_to_index.get(word) is None
@@ -0,0 +1,88 @@
+from numpy import array, asarray, zeros, ones, concatenate, unique, log, float64, int32, int64
+from scipy.sparse import csr_matrix, diags
+
+from tokenizer import Vocabulary
+from metrics import METRICS
+
+# Objective: TF-IDF weighted word2vec vectors of many articles as one sparse x dense product
+#
+# Term counts of a batch of articles go into a CSR matrix (articles x corpus vocabulary). Weighting
+# follows atn.TrainingArticle.__vector word for word:
+#   tf(w)   = count of w / distinct words of the article
+#   idf(w)  = log(n, df(w)), or 1 when w appears in one article or in none
+#   vector  = sum of tf(w) * idf(w) * word2vec(w) over words in the model / total words of the article
+# so the whole batch is diag(1 / distinct) @ counts @ diag(idf) @ embeddings, divided by the totals.
+
+class TFIDFEmbedder:
+
+    # Initialize with an Embedder (None for zero vectors) and the corpus's document frequencies
+    def __init__(self, embedder, n, document_frequencies, width=300):
+        self.embedder = embedder
+        self.n = n
+        self.document_frequencies = document_frequencies
+        self.width = embedder.width if embedder is not None else width
+        self.vocabulary = Vocabulary()
+        # per vocabulary id, grown as the vocabulary is: word2vec row (-1 if none) and idf
+        self.rows = zeros(0, dtype=int64)
+        self.idf = zeros(0, dtype=float64)
+
+    # Build the CSR term counts of a batch, from texts or from {'word': count} dictionaries
+    def term_counts(self, articles):
+        indptr, indices, data = [0], [], []
+        for article in articles:
+            if isinstance(article, str):
+                ids, occurrences = self.vocabulary.bag(article)
+            else:
+                ids = array([self.vocabulary.id(word) for word in article], dtype=int32)
+                occurrences = array(list(article.values()), dtype=int32)
+            indices.append(ids)
+            data.append(occurrences)
+            indptr.append(indptr[-1] + len(ids))
+        self.__grow()
+        shape = (len(indptr) - 1, len(self.vocabulary))
+        if not indices:
+            return csr_matrix(shape, dtype=float64)
+        return csr_matrix((concatenate(data).astype(float64), concatenate(indices), asarray(indptr, dtype=int64)),
+                          shape=shape)
+
+    # Look up the word2vec rows and idf of words added to the vocabulary since the last batch
+    def __grow(self):
+        new = self.vocabulary.words[len(self.rows):]
+        if not new:
+            return
+        rows = -ones(len(new), dtype=int64)
+        if self.embedder is not None:
+            found, positions = self.embedder.indices(new)
+            rows[positions] = found
+        df = array([self.document_frequencies.get(word, 0) for word in new], dtype=float64)
+        idf = ones(len(new), dtype=float64)
+        common = df > 1
+        idf[common] = log(self.n) / log(df[common])
+        self.rows = concatenate([self.rows, rows])
+        self.idf = concatenate([self.idf, idf])
+
+    # Get the TF-IDF weights of a CSR term count matrix
+    def weights(self, counts):
+        distinct = counts.getnnz(axis=1).astype(float64)
+        distinct[distinct == 0] = 1
+        return (diags(1 / distinct) @ counts @ diags(self.idf[:counts.shape[1]])).tocsr()
+
+    # Get the TF-IDF weighted vectors of a batch of articles, one row each
+    def vectors(self, articles):
+        counts = self.term_counts(articles)
+        vectors = zeros((counts.shape[0], self.width), dtype=float64)
+        present = unique(counts.indices) # vocabulary words of this batch
+        known = present[self.rows[present] >= 0]
+        if len(known):
+            # tf divides by every distinct word, but only words in the model have an embedding to weigh;
+            # their embeddings are gathered once per batch
+            distinct = counts.getnnz(axis=1).astype(float64)
+            distinct[distinct == 0] = 1
+            weights = diags(1 / distinct) @ counts[:, known] @ diags(self.idf[known])
+            vectors = weights @ self.embedder.rows(self.rows[known])
+        totals = asarray(counts.sum(axis=1)).ravel()
+        METRICS.count('embedded_words', int(totals.sum()))
+        METRICS.count('oov_words', int(totals.sum() - counts[:, known].sum()))
+        filled = totals > 0
+        vectors[filled] /= totals[filled, None]
+        return vectors
@@ -0,0 +1,136 @@
+from re import compile, findall
+from sys import intern, argv, maxsize
+from collections import Counter
+from csv import reader, field_size_limit
+from time import perf_counter
+from numpy import array, int32, int64
+
+# Objective: split article text into lowercase words once, the same way everywhere
+#
+# A word is a run of ASCII letters and apostrophes starting with a letter. This is what the old
+# WORD_REGEX "[^a-zA-Z]*([a-zA-Z']+)[^a-zA-Z]*" found with findall, except that text with no letters
+# at all no longer yields a lone "'" token. Texts are lowercased before matching, which is faster than
+# lowercasing every word, except for the two characters whose lowercase has ASCII letters (U+0130 and
+# U+212A). Words can be interned, so the many copies of common words in a corpus share one string, and
+# a Vocabulary maps words to integer ids as it sees them.
+#
+#   $ python tokenizer.py master.csv    # benchmark against the old findall path
+
+WORD = compile("[a-zA-Z][a-zA-Z']*")
+LEGACY_REGEX = "[^a-zA-Z]*([a-zA-Z']+)[^a-zA-Z]*"
+CHUNK = 1 << 20 # characters read at a time by read_tokens
+UNSAFE = ('\u0130', '\u212a') # İ and the Kelvin sign lowercase to ASCII letters
+
+# Get the lowercase words of a text as a list, interned if asked
+def words(text, interned=False):
+    if any(c in text for c in UNSAFE):
+        found = [word.lower() for word in WORD.findall(text)]
+    else:
+        found = WORD.findall(text.lower())
+    return list(map(intern, found)) if interned else found
+
+# Yield the lowercase, interned words of a text without building a list
+def tokens(text):
+    if any(c in text for c in UNSAFE):
+        for match in WORD.finditer(text):
+            yield intern(match.group().lower())
+    else:
+        for match in WORD.finditer(text.lower()):
+            yield intern(match.group())
+
+# Count the words of a text, {'word': occurrences}
+def counts(text):
+    return Counter(words(text))
+
+# Yield the lowercase words of a text file (or any object with read), one chunk in memory at a time
+def read_tokens(i, size=CHUNK):
+    carry = ''
+    while True:
+        chunk = i.read(size)
+        if not chunk:
+            break
+        text = carry + chunk
+        # a word touching the end of the chunk may continue in the next one
+        end = len(text)
+        while end and (text[end - 1].isalpha() and text[end - 1].isascii() or text[end - 1] == "'"):
+            end -= 1
+        yield from tokens(text[:end])
+        carry = text[end:]
+    yield from tokens(carry)
+
+class Vocabulary:
+
+    # Initialize empty, or with a list of words whose ids are their positions
+    def __init__(self, words=()):
+        self.words = []
+        self.index = {}
+        self.counts = []
+        for word in words:
+            self.id(word)
+
+    def __len__(self):
+        return len(self.words)
+
+    def __contains__(self, word):
+        return word in self.index
+
+    # Get the id of a word, adding it if it is new
+    def id(self, word):
+        i = self.index.get(word)
+        if i is None:
+            i = self.index[word] = len(self.words)
+            self.words.append(intern(word))
+            self.counts.append(0)
+        return i
+
+    # Get the ids of a text's words, in order, counting them towards the vocabulary's totals
+    def ids(self, text):
+        found = words(text)
+        for word, count in Counter(found).items():
+            self.counts[self.id(word)] += count
+        index = self.index
+        return array([index[word] for word in found], dtype=int32)
+
+    # Get (distinct ids, occurrences of each) of a text, counting them towards the vocabulary's totals
+    def bag(self, text):
+        tally = counts(text)
+        ids = array([self.id(word) for word in tally], dtype=int32)
+        occurrences = array(list(tally.values()), dtype=int32)
+        for i, count in zip(ids.tolist(), occurrences.tolist()):
+            self.counts[i] += count
+        return ids, occurrences
+
+    # Total occurrences of every word, in id order
+    def totals(self):
+        return array(self.counts, dtype=int64)
+
+# Time the old findall path against tokens, words and counts over a list of texts
+def benchmark(texts, repeat=3):
+    total = sum(len(text) for text in texts)
+    paths = {
+        'findall + lower (old)': lambda text: [s.lower() for s in findall(LEGACY_REGEX, text)],
+        'tokens': lambda text: list(tokens(text)),
+        'words': words,
+        'words (interned)': lambda text: words(text, True),
+        'counts': counts,
+        'Vocabulary.bag': Vocabulary().bag,
+    }
+    for name, tokenize in paths.items():
+        best = None
+        for _ in range(repeat):
+            start = perf_counter()
+            for text in texts:
+                tokenize(text)
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print('%-24s %8.3f s  %8.1f MB/s' % (name, best, total / best / 1e6))
+
+if __name__ == '__main__':
+    # argv[1] as an All The News CSV (e.g., ../database/003.sample.csv)
+    field_size_limit(maxsize) # Increase maximum field size, CSV is very large
+    with open(argv[1], 'r') as master_text:
+        master_csv = reader(master_text, delimiter=',')
+        next(master_csv) # skip the header line
+        texts = [e[9] for e in master_csv]
+    print('Tokenizing %d articles (%.1f MB)' % (len(texts), sum(len(text) for text in texts) / 1e6))
+    benchmark(texts)
@@ -1,4 +1,8 @@
+from os.path import exists
+
 from ml import W2VClassifier
 
 PATH = '../classifiers/google_news'
-MODEL = W2VClassifier(PATH)
+# Made once with: python w2v_store.py ../classifiers/google_news ../classifiers/google_news.store
+STORE = '../classifiers/google_news.store'
+MODEL = W2VClassifier(STORE if exists(STORE) else PATH)
@@ -0,0 +1,129 @@
+from csv import reader, field_size_limit
+from collections import Counter
+from os import listdir
+from os.path import join
+from sys import maxsize
+from tempfile import mkdtemp
+from shutil import rmtree
+from argparse import ArgumentParser
+from numpy import array, asarray, mean, abs as absolute, rint, clip, float16, float32, int8, int64
+
+from ml import W2VClassifier, BiasClassifier, FactualnessClassifier
+from w2v_store import Store, write
+from tokenizer import words
+
+# Objective: shrink the word2vec vocabulary to the words in our corpora and quantize it for low-RAM devices
+
+DTYPES = ('float32', 'float16', 'int8')
+
+# Tally the words of All The News CSVs and directories of training articles
+def corpus_counts(csv_paths=(), directories=()):
+    field_size_limit(maxsize) # Increase maximum field size, CSV is very large
+    counts = Counter()
+    for path in csv_paths:
+        print('Tallying words of ATN articles from %s' % path)
+        with open(path, 'r') as master_text:
+            master_csv = reader(master_text, delimiter=',')
+            next(master_csv) # skip the header line
+            for e in master_csv:
+                # ,id,title,publication,author,date,year,month,url,content
+                counts.update(words(e[9]))
+    for directory in directories:
+        print('Tallying words of training articles in %s' % directory)
+        for name in listdir(directory):
+            with open(join(directory, name), 'r') as i:
+                body_text = ''.join(i.readlines()[3:])
+            counts.update(words(body_text))
+    return counts
+
+# Quantize float32 rows, int8 rows get a scale each so that row = int8 row * scale
+def quantize(vectors, dtype):
+    if dtype == 'float32':
+        return vectors.astype(float32), None
+    if dtype == 'float16':
+        return vectors.astype(float16), None
+    scales = absolute(vectors).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return clip(rint(vectors / scales[:, None]), -127, 127).astype(int8), scales.astype(float32)
+
+# Build a pack from a word2vec binary or store, keeping words seen at least min_count times
+def build(source, out_path, counts, min_count=1, dtype='float16'):
+    if dtype not in DTYPES:
+        raise Exception('Unsupported pack type %s, use one of %s' % (dtype, ', '.join(DTYPES)))
+    w2vm = W2VClassifier(source)
+    vocabulary = w2vm.embedder.vocabulary
+    words, rows = [], []
+    for word, count in counts.most_common():
+        if count < min_count:
+            break
+        row = vocabulary.get(word)
+        if row is not None:
+            words.append(word)
+            rows.append(row)
+    print('Keeping %d words (%d distinct corpus words, %d seen at least %d times, %d in the full vocabulary)' % (
+        len(words), len(counts), sum(1 for c in counts.values() if c >= min_count), min_count, len(vocabulary)))
+    vectors, scales = quantize(w2vm.embedder.rows(array(rows, dtype=int64)), dtype)
+    write(out_path, words, vectors, scales=scales, meta={'dtype': dtype, 'min_count': min_count})
+    return Store(out_path)
+
+# Get the bytes a loaded word2vec model takes (vectors and vocabulary for stores, vectors only for gensim)
+def footprint(model):
+    if isinstance(model, Store):
+        return model.footprint()
+    return model.vectors.nbytes
+
+# Compare RAM and classifier confidence between a full word2vec model and a pack; confidences are
+# averaged over forests seeded 0 ... seeds - 1, the same seeds for both models
+def report(full_path, pack_path, directory, seeds=5):
+    full, pack = W2VClassifier(full_path), W2VClassifier(pack_path)
+    full_bytes, pack_bytes = footprint(full.model), footprint(pack.model)
+    lines = ['Full model: %.1f MB' % (full_bytes / 2 ** 20),
+             'Pack: %.1f MB (%.1f MB saved, %.1f%%)' % (
+                 pack_bytes / 2 ** 20, (full_bytes - pack_bytes) / 2 ** 20, 100 * (1 - pack_bytes / full_bytes))]
+    temp = mkdtemp()
+    try:
+        confidences = {}
+        for tag, w2vm in (('full', full), ('pack', pack)):
+            features = BiasClassifier().create_features(directory, w2vm) # one vectorization pass per model
+            for name, scale in (('bias', BiasClassifier), ('factualness', FactualnessClassifier)):
+                c = scale(out_path=join(temp, '%s.%s.classifier' % (name, tag)))
+                confidences[name, tag] = []
+                for seed in range(seeds):
+                    c.create(directory=directory, w2vm=w2vm, features=features, seed=seed)
+                    confidences[name, tag].append(c.confidence)
+        for name in ('bias', 'factualness'):
+            full_confidence, pack_confidence = mean(confidences[name, 'full']), mean(confidences[name, 'pack'])
+            change = asarray(confidences[name, 'pack']) - asarray(confidences[name, 'full'])
+            lines.append('%s confidence over %d seeds: full %.3f, pack %.3f (%+.3f, per seed %+.3f to %+.3f)' % (
+                name, seeds, full_confidence, pack_confidence, pack_confidence - full_confidence,
+                change.min(), change.max()))
+    finally:
+        rmtree(temp)
+    print('\n'.join(lines))
+    return lines
+
+def main():
+    parser = ArgumentParser(description='Build or evaluate a pruned, quantized word2vec pack')
+    commands = parser.add_subparsers(dest='command')
+    b = commands.add_parser('build')
+    b.add_argument('source', help='word2vec binary or store')
+    b.add_argument('out', help='pack directory to write')
+    b.add_argument('--csv', action='append', default=[], help='All The News master.csv (repeatable)')
+    b.add_argument('--ta', action='append', default=[], help='training article directory (repeatable)')
+    b.add_argument('--min-count', type=int, default=1)
+    b.add_argument('--dtype', choices=DTYPES, default='float16')
+    r = commands.add_parser('report')
+    r.add_argument('full', help='word2vec binary or store')
+    r.add_argument('pack', help='pack directory')
+    r.add_argument('ta', help='training article directory used to compare classifiers')
+    r.add_argument('--seeds', type=int, default=5, help='forest seeds the confidences are averaged over')
+    args = parser.parse_args()
+    if args.command == 'build':
+        build(args.source, args.out, corpus_counts(args.csv, args.ta), args.min_count, args.dtype)
+    elif args.command == 'report':
+        report(args.full, args.pack, args.ta, args.seeds)
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+from numpy import load, save, empty, full, frombuffer, int32, int64, uint8, float32
+from numpy.lib.format import open_memmap
+from zlib import crc32
+from json import dump as dump_json, load as load_json
+from os import makedirs
+from os.path import join, exists
+from sys import argv
+
+# Objective: convert a word2vec binary once into memory-mapped files that open instantly
+#
+# A store is a directory holding:
+#   vectors.npy  (n, width) matrix, memory-mapped read-only so processes share the page cache
+#   words.npy    every word's UTF-8 bytes, concatenated in row order
+#   offsets.npy  n + 1 offsets into words.npy
+#   table.npy    open-addressing hash table (crc32, linear probing) of rows, -1 for empty slots
+#   scales.npy   per-row scales, only for int8 packs (see w2v_pack.py)
+#   meta.json    format version, row count and width
+
+VERSION = 1
+VECTORS, WORDS, OFFSETS, TABLE, META = 'vectors.npy', 'words.npy', 'offsets.npy', 'table.npy', 'meta.json'
+SCALES = 'scales.npy'
+
+# Check whether a path is a store directory rather than a word2vec binary
+def is_store(path):
+    return exists(join(path, META))
+
+# Write a store from a list of words and a matrix with one row per word (int8 matrices need scales)
+def write(path, words, vectors, scales=None, meta=None):
+    makedirs(path, exist_ok=True)
+    encoded = [word.encode('utf-8') for word in words]
+    offsets = empty(len(encoded) + 1, dtype=int64)
+    offsets[0] = 0
+    for i, word in enumerate(encoded):
+        offsets[i + 1] = offsets[i] + len(word)
+    blob = frombuffer(b''.join(encoded), dtype=uint8)
+    out = open_memmap(join(path, VECTORS), mode='w+', dtype=vectors.dtype, shape=vectors.shape)
+    out[:] = vectors
+    out.flush()
+    del out
+    save(join(path, WORDS), blob)
+    save(join(path, OFFSETS), offsets)
+    save(join(path, TABLE), build_table(encoded))
+    if scales is not None:
+        save(join(path, SCALES), scales.astype(float32))
+    with open(join(path, META), 'w') as o:
+        dump_json({**{'version': VERSION, 'count': len(encoded), 'width': vectors.shape[1]}, **(meta or {})}, o)
+
+# Build the hash table of rows for a list of encoded words
+def build_table(encoded):
+    size = 1
+    while size < 2 * max(len(encoded), 1):
+        size *= 2
+    mask = size - 1
+    table = full(size, -1, dtype=int32 if len(encoded) < 2 ** 31 else int64)
+    for row, word in enumerate(encoded):
+        slot = crc32(word) & mask
+        while table[slot] >= 0:
+            slot = (slot + 1) & mask
+        table[slot] = row
+    return table
+
+# Convert a word2vec binary (e.g. GoogleNews) into a store; this is the slow, one-time step
+def convert(in_path, out_path):
+    from gensim.models import KeyedVectors
+    print('Loading pre-trained word2vec model (this may take a couple of minutes)...')
+    model = KeyedVectors.load_word2vec_format(in_path, binary=True)
+    # gensim >= 4.0 calls the row order index_to_key, gensim 3.x calls it index2word
+    words = model.index_to_key if hasattr(model, 'index_to_key') else model.index2word
+    print('Writing %d vectors to %s' % (len(words), out_path))
+    write(out_path, words, model.vectors)
+
+class Vocabulary:
+
+    # Initialize with a store directory, every file is memory-mapped
+    def __init__(self, path):
+        self.words = load(join(path, WORDS), mmap_mode='r')
+        self.offsets = load(join(path, OFFSETS), mmap_mode='r')
+        self.table = load(join(path, TABLE), mmap_mode='r')
+        self.mask = len(self.table) - 1
+        self.__seen = {} # rows of words already looked up in this process
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def __getitem__(self, word):
+        row = self.get(word)
+        if row is None:
+            raise KeyError(word)
+        return row
+
+    # Get the row of a word, or default if the word is not in the vocabulary
+    def get(self, word, default=None):
+        if word in self.__seen:
+            row = self.__seen[word]
+            return default if row is None else row
+        encoded = word.encode('utf-8')
+        slot = crc32(encoded) & self.mask
+        row = None
+        while True:
+            candidate = int(self.table[slot])
+            if candidate < 0:
+                break
+            if self.word(candidate, decode=False) == encoded:
+                row = candidate
+                break
+            slot = (slot + 1) & self.mask
+        self.__seen[word] = row
+        return default if row is None else row
+
+    # Get the word stored at a row
+    def word(self, row, decode=True):
+        encoded = self.words[int(self.offsets[row]):int(self.offsets[row + 1])].tobytes()
+        return encoded.decode('utf-8') if decode else encoded
+
+class Store:
+
+    # Initialize with a store directory; nothing is read until rows are used
+    def __init__(self, path):
+        with open(join(path, META), 'r') as meta:
+            self.meta = load_json(meta)
+        if self.meta['version'] != VERSION:
+            raise Exception('Unsupported word2vec store version %s' % self.meta['version'])
+        self.path = path
+        self.vectors = load(join(path, VECTORS), mmap_mode='r')
+        # Quantized rows are multiplied by their scale when read
+        self.scales = load(join(path, SCALES), mmap_mode='r') if exists(join(path, SCALES)) else None
+        self.key_to_index = Vocabulary(path)
+        self.vector_size = self.meta['width']
+
+    def __len__(self):
+        return len(self.key_to_index)
+
+    def __contains__(self, word):
+        return word in self.key_to_index
+
+    # Get the vector of a word, as KeyedVectors.word_vec does
+    def word_vec(self, word):
+        row = self.key_to_index[word]
+        if self.scales is not None:
+            return self.vectors[row].astype(float32) * self.scales[row]
+        return self.vectors[row].astype(float32)
+
+    # Get the number of bytes the store's files take when fully paged in
+    def footprint(self):
+        vocabulary = self.key_to_index
+        total = self.vectors.nbytes + vocabulary.words.nbytes + vocabulary.offsets.nbytes + vocabulary.table.nbytes
+        return total + (self.scales.nbytes if self.scales is not None else 0)
+
+    get_vector = word_vec
+
+if __name__ == '__main__':
+    # argv[1] as word2vec binary (e.g., ../../classifiers/google_news)
+    # argv[2] as store directory (e.g., ../../classifiers/google_news.store)
+    convert(argv[1], argv[2])
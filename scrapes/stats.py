@@ -1,29 +1,111 @@
-from sys import argv
-
-# scrape as argv[1]
-
-titles = set()
-articles = set()
-sources = set()
-
-with open(argv[1], 'r') as scrape:
-    sequence = 0
-    for i, line in enumerate(scrape.readlines()):
-        if sequence == 0: # title line
-            # print('title:' + line.strip())
-            titles.add(line.strip())
-        elif sequence == 1: # article link line
-            # print('article:' + line.strip())
-            articles.add(line.strip())
-        elif sequence == 2: # source link line
-            # print('source:' + line.strip())
-            sources.add(line.strip())
-        sequence = (sequence + 1) % 4
-
-temp = set()
-for source in sources:
-    domain = '.'.join(source.split('.')[1:])
-    if domain not in temp: temp.add(domain)
-print('Unique sources', str(len(temp)))
-print('Titles', str(len(titles)))
+from sys import path
+from os.path import dirname, join
+from multiprocessing import Pool
+from collections import Counter
+from datetime import datetime
+from argparse import ArgumentParser
 
+path.insert(0, join(dirname(__file__), '..', 'library'))
+from source_index import SourceIndex
+from scrape_log import records
+from sketches import HyperLogLog, TopK, ExactSet, ExactCounter
+
+# Objective: summarize scrape logs in one streaming pass each, in parallel, with mergeable sketches
+#
+# Distinct titles, links and source domains are counted with HyperLogLog sketches and the busiest
+# sources with a count-min top-k, so memory stays fixed however long the logs are; --exact keeps
+# sets and counters instead (to check the sketches, or for small logs). Each log is tallied in its own
+# process and the tallies are merged. Segmented logs also report how many articles arrived per window.
+
+SOURCES = join(dirname(__file__), '..', 'database', 'sources.csv')
+
+class Stats:
+
+    # Initialize with exact or sketched counts and the ingestion rate window (seconds)
+    def __init__(self, exact=False, window=3600):
+        distinct = ExactSet if exact else HyperLogLog
+        self.exact = exact
+        self.window = window
+        self.records = 0
+        self.titles = distinct()
+        self.articles = distinct()
+        self.domains = distinct()
+        self.known = distinct()
+        self.busiest = ExactCounter() if exact else TopK(100)
+        self.windows = Counter() # window start -> articles scraped in it
+
+    # Tally one record, with its source already resolved to (domain, known)
+    def add(self, record, domain, known):
+        self.records += 1
+        self.titles.add(record.title)
+        self.articles.add(record.link)
+        self.domains.add(domain)
+        if known:
+            self.known.add(domain)
+        self.busiest.add(domain)
+        if record.time is not None:
+            self.windows[int(record.time // self.window) * self.window] += 1
+
+    def merge(self, other):
+        self.records += other.records
+        for name in ('titles', 'articles', 'domains', 'known', 'busiest'):
+            getattr(self, name).merge(getattr(other, name))
+        self.windows.update(other.windows)
+        return self
+
+    def report(self, top=10):
+        print('Records', str(self.records))
+        print('Unique sources', str(self.domains.count()))
+        print('Known sources', str(self.known.count()))
+        print('Titles', str(self.titles.count()))
+        print('Articles', str(self.articles.count()))
+        print('\nBusiest sources')
+        for domain, count in self.busiest.most_common(top):
+            print('  %-40s %d' % (domain, count))
+        if self.windows:
+            print('\nArticles per %d seconds' % self.window)
+            for start, count in sorted(self.windows.items()):
+                print('  %s %d' % (datetime.fromtimestamp(start).strftime('%Y-%m-%d %H:%M'), count))
+
+# Tally one log (run in a worker process)
+def tally(task):
+    log, exact, window = task
+    index = SourceIndex.open(SOURCES)
+    domains = {} # source -> (domain, known); feeds repeat a few hundred sources
+    stats = Stats(exact, window)
+    for record in records(log):
+        if record.source not in domains:
+            domains[record.source] = (index.domain(record.source), index.lookup(record.source) is not None)
+        stats.add(record, *domains[record.source])
+    return stats
+
+# Tally every log in parallel and merge the tallies
+def summarize(logs, exact=False, window=3600, processes=None):
+    tasks = [(log, exact, window) for log in logs]
+    with Pool(min(processes or len(tasks), len(tasks))) as pool:
+        tallies = pool.map(tally, tasks)
+    total = tallies[0]
+    for stats in tallies[1:]:
+        total.merge(stats)
+    return total
+
+def main():
+    parser = ArgumentParser(description='Summarize scrape logs (segmented or 4-line text logs)')
+    parser.add_argument('logs', nargs='+', help='e.g. gnews_scrape.1.txt gnews_scrape.2.log')
+    parser.add_argument('--exact', action='store_true', help='exact sets and counters instead of sketches')
+    parser.add_argument('--check', action='store_true', help='compare the sketches against exact counts')
+    parser.add_argument('--window', type=int, default=3600, help='seconds per ingestion rate window')
+    parser.add_argument('--top', type=int, default=10, help='busiest sources to list')
+    parser.add_argument('--processes', type=int, default=None)
+    args = parser.parse_args()
+    stats = summarize(args.logs, args.exact, args.window, args.processes)
+    stats.report(args.top)
+    if args.check and not args.exact:
+        exact = summarize(args.logs, True, args.window, args.processes)
+        print('\nSketch error')
+        for name in ('domains', 'known', 'titles', 'articles'):
+            estimate, count = getattr(stats, name).count(), getattr(exact, name).count()
+            print('  %-10s %d vs %d (%+.2f%%)' % (name, estimate, count, 100.0 * (estimate - count) / max(count, 1)))
+
+if __name__ == '__main__':
+    main()